@@ -0,0 +1,282 @@
+"""
+async_pipeline.py
+
+Runs the nightly collection (hub probes, users crawls, Otter Firestore
+streaming) as tasks on one asyncio event loop, instead of main.py's two
+threads with blocking I/O and users.main's thread pool.
+
+Hub requests go through one httpx.AsyncClient and Firestore documents are
+streamed with google.cloud.firestore.AsyncClient. /users pages are decoded
+and bucketed on one worker thread, or on USERS_DECODE_PROCESSES worker
+processes, so the loop only waits on I/O. Every hub request and
+Firestore stream first takes a slot of one shared budget of CONCURRENCY
+slots, so the whole run never has more than that many in flight. A hub that
+fails is recorded as a failure, just as in users.main. Any other error, such
+as a Firestore stream that fails, cancels every in-flight request at once
+and is raised, and nothing is written. The outputs are the same as users.main
+and otter_standalone_use.main (users.arrow/.csv, otter_standalone_use.arrow/.csv,
+term membership, learned page caps).
+
+Needs httpx. The Firestore async client comes with firebase-admin's
+google-cloud-firestore.
+
+Usage:
+    python main.py --async
+    python async_pipeline.py    # collect only (no dashboard or history)
+    PIPELINE_CONCURRENCY=32 python async_pipeline.py
+"""
+
+import asyncio
+import os
+import ssl
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+try:
+    import httpx
+except ImportError:  # optional: only the async mode needs it
+    httpx = None
+
+try:
+    from google.cloud.firestore import AsyncClient as FirestoreAsyncClient
+except ImportError:  # optional: installed with firebase-admin
+    FirestoreAsyncClient = None
+
+import hub_probe
+import otter_standalone_use
+import users
+
+# Hub requests and Firestore streams in flight at once, across the whole run
+CONCURRENCY = int(os.environ.get("PIPELINE_CONCURRENCY", 16))
+HTTP_TIMEOUT = 120  # seconds, per /users request; large pages of slow hubs take a while
+
+
+def client_options(concurrency):
+    """
+    httpx.AsyncClient arguments for the hub requests of a run with
+    concurrency requests in flight.
+    """
+    return {
+        "timeout": HTTP_TIMEOUT,
+        "limits": httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        # Hubs redirect the http:// API URLs (see hub_probe.hub_api_url) to https;
+        # requests follows redirects on its own in the threaded path
+        "follow_redirects": True,
+    }
+
+
+async def gather_or_cancel(*aws):
+    """
+    Runs awaitables as tasks and returns their results in order, like
+    asyncio.gather. If one raises, every other task is cancelled and awaited
+    before the error propagates, and so is every task if the caller is
+    cancelled.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    if not tasks:
+        return []
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+        return [task.result() for task in tasks]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _handshake_times(host):
+    """hub_probe._handshake_times with the event loop's connection and TLS."""
+    loop = asyncio.get_running_loop()
+    transport = None
+    try:
+        start = time.perf_counter()
+        transport, protocol = await asyncio.wait_for(
+            loop.create_connection(asyncio.Protocol, host, 443), hub_probe.PROBE_TIMEOUT
+        )
+        connected = time.perf_counter()
+        transport = await asyncio.wait_for(
+            loop.start_tls(transport, protocol, ssl.create_default_context(), server_hostname=host),
+            hub_probe.PROBE_TIMEOUT,
+        )
+        done = time.perf_counter()
+    except (OSError, ssl.SSLError, asyncio.TimeoutError):
+        return None, None
+    finally:
+        if transport is not None:
+            transport.close()
+    return (connected - start) * 1000, (done - connected) * 1000
+
+
+async def probe_pilot(client, budget, pilot):
+    """hub_probe.probe_pilot on the event loop: runs hub_probe.probe_steps. Never raises."""
+    steps = hub_probe.probe_steps(pilot)
+    outcome = None
+    while True:
+        try:
+            step = steps.send(outcome)
+        except StopIteration as done:
+            return done.value
+        if step[0] == "sleep":
+            await asyncio.sleep(step[1])
+            outcome = None
+        elif step[0] == "handshake":
+            async with budget:
+                outcome = await _handshake_times(step[1])
+        else:
+            try:
+                async with budget:
+                    start = time.perf_counter()
+                    r = await client.get(step[1], headers=step[2], timeout=hub_probe.PROBE_TIMEOUT)
+                    outcome = r, (time.perf_counter() - start) * 1000
+            except httpx.HTTPError as exc:
+                outcome = None, type(exc).__name__
+
+
+async def crawl_pilot(client, budget, pilot, dates, page_size, as_of, pool):
+    """
+    users.process_pilot on the event loop: pages through the hub's /users
+    (see users.users_pager) and buckets every page on the pool as it arrives.
+
+    Returns:
+        tuple: (statistics dict for the pilot, transfer dict, {term: usernames}).
+    """
+    loop = asyncio.get_running_loop()
+    api_url = users.hub_api_url(pilot["url"], pilot["where"])
+    headers = users.users_request_headers(pilot["token"])
+    pager = users.users_pager(pilot["url"], page_size)
+    path = next(pager)
+    while True:
+        async with budget:
+            r = await client.get(api_url + path, headers=headers)
+        users.check_users_response(pilot["url"], r.status_code, r.text)
+        page = await loop.run_in_executor(pool, users.bucket_page, r.content, dates, as_of)
+        try:
+            path = pager.send((len(r.content), page))
+        except StopIteration as done:
+            buckets, transfer = done.value
+            break
+    p, term_members = users.summarize_buckets(pilot, buckets, dates, as_of)
+    return p, transfer, term_members
+
+
+async def collect_users(client, budget, process_all, one, probe, pool):
+    """
+    users.main up to its outputs: probes, then crawls every live hub at once.
+
+    Returns:
+        tuple: The users.write_results arguments.
+    """
+    dates = users.generate_dates(2022, users.get_current_academic_year())
+    pilots = users.load_pilots(process_all, one)
+    failures = []
+    health = {}
+    if probe:
+        probes = await gather_or_cancel(*(probe_pilot(client, budget, pilot) for pilot in pilots))
+        health = {hub_probe.pilot_key(pilot): result for pilot, result in zip(pilots, probes)}
+    live_pilots = users.skip_dead_pilots(pilots, health, failures)
+
+    page_sizes = users.load_page_sizes()
+    as_of = datetime.now(timezone.utc).replace(tzinfo=None)  # one window end for every hub
+    results = []
+    transfers = {}
+    members = {}
+
+    async def crawl(pilot):
+        try:
+            p, transfer, term_members = await crawl_pilot(
+                client, budget, pilot, dates, page_sizes.get(hub_probe.pilot_key(pilot)), as_of, pool
+            )
+        except Exception as exc:
+            failures.append(f"{pilot['name']}: {exc}")
+            return
+        transfers[hub_probe.pilot_key(pilot)] = transfer
+        members[hub_probe.pilot_key(pilot)] = term_members
+        results.append(p)
+
+    await gather_or_cancel(*(crawl(pilot) for pilot in live_pilots))
+    return dates, pilots, live_pilots, results, failures, transfers, members, page_sizes
+
+
+async def stream_project(budget, project_id):
+    """Every usage record in one Firestore project, streamed with the async client."""
+    if FirestoreAsyncClient is None:
+        raise RuntimeError("Streaming Otter records asynchronously needs google-cloud-firestore")
+    db = FirestoreAsyncClient(project=project_id)
+    async with budget:
+        return [doc.to_dict() async for doc in db.collection(otter_standalone_use.COLLECTION_NAME).stream()]
+
+
+async def collect_otter(budget):
+    """
+    otter_standalone_use.main up to its outputs: streams every project at once.
+
+    Returns:
+        tuple: The otter_standalone_use.write_results arguments.
+    """
+    project_ids = otter_standalone_use.get_project_ids()
+    per_project = await gather_or_cancel(*(stream_project(budget, project_id) for project_id in project_ids))
+    return project_ids, [record for records in per_project for record in records]
+
+
+async def collect(process_all=True, one=None, probe=True, processes=None, concurrency=None):
+    """
+    Runs the users and Otter collection concurrently on the running event
+    loop, then writes both outputs.
+
+    Args:
+        process_all (bool): If True, process all pilots. If False, process one.
+        one (str): Hub name to process if not all.
+        probe (bool): Probe every hub first and skip dead ones (see users.main).
+        processes (int): Worker processes for decoding and bucketing pages;
+            default users.DECODE_PROCESSES, 0 for one worker thread.
+        concurrency (int): Requests and streams in flight at once; default CONCURRENCY.
+
+    Returns:
+        tuple: (users.main summary, otter_standalone_use.main summary).
+    """
+    if httpx is None:
+        raise RuntimeError("The async pipeline needs httpx (pip install httpx)")
+    concurrency = concurrency or CONCURRENCY
+    budget = asyncio.Semaphore(concurrency)
+    processes = users.DECODE_PROCESSES if processes is None else processes
+    # Decoding a page blocks for milliseconds, so it never runs on the loop itself,
+    # where it would hold up every other hub's reads and writes. The pool is made
+    # before any request, so before the loop starts threads (see users.decode_pool).
+    pool = users.decode_pool(processes) or ThreadPoolExecutor(max_workers=1)
+    try:
+        async with httpx.AsyncClient(**client_options(concurrency)) as client:
+            users_part, otter_part = await gather_or_cancel(
+                collect_users(client, budget, process_all, one, probe, pool),
+                collect_otter(budget),
+            )
+    finally:
+        pool.shutdown()
+    return users.write_results(*users_part), otter_standalone_use.write_results(*otter_part)
+
+
+def run(process_all=True, one=None, probe=True, processes=None, concurrency=None):
+    """Runs collect on a new event loop (see collect)."""
+    return asyncio.run(collect(process_all, one, probe, processes, concurrency))
+
+
+if __name__ == "__main__":
+    try:
+        user_summary, otter_summary = run()
+        print(users.format_transfers(user_summary["transfers"]))
+        status = "Finished with failure" if user_summary["failed_pilots"] else "Finished successfully"
+        print(
+            f"{status}: users successful={user_summary['successful_pilots']} "
+            f"failed={user_summary['failed_pilots']} total={user_summary['total_pilots']} | "
+            f"otter_standalone records={otter_summary['records']} "
+            f"notebooks={otter_summary['total_notebooks']} projects={otter_summary['project_count']}"
+        )
+        if user_summary["failed_pilots"]:
+            sys.exit(1)
+    except Exception as exc:
+        print(f"Finished with failure: {exc}")
+        sys.exit(1)
@@ -0,0 +1,241 @@
+"""bench_async_pipeline.py
+
+Runs the whole collection (hub probes, users crawls, Otter Firestore streaming)
+against stand-in services both ways main.py can, and checks that both write the
+same statistics:
+  - threads: users.main and otter_standalone_use.main on one thread each, with
+    users.main's 10-thread crawl pool (main.collect())
+  - async: everything on one event loop (main.collect(use_async=True), see
+    async_pipeline.py)
+
+For each it reports wall time and the peak number of threads in the process.
+It then runs both again with a Firestore stream that fails after its first
+batch, and reports how long each takes to give up: the async run cancels
+every in-flight hub request, and the threaded run finishes the users crawl first.
+
+The stand-in hub API is bench_hub_decode's, in its own process, with --latency
+ms per request. The stand-in Firestore projects stream --records usage records
+each, in batches of --batch documents, after --firestore-latency ms per batch,
+through fakes of the sync and async Firestore clients.
+
+Usage:
+    python benchmarks/bench_async_pipeline.py
+    python benchmarks/bench_async_pipeline.py --sizes 500 20000 --hubs 40 --latency 50
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import async_pipeline  # noqa: E402
+import hub_probe  # noqa: E402
+import main as pipeline  # noqa: E402
+import otter_standalone_use  # noqa: E402
+import users  # noqa: E402
+from bench_hub_decode import serve  # noqa: E402
+
+
+class StandInError(Exception):
+    pass
+
+
+class FakeDoc:
+    def __init__(self, record):
+        self.record = record
+
+    def to_dict(self):
+        return dict(self.record)
+
+
+class FakeCollection:
+    def __init__(self, source):
+        self.source = source
+
+    def stream(self):
+        return self.source.stream()
+
+
+class FakeDB:
+    def __init__(self, source):
+        self.source = source
+
+    def collection(self, name):
+        return FakeCollection(self.source)
+
+
+class FirestoreStandIn:
+    """Stand-in Firestore projects: each streams its records in batches, after a delay per batch."""
+
+    def __init__(self, records, batch, latency, fail=False):
+        self.records = records
+        self.batch = batch
+        self.latency = latency
+        self.fail = fail
+
+    def batches(self):
+        for start in range(0, len(self.records), self.batch):
+            if self.fail and start:
+                raise StandInError("stand-in Firestore stream failed")
+            yield self.records[start:start + self.batch]
+
+    def stream(self):
+        for batch in self.batches():
+            time.sleep(self.latency / 1000)
+            yield from map(FakeDoc, batch)
+
+    async def stream_async(self):
+        for batch in self.batches():
+            await asyncio.sleep(self.latency / 1000)
+            for record in batch:
+                yield FakeDoc(record)
+
+    def install(self):
+        """Patches the sync and async Firestore clients to stream from this stand-in."""
+        otter_standalone_use.get_firestore_clients = lambda project_ids: [
+            (project_id, FakeDB(self)) for project_id in project_ids
+        ]
+        async_source = type("AsyncSource", (), {"stream": lambda _: self.stream_async()})()
+        async_pipeline.FirestoreAsyncClient = lambda project: FakeDB(async_source)
+
+
+def synthetic_records(count, seed):
+    rng = random.Random(seed)
+    start = date.today() - timedelta(weeks=150)
+    return [
+        {"timestamp": f"{start + timedelta(days=rng.randrange(150 * 7))} {rng.randrange(24):02d}:00:00",
+         "message": str(rng.randrange(1, 20))}
+        for _ in range(count)
+    ]
+
+
+class ThreadSampler:
+    """Peak threading.active_count() while running, not counting the sampler itself."""
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count() - 1)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_model(use_async):
+    """(wall seconds, peak threads, main.collect result) of one run in the current directory."""
+    with ThreadSampler() as sampler:
+        start = time.perf_counter()
+        results, errors = pipeline.collect(use_async)
+        elapsed = time.perf_counter() - start
+    return elapsed, sampler.peak, (results, errors)
+
+
+def comparable(results):
+    """The written statistics, independent of hub completion order."""
+    user_summary, otter_summary = results["users"], results["otter"]
+    return (
+        sorted(user_summary["rows"]),
+        sorted(user_summary["failures"]),
+        {url: dict(t, kept_bytes=None) for url, t in user_summary["transfers"].items()},
+        otter_summary["rows"],
+        otter_summary["total_notebooks"],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 5000], help="Users per hub (hubs of each size)")
+    parser.add_argument("--hubs", type=int, default=11, help="Hubs of each size")
+    parser.add_argument("--latency", type=float, default=30, help="Stand-in hub response delay, ms")
+    parser.add_argument("--projects", type=int, default=2, help="Stand-in Firestore projects")
+    parser.add_argument("--records", type=int, default=10000, help="Usage records per project")
+    parser.add_argument("--batch", type=int, default=300, help="Documents per Firestore stream batch")
+    parser.add_argument("--firestore-latency", type=float, default=50, help="Stand-in delay per stream batch, ms")
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve, args=(args.sizes, args.hubs, args.latency, port_queue), daemon=True
+    )
+    server.start()
+    port = port_queue.get(timeout=600)
+    api_url = lambda url, where: f"http://127.0.0.1:{port}/{url}/hub/api"  # noqa: E731
+    users.hub_api_url = hub_probe.hub_api_url = api_url
+
+    os.environ["OTTER_FIRESTORE_PROJECT_IDS"] = ",".join(f"stand-in-{n}" for n in range(args.projects))
+    records = synthetic_records(args.records, "otter")
+    pilots = [
+        {"url": f"{size}-{n}", "where": "cloudbank", "name": f"Hub {size}-{n}", "token": "stand-in"}
+        for size in args.sizes for n in range(args.hubs)
+    ]
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            Path("pilots.json").write_text(json.dumps({"pilots": pilots}))
+            users.PAGE_SIZES_PATH = Path(tmp) / "hub_page_sizes.json"
+
+            runs = {}
+            for label, use_async in (("threads", False), ("async", True)):
+                FirestoreStandIn(records, args.batch, args.firestore_latency).install()
+                elapsed, peak, (results, errors) = run_model(use_async)
+                if errors:
+                    print(f"Finished with failure: the {label} run failed: {errors}")
+                    sys.exit(1)
+                runs[label] = elapsed, peak, comparable(results)
+            if runs["threads"][2] != runs["async"][2]:
+                print("Finished with failure: the async run wrote different statistics from the threaded run")
+                sys.exit(1)
+
+            fatal = {}
+            for label, use_async in (("threads", False), ("async", True)):
+                FirestoreStandIn(records, args.batch, args.firestore_latency, fail=True).install()
+                elapsed, _, (results, errors) = run_model(use_async)
+                if not any(isinstance(error, StandInError) for error in errors):
+                    print(f"Finished with failure: the {label} run did not report the Firestore error")
+                    sys.exit(1)
+                fatal[label] = elapsed, results.get("users") is not None
+    finally:
+        os.chdir(cwd)
+        server.terminate()
+
+    hubs = len(pilots)
+    total_users = sum(args.sizes) * args.hubs
+    print(
+        f"{hubs} hubs ({total_users} users, {args.latency:g} ms per request), "
+        f"{args.projects} Firestore projects x {args.records} records "
+        f"({args.firestore_latency:g} ms per {args.batch}-document batch), "
+        f"budget {async_pipeline.CONCURRENCY}, {os.cpu_count()} CPU(s)"
+    )
+    base_time = runs["threads"][0]
+    for label, (elapsed, peak, _) in runs.items():
+        print(f"  {label:8} {elapsed:7.2f} s  ({base_time / elapsed:.2f}x)  peak threads {peak:3}")
+    for label, (elapsed, users_written) in fatal.items():
+        after = "after finishing the users crawl" if users_written else "with the users crawl cancelled"
+        print(f"  {label:8} Firestore failure: gave up in {elapsed:6.2f} s, {after}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""bench_hub_decode.py
+
+Crawls synthetic hubs from a local stand-in JupyterHub API two ways, and checks
+that both give the same statistics and term membership for every hub:
+  - thread-only: users.process_pilot on a 10-thread pool, decoding and
+    bucketing every page in the crawl threads (what users.main does by default)
+  - hybrid: the same threads only do the HTTP requests, and every page is
+    decoded, filtered and bucketed on a process pool (process_pilot's pool=)
+
+The stand-in runs in its own process, so serving pages does not compete with
+the crawl for the GIL. It answers with JupyterHub's pagination envelope at the
+default 200-user page cap, after --latency ms per request. Users are full
+JupyterHub user models (roles, groups, servers), so decoding costs what it
+does against a real hub.
+
+Process pools only pay off with more than one CPU; this prints how many there are.
+
+Usage:
+    python benchmarks/bench_hub_decode.py
+    python benchmarks/bench_hub_decode.py --sizes 1000 20000 --hubs 20 --latency 50
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import users  # noqa: E402
+
+PAGE_CAP = 200  # JupyterHub's default api_page_max_limit
+
+
+def synthetic_hub(size, seed):
+    rng = random.Random(seed)
+    now = datetime.now()
+    models = []
+    for i in range(size):
+        name = f"student{i:06d}" if i % 150 else f"service-hub-{i}"
+        active = rng.random() < 0.9
+        last_activity = (now - timedelta(seconds=rng.randrange(4 * 365 * 86400))).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        running = active and rng.random() < 0.1
+        models.append({
+            "kind": "user",
+            "name": name,
+            "admin": i % 97 == 0,
+            "roles": ["admin"] if i % 97 == 0 else ["user"],
+            "groups": [f"course-{rng.randrange(40)}"],
+            "server": f"/user/{name}/" if running else None,
+            "pending": None,
+            "created": "2023-08-20T17:03:11.000000Z",
+            "last_activity": last_activity if active else None,
+            "servers": {"": {
+                "name": "", "ready": True, "url": f"/user/{name}/", "started": last_activity,
+                "last_activity": last_activity, "state": {"pod_name": f"jupyter-{name}"},
+                "user_options": {"profile": "default"}, "progress_url": f"/hub/api/users/{name}/server/progress",
+            }} if running else {},
+        })
+    return models
+
+
+def serve(sizes, hubs, latency, port_queue):
+    """
+    Stand-in hub API: /<hub>/hub/api/users?limit=&offset=, hub names "<size>-<n>".
+    The probe's /<hub>/hub/api/ and /<hub>/hub/api/user get small JSON answers.
+    """
+    cache = {}
+
+    def page(hub, offset, limit):
+        key = (hub, offset, limit)
+        if key not in cache:
+            size = int(hub.split("-")[0])
+            models = synthetic_hub(size, hub)
+            limit = min(limit, PAGE_CAP)
+            nxt = {"offset": offset + limit, "limit": limit, "url": None} if offset + limit < size else None
+            cache[key] = json.dumps({
+                "items": models[offset:offset + limit],
+                "_pagination": {"offset": offset, "limit": limit, "total": size, "next": nxt},
+            }).encode()
+        return cache[key]
+
+    # Render every page up front, so timings don't include first-request rendering
+    for size in sizes:
+        for n in range(hubs):
+            for offset in range(0, size, PAGE_CAP):
+                page(f"{size}-{n}", offset, users.PAGE_SIZE_CEILING)
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            if url.path.endswith("/users"):
+                body = page(url.path.split("/")[1], int(query["offset"][0]), int(query["limit"][0]))
+            elif url.path.endswith("/user"):
+                body = b'{"kind": "service", "name": "stand-in"}'
+            else:
+                body = b'{"version": "4.1.5"}'
+            time.sleep(latency / 1000)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def crawl(pilots, dates, as_of, pool=None):
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(users.process_pilot, pilot, dates, None, as_of, pool) for pilot in pilots]
+        return [future.result() for future in futures]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 5000, 20000], help="Users per hub")
+    parser.add_argument("--hubs", type=int, default=10, help="Hubs of each size")
+    parser.add_argument("--latency", type=float, default=30, help="Stand-in response delay, ms")
+    parser.add_argument("--processes", type=int, default=None, help="Hybrid pool size (default: CPU count)")
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve, args=(args.sizes, args.hubs, args.latency, port_queue), daemon=True
+    )
+    server.start()
+    port = port_queue.get(timeout=600)
+    users.hub_api_url = lambda url, where: f"http://127.0.0.1:{port}/{url}/hub/api"
+
+    dates = users.generate_dates(2022, users.get_current_academic_year())
+    as_of = datetime.now()
+    print(f"{args.hubs} hubs per size, {args.latency:g} ms per request, {os.cpu_count()} CPU(s)")
+    try:
+        processes = args.processes or os.cpu_count() or 1
+        pool = users.decode_pool(processes)
+        # Workers start on first use; start them all before timing the crawls
+        startup_time, _ = timed(lambda: list(pool.map(abs, range(processes))))
+        with pool:
+            for size in args.sizes:
+                pilots = [
+                    {"url": f"{size}-{n}", "where": "cloudbank", "name": f"Hub {size}-{n}", "token": ""}
+                    for n in range(args.hubs)
+                ]
+                thread_time, threaded = timed(lambda: crawl(pilots, dates, as_of))
+                hybrid_time, hybrid = timed(lambda: crawl(pilots, dates, as_of, pool))
+                for (p1, t1, m1), (p2, t2, m2) in zip(threaded, hybrid):
+                    members_differ = {t: set(n) for t, n in m1.items()} != {t: set(n) for t, n in m2.items()}
+                    if p1 != p2 or t1 != t2 or members_differ:
+                        print(f"Finished with failure: hybrid and thread-only results differ for {p1['name']}")
+                        sys.exit(1)
+                print(f"  {size:6} users/hub:  thread-only {thread_time:7.2f} s   "
+                      f"hybrid {hybrid_time:7.2f} s  ({thread_time / hybrid_time:.2f}x)")
+        print(f"  process pool startup: {startup_time * 1000:.0f} ms")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
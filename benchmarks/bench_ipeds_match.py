@@ -0,0 +1,88 @@
+"""bench_ipeds_match.py
+
+Compares difflib.get_close_matches over every IPEDS name (what
+generate_institution_mapping.py used to run per institution) against the
+TrigramIndex lookup, and checks that both pick the same match for every query.
+
+Queries are the roster institutions recorded in config/institution_mapping.json
+plus --typos misspelled copies of each (a random character dropped, doubled or
+swapped), since real sheet entries are not always spelled like IPEDS.
+
+Usage:
+    python benchmarks/bench_ipeds_match.py
+    python benchmarks/bench_ipeds_match.py --typos 5
+"""
+
+import argparse
+import difflib
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR / "scripts"))
+
+from generate_institution_mapping import IPEDS_MASTER_PATH, MAPPING_PATH, build_ipeds_index  # noqa: E402
+from ipeds_lookup import open_lookup  # noqa: E402
+
+
+def misspell(name, rng):
+    i = rng.randrange(len(name))
+    edit = rng.choice(("drop", "double", "swap"))
+    if edit == "drop":
+        return name[:i] + name[i + 1:]
+    if edit == "double":
+        return name[:i] + name[i] + name[i:]
+    j = min(i + 1, len(name) - 1)
+    return name[:i] + name[j] + name[i + 1:j] + name[i] + name[j + 1:]
+
+
+def roster_queries(typos, seed):
+    rng = random.Random(seed)
+    names = [entry["sheet_institution"] for entry in json.loads(MAPPING_PATH.read_text())]
+    return names + [misspell(name, rng) for name in names for _ in range(typos)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--typos", type=int, default=3, help="Misspelled copies of each roster name")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ipeds_master = open_lookup(IPEDS_MASTER_PATH)
+    queries = roster_queries(args.typos, args.seed)
+
+    build_time, (_, index) = timed(lambda: build_ipeds_index(ipeds_master))
+    names = index.names
+
+    def scan():
+        return [(difflib.get_close_matches(q, names, n=1, cutoff=0.6) or [None])[0] for q in queries]
+
+    def indexed():
+        return [index.best_match(q, cutoff=0.6)[0] for q in queries]
+
+    scan_time, scan_result = timed(scan)
+    index_time, index_result = timed(indexed)
+
+    differ = [q for q, a, b in zip(queries, scan_result, index_result) if a != b]
+    if differ:
+        print(f"Finished with failure: {len(differ)} queries matched differently, e.g. {differ[:3]}")
+        sys.exit(1)
+
+    print(f"{len(queries)} queries against {len(names)} IPEDS names")
+    print(f"  index build:         {build_time * 1000:8.1f} ms")
+    print(f"  difflib full scan:   {scan_time * 1000:8.1f} ms")
+    print(f"  trigram index:       {index_time * 1000:8.1f} ms  ({scan_time / index_time:.1f}x)")
+    print(f"  unmatched queries: {index_result.count(None)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""bench_membership.py
+
+Records synthetic term membership for a set of hubs into a scratch
+membership database, then reports:
+  - storage per term for the array and bitmap encodings (membership.encode
+    keeps whichever is smaller)
+  - record_run time for a night's crawl
+  - retention / union / intersection query latency against the same counts
+    computed with Python sets of usernames, and checks that the counts agree
+
+Each hub has a user population and a per-term active fraction; users keep
+returning term to term with --retention probability, and new users join.
+
+Usage:
+    python benchmarks/bench_membership.py
+    python benchmarks/bench_membership.py --hubs 40 --users 20000
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import membership  # noqa: E402
+
+TERMS = ["fall_2024", "spring_2025", "summer_2025", "fall_2025", "spring_2026"]
+
+
+def synthetic_terms(users, retention, rng):
+    """{term: set of usernames} for one hub."""
+    population = [f"user{i:06d}" for i in range(users)]
+    joined = rng.randrange(users // 10, users // 4)
+    terms = {}
+    active = set(population[:joined])
+    for term in TERMS:
+        size = len(active)
+        if term.startswith("summer"):
+            terms[term] = set(rng.sample(sorted(active), max(1, size // 50)))
+            continue
+        terms[term] = active
+        kept = {name for name in active if rng.random() < retention}
+        new = population[joined:joined + max(1, size - len(kept))]
+        joined += len(new)
+        active = kept | set(new)
+    return terms
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hubs", type=int, default=20)
+    parser.add_argument("--users", type=int, default=5000, help="User population per hub")
+    parser.add_argument("--retention", type=float, default=0.6, help="Chance a user is active again next term")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    hubs = {(f"hub{h:02d}", "cloudbank"): synthetic_terms(args.users, args.retention, rng) for h in range(args.hubs)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = membership.connect(str(Path(tmp) / "membership.sqlite"))
+        record_time, _ = timed(lambda: [
+            membership.record_run(conn, "bench-key", date.today(), hub, where, {t: sorted(n) for t, n in terms.items()})
+            for (hub, where), terms in hubs.items()
+        ])
+        # A second identical night only ORs in bits that are already set
+        rerun_time, new_users = timed(lambda: sum(
+            membership.record_run(conn, "bench-key", date.today(), hub, where, {t: sorted(n) for t, n in terms.items()})
+            for (hub, where), terms in hubs.items()
+        ))
+
+        sizes = {"array": [0, 0], "bitmap": [0, 0]}
+        for encoding, data in conn.execute("SELECT encoding, data FROM term_members"):
+            sizes[encoding][0] += 1
+            sizes[encoding][1] += len(data)
+        stored = sum(size for _, size in sizes.values())
+        members = sum(len(names) for terms in hubs.values() for names in terms.values())
+        name_bytes = sum(len(name) for terms in hubs.values() for names in terms.values() for name in names)
+
+        queries = [
+            ("retention fall_2024 -> spring_2025",
+             lambda: membership.retention(conn, "fall_2024", "spring_2025")[0],
+             lambda: sum(len(t["fall_2024"] & t["spring_2025"]) for t in hubs.values())),
+            ("union of all terms",
+             lambda: membership.union_count(conn, TERMS),
+             lambda: sum(len(set().union(*t.values())) for t in hubs.values())),
+            ("intersection fall_2025 & spring_2026",
+             lambda: membership.intersection_count(conn, ["fall_2025", "spring_2026"]),
+             lambda: sum(len(t["fall_2025"] & t["spring_2026"]) for t in hubs.values())),
+        ]
+        rows = []
+        for label, query, expected in queries:
+            query_time, got = timed(query, repeat=20)
+            set_time, want = timed(expected, repeat=20)
+            if got != want:
+                print(f"Finished with failure: {label} counted {got}, sets counted {want}")
+                sys.exit(1)
+            rows.append((label, got, query_time, set_time))
+        conn.close()
+
+    if new_users:
+        print(f"Finished with failure: re-recording the same night added {new_users} users")
+        sys.exit(1)
+
+    print(f"{args.hubs} hubs x {len(TERMS)} terms, {members} term memberships")
+    for encoding, (count, size) in sizes.items():
+        print(f"  {encoding:6} terms: {count:4}  {size / 1024:8.1f} KiB")
+    print(f"  stored bitsets: {stored / 1024:8.1f} KiB  ({stored / members:.2f} bytes/membership; usernames alone: {name_bytes / 1024:.1f} KiB)")
+    print(f"  record_run (first night):  {record_time * 1000:8.1f} ms")
+    print(f"  record_run (repeat night): {rerun_time * 1000:8.1f} ms")
+    for label, count, query_time, set_time in rows:
+        print(f"  {label:38} {count:7}  {query_time * 1000:7.2f} ms  (Python sets in memory: {set_time * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
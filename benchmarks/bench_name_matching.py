@@ -0,0 +1,125 @@
+"""bench_name_matching.py
+
+Matches a batch of hub display names against a synthetic 10k-institution
+roster two ways, and checks that both give the same match and score for every
+query:
+  - per-name difflib.get_close_matches plus a second SequenceMatcher ratio for
+    the score (what check_deployment_sync.py / generate_institution_mapping.py
+    used to run)
+  - TrigramIndex.close_matches on the whole batch, serially and on a process pool
+
+Queries are roster names with a typo, names with a word swapped for another
+from the same vocabulary (near misses), and names that aren't on the roster.
+
+Usage:
+    python benchmarks/bench_name_matching.py
+    python benchmarks/bench_name_matching.py --roster 20000 --queries 500
+"""
+
+import argparse
+import difflib
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR / "scripts"))
+
+import name_matching  # noqa: E402
+from name_matching import TrigramIndex  # noqa: E402
+
+PLACES = [
+    "Alameda", "Bakersfield", "Cascade", "Delta", "Evergreen", "Foothill", "Glendale",
+    "Harbor", "Inland", "Jefferson", "Kern", "Lakeview", "Mesa", "North Valley",
+    "Orange", "Pacific", "Redwood", "Sierra", "Tri-County", "Upland", "Ventura",
+    "Westfield", "Yuba", "Zion", "Atlanta", "Boston", "Chicago", "Denver", "Eastern",
+    "Fresno", "Georgetown", "Houston", "Iowa", "Jackson", "Kansas", "Lincoln",
+]
+QUALIFIERS = ["", "East ", "West ", "North ", "South ", "Central ", "New ", "Saint "]
+KINDS = [
+    "{} College", "{} Community College", "{} State University", "University of {}",
+    "{} Technical College", "{} City College", "{} Institute of Technology",
+    "{} College of Nursing", "{} School of Art and Design", "{} Polytechnic",
+]
+
+
+def synthetic_roster(size, rng):
+    names = set()
+    while len(names) < size:
+        place = rng.choice(QUALIFIERS) + rng.choice(PLACES)
+        if rng.random() < 0.5:
+            place += " " + rng.choice(PLACES)
+        names.add(rng.choice(KINDS).format(place))
+    return sorted(names)
+
+
+def synthetic_queries(roster, count, rng):
+    queries = []
+    for i in range(count):
+        name = rng.choice(roster)
+        kind = i % 3
+        if kind == 0:
+            j = rng.randrange(len(name))
+            queries.append(name[:j] + name[j + 1:])
+        elif kind == 1:
+            words = name.split()
+            words[rng.randrange(len(words))] = rng.choice(PLACES)
+            queries.append(" ".join(words))
+        else:
+            queries.append(f"{rng.choice(PLACES)} Academy of {rng.choice(PLACES)} Sciences")
+    return queries
+
+
+def difflib_matches(queries, roster):
+    results = []
+    for query in queries:
+        best = difflib.get_close_matches(query, roster, n=1, cutoff=0.6)
+        if not best:
+            results.append((None, 0))
+            continue
+        results.append((best[0], round(difflib.SequenceMatcher(None, query, best[0]).ratio() * 100)))
+    return results
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--roster", type=int, default=10_000, help="Synthetic roster size")
+    parser.add_argument("--queries", type=int, default=300, help="Names to match against the roster")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    roster = synthetic_roster(args.roster, rng)
+    queries = synthetic_queries(roster, args.queries, rng)
+
+    build_time, index = timed(lambda: TrigramIndex(roster))
+    scan_time, expected = timed(lambda: difflib_matches(queries, roster))
+
+    name_matching.PROCESS_POOL_THRESHOLD = len(queries) + 1
+    serial_time, serial = timed(lambda: index.close_matches(queries))
+    name_matching.PROCESS_POOL_THRESHOLD = 0
+    pool_time, pooled = timed(lambda: index.close_matches(queries))
+
+    for label, result in (("serial", serial), ("process pool", pooled)):
+        differ = [q for q, a, b in zip(queries, expected, result) if a != b]
+        if differ:
+            print(f"Finished with failure: {label} matched {len(differ)} queries differently, e.g. {differ[:3]}")
+            sys.exit(1)
+
+    print(f"{len(queries)} queries against a {len(roster)}-institution roster")
+    print(f"  index build:            {build_time * 1000:9.1f} ms")
+    print(f"  per-name difflib:       {scan_time * 1000:9.1f} ms")
+    print(f"  close_matches (serial): {serial_time * 1000:9.1f} ms  ({scan_time / serial_time:.1f}x)")
+    print(f"  close_matches (pool):   {pool_time * 1000:9.1f} ms  ({scan_time / pool_time:.1f}x)")
+    print(f"  unmatched queries: {sum(1 for name, _ in serial if name is None)}")
+
+
+if __name__ == "__main__":
+    main()
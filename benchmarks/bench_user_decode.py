@@ -0,0 +1,108 @@
+"""bench_user_decode.py
+
+Decodes synthetic /users pages (full JupyterHub user models, in the pagination
+envelope) the two ways users._decode_page can, and checks they give the same
+lean users:
+  - json: json.loads of the whole page, then each user cut down to USER_FIELDS
+  - msgspec: decoded straight into LeanUser dicts (only if msgspec is installed)
+
+For each it reports decode time per page, throughput, and the allocations per
+page from tracemalloc: the peak while decoding and what the decoded page keeps.
+
+Usage:
+    python benchmarks/bench_user_decode.py
+    python benchmarks/bench_user_decode.py --page-size 1000 --pages 50
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import users  # noqa: E402
+from bench_hub_decode import synthetic_hub  # noqa: E402
+
+
+def synthetic_pages(pages, page_size):
+    models = synthetic_hub(pages * page_size, "decode")
+    bodies = []
+    for i in range(pages):
+        offset = i * page_size
+        nxt = {"offset": offset + page_size, "limit": page_size, "url": None} if i + 1 < pages else None
+        bodies.append(json.dumps({
+            "items": models[offset:offset + page_size],
+            "_pagination": {"offset": offset, "limit": page_size, "total": len(models), "next": nxt},
+        }).encode())
+    return bodies
+
+
+def decode_all(bodies):
+    return [users._decode_page(body) for body in bodies]
+
+
+def allocations(body):
+    """(peak, retained) bytes allocated decoding one page."""
+    tracemalloc.start()
+    page = users._decode_page(body)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del page
+    return peak, retained
+
+
+def measure(bodies, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = decode_all(bodies)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    peaks, kept = zip(*(allocations(body) for body in bodies))
+    return best, result, sum(peaks) / len(peaks), sum(kept) / len(kept)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=25)
+    parser.add_argument("--page-size", type=int, default=200, help="Users per page (JupyterHub's default cap is 200)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    bodies = synthetic_pages(args.pages, args.page_size)
+    total_bytes = sum(len(body) for body in bodies)
+    decoder = users._page_decoder
+
+    paths = [("json", None)]
+    if decoder is not None:
+        paths.append(("msgspec", decoder))
+    results = {}
+    for label, path_decoder in paths:
+        users._page_decoder = path_decoder
+        results[label] = measure(bodies, args.repeat)
+    users._page_decoder = decoder
+
+    expected = results["json"][1]
+    for label, (_, result, _, _) in results.items():
+        if result != expected:
+            print(f"Finished with failure: {label} decoded the pages differently from json")
+            sys.exit(1)
+
+    print(f"{args.pages} pages x {args.page_size} users, {total_bytes / args.pages / 1024:.0f} KiB per page")
+    base_time = results["json"][0]
+    for label, (elapsed, _, peak, kept) in results.items():
+        per_page = elapsed / args.pages
+        print(
+            f"  {label:8} {per_page * 1000:7.2f} ms/page  {total_bytes / elapsed / 2**20:7.1f} MiB/s  "
+            f"({base_time / elapsed:.1f}x)  peak {peak / 1024:7.0f} KiB/page  kept {kept / 1024:6.0f} KiB/page"
+        )
+    if decoder is None:
+        print("  msgspec is not installed; only the json path was measured")
+
+
+if __name__ == "__main__":
+    main()
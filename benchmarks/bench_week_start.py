@@ -0,0 +1,81 @@
+"""bench_week_start.py
+
+Compares the row-wise resolve_week_start apply (what build_dashboard.py used
+to run) against the column-wise resolve_week_starts on a synthetic multi-year
+Otter history, and checks that both resolve every row to the same date.
+
+The synthetic history has one row per (Year-Month, Week Of Year) key for
+every day in the range, exactly like otter_standalone_use.py writes it,
+repeated --copies times to stand in for several Firestore projects.
+
+Usage:
+    python benchmarks/bench_week_start.py
+    python benchmarks/bench_week_start.py --years 50 --copies 4
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR / "scripts"))
+
+from build_dashboard import resolve_week_start, resolve_week_starts  # noqa: E402
+
+
+def synthetic_otter_history(years, copies):
+    keys = {}
+    day = date(date.today().year - years, 1, 1)
+    end = date.today()
+    while day <= end:
+        keys[(f"{day.year}-{day.month:02d}", day.isocalendar()[1])] = day - timedelta(days=day.weekday())
+        day += timedelta(days=1)
+    rows = [
+        {"Year-Month": year_month, "Week Of Year": week, "expected": expected}
+        for (year_month, week), expected in keys.items()
+    ]
+    return pd.DataFrame(rows * copies)
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=25, help="Years of weekly history to synthesize")
+    parser.add_argument("--copies", type=int, default=2, help="Times each week key is repeated")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    otter_df = synthetic_otter_history(args.years, args.copies)
+
+    row_time, row_result = best_of(args.repeat, lambda: pd.to_datetime(
+        otter_df.apply(lambda row: resolve_week_start(row["Year-Month"], row["Week Of Year"]), axis=1)
+    ))
+    col_time, col_result = best_of(args.repeat, lambda: resolve_week_starts(
+        otter_df["Year-Month"], otter_df["Week Of Year"]
+    ))
+
+    if (row_result != col_result).any():
+        print("Finished with failure: row-wise and column-wise week starts differ")
+        sys.exit(1)
+    mismatched = int((col_result != pd.to_datetime(otter_df["expected"])).sum())
+
+    print(f"{len(otter_df)} rows ({args.years} years x {args.copies} copies)")
+    print(f"  row-wise apply:      {row_time * 1000:8.1f} ms")
+    print(f"  resolve_week_starts: {col_time * 1000:8.1f} ms  ({row_time / col_time:.1f}x)")
+    print(f"  rows whose resolved week differs from the true ISO Monday: {mismatched}")
+
+
+if __name__ == "__main__":
+    main()
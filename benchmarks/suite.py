@@ -0,0 +1,329 @@
+"""suite.py
+
+CPU-side microbenchmarks for the aggregation hot paths, on synthetic data at
+1x, 10x and 100x today's sizes (BASE_SIZES, taken from the checked-in
+users.csv, otter_standalone_use.csv and config/institution_mapping.json).
+Nothing touches the network, so it runs offline.
+
+Cases:
+    summarize_users   users.summarize_users (process_pilot's filtering, rolling
+                      windows and term counts) over every hub's users
+    users_totals      users.accumulate_stats (the users.main totals loop)
+    otter_weeks       otter_standalone_use.aggregate_weeks over Firestore records
+    dashboard_terms   build_dashboard.build_users_section (semester columns, AY totals)
+    dashboard_weeks   build_dashboard.build_otter_section on an Otter history
+                      without "Week Start", so every week start is resolved
+    fuzzy_match       name_matching.TrigramIndex.close_matches of roster names and
+                      misspellings against the checked-in IPEDS names
+
+Each case is timed like timeit: calls are batched until a sample takes at least
+MIN_SAMPLE_SECONDS, and the best of --repeat samples is kept. Results go to
+benchmarks/results/<timestamp>.json and are compared with a baseline: --baseline,
+or else the newest earlier results file. A case slower than the baseline by more
+than --threshold (a fraction) is a regression, and the run exits non-zero.
+Cases whose imports are unavailable are reported as skipped.
+
+Usage:
+    python benchmarks/suite.py
+    python benchmarks/suite.py --scales 1 10 --case otter_weeks --case users_totals
+    python benchmarks/suite.py --baseline benchmarks/results/20260101-120000.json --threshold 0.1
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "scripts"))
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_SCALES = (1, 10, 100)
+DEFAULT_THRESHOLD = 0.25
+MIN_SAMPLE_SECONDS = 0.05
+
+# 1x: today's data
+BASE_SIZES = {
+    "hubs": 22,  # users.csv rows
+    "users": 3000,  # users.csv all-users total
+    "otter_records": 10210,  # one Firestore record per submission (sum of "Number of Users")
+    "otter_weeks": 145,  # otter_standalone_use.csv rows
+    "roster": 56,  # config/institution_mapping.json entries
+}
+
+
+def _today_dates():
+    import users
+
+    return users.generate_dates(2022, users.get_current_academic_year())
+
+
+def synthetic_users(count, rng):
+    """JupyterHub user models (lean fields) with activity over the last four years,
+    a few admins and service accounts, and some never-active users."""
+    now = datetime.now()
+    users = []
+    for i in range(count):
+        name = f"student{i:07d}"
+        roles = ["user"]
+        admin = False
+        if i % 97 == 0:
+            roles, admin = ["admin"], True
+        elif i % 211 == 0:
+            name = f"service-hub-{i}"
+        last_activity = None
+        if rng.random() < 0.9:
+            when = now - timedelta(seconds=rng.randrange(4 * 365 * 86400))
+            last_activity = when.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        users.append({"name": name, "admin": admin, "roles": roles, "last_activity": last_activity})
+    return users
+
+
+def case_summarize_users(scale, rng):
+    import users
+
+    dates = _today_dates()
+    hubs = BASE_SIZES["hubs"]
+    per_hub = BASE_SIZES["users"] * scale // hubs
+    pilots = [({"name": f"Hub {h}", "where": "cloudbank"}, synthetic_users(per_hub, rng)) for h in range(hubs)]
+    as_of = datetime.now()
+
+    def run():
+        for pilot, hub_users in pilots:
+            users.summarize_users(pilot, hub_users, dates, as_of)
+
+    return run, per_hub * hubs
+
+
+def case_users_totals(scale, rng):
+    import users
+
+    dates = _today_dates()
+    columns = users.rolling_columns() + [term for term, _, _ in dates]
+    results = []
+    for h in range(BASE_SIZES["hubs"] * scale):
+        p = {"name": f"Hub {h}", "where": "cloudbank", "number_all_users": rng.randrange(500)}
+        p["number_all_users_ever_active"] = rng.randrange(p["number_all_users"] + 1)
+        p.update((column, rng.randrange(200)) for column in columns)
+        results.append(p)
+
+    def run():
+        users.accumulate_stats(users.config_stats(dates), results, dates)
+
+    return run, len(results)
+
+
+def case_otter_weeks(scale, rng):
+    import otter_standalone_use
+
+    days = BASE_SIZES["otter_weeks"] * 7
+    start = date.today() - timedelta(days=days)
+    records = [
+        {
+            "timestamp": f"{start + timedelta(days=rng.randrange(days))} {rng.randrange(24):02d}:00:00",
+            "message": str(rng.randrange(1, 20)),
+        }
+        for _ in range(BASE_SIZES["otter_records"] * scale)
+    ]
+
+    def run():
+        otter_standalone_use.aggregate_weeks(records)
+
+    return run, len(records)
+
+
+def case_dashboard_terms(scale, rng):
+    import pandas as pd
+    from build_dashboard import academic_year_start, build_users_section
+
+    import users
+
+    columns = users.csv_header(_today_dates())
+    rows = []
+    for h in range(BASE_SIZES["hubs"] * scale):
+        counts = [rng.randrange(300) for _ in columns[2:]]
+        rows.append([f"College {h:05d}", "cloudbank" if h % 3 else "icor"] + counts)
+    users_df = pd.DataFrame(rows, columns=columns)
+    ay_start = academic_year_start(date.today())
+
+    def run():
+        build_users_section(users_df, ay_start)
+
+    return run, len(rows)
+
+
+def case_dashboard_weeks(scale, rng):
+    import pandas as pd
+    from build_dashboard import build_otter_section
+
+    # One row per (Year-Month, Week Of Year) key, like otter_standalone_use.csv,
+    # repeated per scale step to stand in for more Firestore projects
+    keys = {}
+    day = date.today() - timedelta(weeks=BASE_SIZES["otter_weeks"])
+    while day <= date.today():
+        keys[(f"{day.year}-{day.month:02d}", day.isocalendar()[1])] = None
+        day += timedelta(days=1)
+    rows = [
+        {"Year-Month": year_month, "Week Of Year": week,
+         "Number of Users": rng.randrange(100), "Number of Notebooks": rng.randrange(500)}
+        for year_month, week in keys
+    ] * scale
+    otter_df = pd.DataFrame(rows)
+
+    def run():
+        build_otter_section(otter_df)
+
+    return run, len(rows)
+
+
+def _misspell(name, rng):
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice("aeiourstln") + name[i + 1:]
+
+
+def case_fuzzy_match(scale, rng):
+    from generate_institution_mapping import IPEDS_MASTER_PATH, MAPPING_PATH, build_ipeds_index
+    from ipeds_lookup import open_lookup
+
+    _, index = build_ipeds_index(open_lookup(IPEDS_MASTER_PATH))
+    names = [entry["sheet_institution"] for entry in json.loads(MAPPING_PATH.read_text())]
+    queries = list(names)
+    while len(queries) < BASE_SIZES["roster"] * scale:
+        queries.append(_misspell(rng.choice(names), rng))
+
+    def run():
+        index.close_matches(queries)
+
+    return run, len(queries)
+
+
+CASES = {
+    "summarize_users": case_summarize_users,
+    "users_totals": case_users_totals,
+    "otter_weeks": case_otter_weeks,
+    "dashboard_terms": case_dashboard_terms,
+    "dashboard_weeks": case_dashboard_weeks,
+    "fuzzy_match": case_fuzzy_match,
+}
+
+
+def measure(fn, repeat):
+    """Best and median seconds per call, over repeat samples of batched calls."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SAMPLE_SECONDS:
+            break
+        number *= 10 if elapsed < MIN_SAMPLE_SECONDS / 10 else 2
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    samples.sort()
+    return samples[0], samples[len(samples) // 2]
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def latest_results(exclude=None):
+    files = sorted(p for p in RESULTS_DIR.glob("*.json") if p != exclude)
+    return files[-1] if files else None
+
+
+def compare(results, baseline, threshold):
+    """{key: ratio} against the baseline, and the keys that regressed."""
+    ratios = {}
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if "best" not in result or not before or "best" not in before:
+            continue
+        ratios[key] = result["best"] / before["best"]
+        if ratios[key] > 1 + threshold:
+            regressions.append(key)
+    return ratios, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES))
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="Run only these cases (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing samples per case (best is compared)")
+    parser.add_argument("--baseline", type=Path, help="Results file to compare with (default: the newest in benchmarks/results/)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown, as a fraction")
+    parser.add_argument("--output", type=Path, help="Results file to write (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    baseline_path = args.baseline or latest_results(exclude=output)
+    baseline = json.loads(baseline_path.read_text())["results"] if baseline_path else {}
+
+    results = {}
+    for name in args.case or CASES:
+        for scale in args.scales:
+            key = f"{name}@{scale}x"
+            try:
+                run, items = CASES[name](scale, random.Random(args.seed))
+            except ImportError as exc:
+                results[key] = {"skipped": str(exc)}
+                print(f"  {key:22} skipped: {exc}")
+                continue
+            best, median = measure(run, args.repeat)
+            results[key] = {"items": items, "best": best, "median": median}
+            before = baseline.get(key, {}).get("best")
+            change = f"  {best / before - 1:+7.1%}" if before else ""
+            print(
+                f"  {key:22} {items:9} items  {best * 1000:10.2f} ms  "
+                f"{best / items * 1e6:8.2f} us/item{change}"
+            )
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "base_sizes": BASE_SIZES,
+        "repeat": args.repeat,
+        "results": results,
+    }, indent=2) + "\n")
+    print(f"Wrote {output}")
+
+    _, regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(
+            f"Finished with failure: {len(regressions)} case(s) more than {args.threshold:.0%} slower "
+            f"than {baseline_path}: {', '.join(regressions)}"
+        )
+        sys.exit(1)
+    compared = f" (compared with {baseline_path})" if baseline_path else " (no baseline to compare with)"
+    print(f"Finished successfully: {sum('best' in r for r in results.values())} cases timed{compared}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+cassettes.py
+
+Records the HTTP traffic of a real crawl into a cassette, then replays it with
+no network and no tokens. Any code change can then be profiled against a frozen
+copy of a real night's workload.
+
+A cassette holds every response in the order it was requested, with its status,
+Content-Type, body and the time the request took. Replay answers each
+(method, URL) with the next response recorded for it, after sleeping for the
+recorded time divided by --speed (0 means no delay). The run therefore keeps
+the real request pattern and overlap of network waits, and everything between
+the requests (decoding, filtering, counting, writing) runs at full speed.
+
+Responses are sanitized before they are written:
+    - Request headers (the hub tokens) are never recorded.
+    - Usernames in JupyterHub user models are replaced by salted hashes
+      everywhere they appear. The salt is not stored, so names cannot be
+      recovered. Service accounts ("service-hub", "deployment-service") keep
+      their names, so the users.py filters still drop them. JSON bodies are
+      re-serialized compactly, so they can be a little smaller than on the wire.
+    - CSV responses (the roster sheet) keep only the columns roster.py reads.
+
+Targets:
+    users    users.main over every pilot (without the probe, whose raw TLS
+             handshakes are not HTTP)
+    nsf      build_nsf_report.build_report (builds the report, never submits)
+
+Both run in a temporary directory, so users.csv, users.arrow, membership.sqlite
+and the caches in the checkout are not touched.
+
+Usage:
+    python cassettes.py record users [cassette]    # needs pilots.json
+    python cassettes.py replay users [cassette] [--speed 10] [--memory]
+    python cassettes.py record nsf [cassette]
+    python cassettes.py replay nsf [cassette] [--speed 0]
+
+Outputs:
+    - .cache/cassettes/<target>.json.gz by default (gitignored, like the rest of .cache/)
+"""
+
+import argparse
+import base64
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+BASE_DIR = Path(__file__).parent
+CASSETTE_DIR = BASE_DIR / ".cache" / "cassettes"
+CASSETTE_VERSION = 1
+SERVICE_ACCOUNT_MARKERS = ("service-hub", "deployment-service")  # see users.process_pilot
+CSV_COLUMNS = ("Institution", "Notes")  # all roster.load_roster reads
+REPLAY_HMAC_KEY = "cassette-replay"  # NSF pseudonyms in a replay only need to be consistent
+
+
+def _pseudonymize(body, salt):
+    """Returns a decoded JSON body with its usernames replaced."""
+    names = {}
+
+    def collect(value):
+        if isinstance(value, dict):
+            name = value.get("name")
+            # User models (server models also have a name and last_activity, but no admin flag)
+            if name and isinstance(name, str) and "admin" in value and not any(
+                marker in name for marker in SERVICE_ACCOUNT_MARKERS
+            ):
+                names[name] = "u" + hashlib.sha256(salt + name.encode()).hexdigest()[:15]
+            for item in value.values():
+                collect(item)
+        elif isinstance(value, list):
+            for item in value:
+                collect(item)
+
+    def replace(value):
+        if isinstance(value, dict):
+            return {key: replace(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [replace(item) for item in value]
+        if isinstance(value, str):
+            if value in names:
+                return names[value]
+            if "/" in value:
+                # Server URLs, e.g. "/user/<name>/"
+                return "/".join(names.get(part, part) for part in value.split("/"))
+        return value
+
+    collect(body)
+    return replace(body) if names else body
+
+
+def _sanitize(content_type, content, salt):
+    if "json" in content_type:
+        try:
+            body = json.loads(content)
+        except ValueError:
+            return content
+        return json.dumps(_pseudonymize(body, salt), separators=(",", ":")).encode()
+    if "csv" in content_type:
+        reader = csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+        out = io.StringIO()
+        writer = csv.DictWriter(out, CSV_COLUMNS, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(reader)
+        return out.getvalue().encode()
+    return content
+
+
+class Recorder:
+    """Wraps HTTPAdapter.send and keeps a sanitized copy of every exchange."""
+
+    def __init__(self, send):
+        self.send_real = send
+        self.interactions = []
+        self._salt = os.urandom(16)
+        self._lock = threading.Lock()
+
+    def send(self, adapter, request, **kwargs):
+        start = time.perf_counter()
+        interaction = {"method": request.method, "url": request.url}
+        try:
+            response = self.send_real(adapter, request, **kwargs)
+            content = response.content  # read the body inside the timed window
+        except requests.RequestException as exc:
+            interaction.update(error=type(exc).__name__, elapsed_ms=(time.perf_counter() - start) * 1000)
+            with self._lock:
+                self.interactions.append(interaction)
+            raise
+        content_type = response.headers.get("Content-Type", "")
+        body = _sanitize(content_type, content, self._salt)
+        try:
+            interaction["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            interaction["body_b64"] = base64.b64encode(body).decode()
+        interaction.update(
+            status=response.status_code,
+            reason=response.reason,
+            content_type=content_type,
+            elapsed_ms=(time.perf_counter() - start) * 1000,
+        )
+        with self._lock:
+            self.interactions.append(interaction)
+        return response
+
+
+class Player:
+    """Answers HTTPAdapter.send from recorded interactions."""
+
+    def __init__(self, interactions, speed=1.0):
+        self.speed = speed
+        self.replayed = 0
+        self.misses = []
+        self._queues = defaultdict(deque)
+        for interaction in interactions:
+            self._queues[(interaction["method"], interaction["url"])].append(interaction)
+        self._lock = threading.Lock()
+
+    def send(self, adapter, request, **kwargs):
+        with self._lock:
+            queue = self._queues.get((request.method, request.url))
+            interaction = queue.popleft() if queue else None
+            if interaction is None:
+                self.misses.append(f"{request.method} {request.url}")
+            else:
+                self.replayed += 1
+        if interaction is None:
+            raise requests.ConnectionError(f"No recorded response for {request.method} {request.url}", request=request)
+        if self.speed:
+            time.sleep(interaction["elapsed_ms"] / 1000 / self.speed)
+        if "error" in interaction:
+            raise getattr(requests, interaction["error"], requests.ConnectionError)(
+                f"Recorded {interaction['error']}", request=request
+            )
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.reason = interaction["reason"]
+        response.headers = CaseInsensitiveDict({"Content-Type": interaction["content_type"]})
+        if "body_b64" in interaction:
+            response._content = base64.b64decode(interaction["body_b64"])
+        else:
+            response._content = interaction["body"].encode("utf-8")
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        return response
+
+
+@contextmanager
+def _patched_send(handler):
+    original = HTTPAdapter.send
+    HTTPAdapter.send = lambda adapter, request, **kwargs: handler.send(adapter, request, **kwargs)
+    try:
+        yield handler
+    finally:
+        HTTPAdapter.send = original
+
+
+@contextmanager
+def recording():
+    """Records every requests call made inside the block (see Recorder)."""
+    with _patched_send(Recorder(HTTPAdapter.send)) as recorder:
+        yield recorder
+
+
+@contextmanager
+def replaying(interactions, speed=1.0):
+    """Serves every requests call made inside the block from interactions (see Player)."""
+    with _patched_send(Player(interactions, speed)) as player:
+        yield player
+
+
+def save_cassette(path, cassette):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.GzipFile(path, "wb", compresslevel=9, mtime=0) as f:
+        f.write(json.dumps(cassette, separators=(",", ":")).encode())
+
+
+def load_cassette(path):
+    with gzip.open(path, "rb") as f:
+        cassette = json.loads(f.read())
+    if cassette.get("version") != CASSETTE_VERSION:
+        raise ValueError(f"{path} is cassette version {cassette.get('version')}, expected {CASSETTE_VERSION}")
+    return cassette
+
+
+@contextmanager
+def _scratch_dir():
+    """Runs the block in a temporary working directory."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            yield Path(tmp)
+        finally:
+            os.chdir(cwd)
+
+
+def _public_pilots(pilots):
+    return [{key: value for key, value in pilot.items() if key != "token"} for pilot in pilots]
+
+
+def run_users(pilots, page_sizes):
+    """users.main over pilots from a scratch directory. Returns its summary."""
+    import users
+
+    page_sizes_path = users.PAGE_SIZES_PATH
+    with _scratch_dir() as tmp:
+        Path("pilots.json").write_text(json.dumps({"pilots": pilots}))
+        users.PAGE_SIZES_PATH = tmp / "hub_page_sizes.json"
+        users.PAGE_SIZES_PATH.write_text(json.dumps(page_sizes))
+        try:
+            summary = users.main(True, None, probe=False)
+        finally:
+            users.PAGE_SIZES_PATH = page_sizes_path
+    return {key: summary[key] for key in ("total_pilots", "successful_pilots", "failed_pilots", "failures")}
+
+
+def run_nsf(pilots, page_sizes):
+    """build_nsf_report.build_report from a scratch directory. Returns a summary."""
+    sys.path.insert(0, str(BASE_DIR / "scripts"))
+    import build_nsf_report
+    import roster
+    import users
+
+    saved = (build_nsf_report.PILOTS_PATH, users.PAGE_SIZES_PATH, roster.CACHE_DIR, roster.CACHE_CSV, roster.CACHE_META)
+    with _scratch_dir() as tmp:
+        build_nsf_report.PILOTS_PATH = tmp / "pilots.json"
+        build_nsf_report.PILOTS_PATH.write_text(json.dumps({"pilots": pilots}))
+        users.PAGE_SIZES_PATH = tmp / "hub_page_sizes.json"
+        users.PAGE_SIZES_PATH.write_text(json.dumps(page_sizes))
+        # Always fetch the roster sheet, so it is in the cassette
+        roster.CACHE_DIR = tmp / ".cache"
+        roster.CACHE_CSV = roster.CACHE_DIR / "roster.csv"
+        roster.CACHE_META = roster.CACHE_DIR / "roster.meta.json"
+        roster.load_roster.cache_clear()
+        try:
+            problems, warnings = [], []
+            records = list(build_nsf_report.build_report(REPLAY_HMAC_KEY, problems, warnings, {}))
+        finally:
+            (build_nsf_report.PILOTS_PATH, users.PAGE_SIZES_PATH,
+             roster.CACHE_DIR, roster.CACHE_CSV, roster.CACHE_META) = saved
+            roster.load_roster.cache_clear()
+    return {"records": len(records), "problems": problems, "warnings": len(warnings)}
+
+
+TARGETS = {"users": run_users, "nsf": run_nsf}
+
+
+def record(target, path):
+    """Runs target against the real hubs and writes the cassette. Returns the cassette."""
+    import users
+
+    with open("pilots.json") as f:
+        pilots = json.load(f)["pilots"]
+    # The cache file as stored ("<where>/<url>" keys), so it round-trips through the cassette
+    page_sizes = json.loads(users.PAGE_SIZES_PATH.read_text()) if users.PAGE_SIZES_PATH.exists() else {}
+    start = time.perf_counter()
+    with recording() as recorder:
+        summary = TARGETS[target](pilots, page_sizes)
+    cassette = {
+        "version": CASSETTE_VERSION,
+        "target": target,
+        "recorded": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "wall_seconds": time.perf_counter() - start,
+        "pilots": _public_pilots(pilots),
+        "page_sizes": page_sizes,
+        "summary": summary,
+        "interactions": recorder.interactions,
+    }
+    save_cassette(path, cassette)
+    return cassette
+
+
+def replay(cassette, speed=1.0, memory=False):
+    """
+    Runs the cassette's target against its recorded responses.
+
+    Args:
+        cassette (dict): Loaded cassette.
+        speed (float): Latency divisor; 0 replays without delays.
+        memory (bool): Trace allocations (slower) and report the peak.
+
+    Returns:
+        dict: wall_seconds, peak_bytes (or None), replayed, misses, summary.
+    """
+    pilots = [dict(pilot, token="") for pilot in cassette["pilots"]]
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with replaying(cassette["interactions"], speed) as player:
+        summary = TARGETS[cassette["target"]](pilots, cassette["page_sizes"])
+    wall_seconds = time.perf_counter() - start
+    peak_bytes = None
+    if memory:
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        "wall_seconds": wall_seconds,
+        "peak_bytes": peak_bytes,
+        "replayed": player.replayed,
+        "misses": player.misses,
+        "summary": summary,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay the hub traffic of a crawl")
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("target", choices=sorted(TARGETS))
+    parser.add_argument("cassette", nargs="?", help="Cassette file (default .cache/cassettes/<target>.json.gz)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay latency divisor; 0 for no delays")
+    parser.add_argument("--memory", action="store_true", help="Report peak traced allocations (slower)")
+    args = parser.parse_args()
+    path = Path(args.cassette or CASSETTE_DIR / f"{args.target}.json.gz")
+
+    if args.mode == "record":
+        cassette = record(args.target, path)
+        print(
+            f"Recorded {len(cassette['interactions'])} requests in {cassette['wall_seconds']:.1f}s "
+            f"to {path} ({path.stat().st_size / 1024:.0f} KiB)"
+        )
+        print(f"Finished successfully: {cassette['summary']}")
+        return
+
+    cassette = load_cassette(path)
+    result = replay(cassette, args.speed, args.memory)
+    print(
+        f"Replayed {result['replayed']} of {len(cassette['interactions'])} requests from {path} "
+        f"(recorded {cassette['recorded']}, {cassette['wall_seconds']:.1f}s) at speed {args.speed:g}"
+    )
+    print(f"  wall time: {result['wall_seconds']:.2f}s")
+    if result["peak_bytes"] is not None:
+        print(f"  peak traced memory: {result['peak_bytes'] / 2**20:.1f} MiB")
+    if result["summary"] != cassette["summary"]:
+        print(f"  summary differs from the recording: {result['summary']} (recorded {cassette['summary']})")
+    if result["misses"]:
+        print(f"Finished with failure: {len(result['misses'])} requests not in the cassette, e.g. {result['misses'][:3]}")
+        sys.exit(1)
+    print(f"Finished successfully: {result['summary']}")
+
+
+if __name__ == "__main__":
+    main()
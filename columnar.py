@@ -0,0 +1,68 @@
+"""
+columnar.py
+
+Typed, memory-mappable Arrow IPC copies of users.csv and
+otter_standalone_use.csv. Each file holds only data rows; anything that
+used to be a summary row or a preamble line (e.g. users.csv's "Total" rows,
+otter_standalone_use.csv's "Total:" line) is stored as JSON in the schema
+metadata under b"totals" instead.
+
+The CSVs are still written alongside as human-readable views of the same rows.
+
+Readers:
+    columnar.read_frame(path)   # pandas DataFrame backed by the mapped file
+    columnar.read_totals(path)  # the metadata totals as a dict
+"""
+
+import json
+
+import pyarrow as pa
+
+TOTALS_KEY = b"totals"
+
+
+def write_table(path, schema, rows, totals):
+    """
+    Writes rows to an uncompressed Arrow IPC file (uncompressed so it can be
+    memory-mapped and read without copying).
+
+    Args:
+        path (str): Output path.
+        schema (pyarrow.Schema): Column names and types, in row order.
+        rows (list): Row lists matching the schema.
+        totals (dict): JSON-serializable summary stored as schema metadata.
+    """
+    schema = schema.with_metadata({TOTALS_KEY: json.dumps(totals)})
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    table = pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        writer.write_table(table)
+
+
+def read_table(path):
+    """
+    Memory-maps an Arrow IPC file written by write_table.
+
+    Returns:
+        pyarrow.Table: Table whose buffers point into the mapped file.
+    """
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def read_frame(path):
+    """
+    Reads an Arrow IPC file as a pandas DataFrame. Numeric columns without
+    nulls are handed over without copying.
+    """
+    return read_table(path).to_pandas()
+
+
+def read_totals(path):
+    """
+    Returns the totals stored in an Arrow IPC file's schema metadata.
+    """
+    schema = pa.ipc.open_file(pa.memory_map(path, "r")).schema
+    return json.loads(schema.metadata[TOTALS_KEY])
@@ -0,0 +1,289 @@
+"""
+history.py
+
+Keeps every nightly users.csv snapshot in a local SQLite database, so trends
+can be queried without digging through git history or re-crawling the hubs.
+
+Counts are change-encoded: a (hub, where, term) value is only stored on the
+run where it differs from the previous stored value, and every run date is
+recorded in the runs table. The hubs each run contained are recorded in
+run_hubs, since a hub that failed, was skipped by the probe or was removed
+from pilots.json is simply missing from users.csv. A value "as of" any run is
+the latest stored row at or before it if the hub was in that run, and None
+otherwise. Past terms rarely change, so the database grows with actual
+activity rather than with hubs x terms x nights. "all-users" and
+"all-users-ever-active" are stored as terms alongside the semester columns.
+The rolling active-<n>d columns are not stored: they move nearly every night
+as the windows slide, so they would be rewritten on every run and make
+last_active no different from last_seen.
+Runs appended before run_hubs existed have no rows there; every hub counts
+as present in them.
+
+Usage:
+    python history.py                       # append ./users.csv as today's run
+    python history.py <users.csv> <date>    # backfill a snapshot (dates must be appended in order)
+
+Outputs:
+    - history.sqlite: runs, the hubs in each run, and change-encoded counts
+"""
+
+import csv
+import re
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+HISTORY_PATH = "history.sqlite"
+SUMMARY_ROWS = {"Total", "Total Schools > 5 Users"}
+ROLLING_COLUMN = re.compile(r"^active-\d+d$")  # users.rolling_columns(); not stored
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_date TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS run_hubs (
+    run_date TEXT NOT NULL,
+    hub TEXT NOT NULL,
+    deployment TEXT NOT NULL,
+    PRIMARY KEY (run_date, hub, deployment)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counts (
+    hub TEXT NOT NULL,
+    deployment TEXT NOT NULL,
+    term TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (hub, deployment, term, run_date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS counts_by_date ON counts (run_date, term);
+"""
+
+
+def connect(path=HISTORY_PATH):
+    """
+    Opens (and if needed creates) the history database.
+
+    Args:
+        path (str): SQLite file path.
+
+    Returns:
+        sqlite3.Connection: Open connection.
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _latest_values(conn, before):
+    rows = conn.execute(
+        """
+        SELECT c.hub, c.deployment, c.term, c.value
+        FROM counts c
+        JOIN (
+            SELECT hub, deployment, term, MAX(run_date) AS run_date
+            FROM counts WHERE run_date < ?
+            GROUP BY hub, deployment, term
+        ) latest USING (hub, deployment, term, run_date)
+        """,
+        (before,),
+    )
+    return {(hub, deployment, term): value for hub, deployment, term, value in rows}
+
+
+def append_run(conn, run_date, columns, rows):
+    """
+    Records one users.csv snapshot. Re-running the same date replaces it.
+
+    Args:
+        conn (sqlite3.Connection): History database.
+        run_date (date): Collection date.
+        columns (list): users.csv header (college, where, all-users, ...).
+        rows (list): users.csv data rows; summary rows and the rolling
+            active-<n>d columns are ignored.
+
+    Returns:
+        int: Number of changed values stored.
+    """
+    run_date = run_date.isoformat()
+    last_run = conn.execute("SELECT MAX(run_date) FROM runs").fetchone()[0]
+    if last_run is not None and run_date < last_run:
+        raise ValueError(f"history is append-only: {run_date} is before the last run {last_run}")
+
+    previous = _latest_values(conn, run_date)
+    terms = [(i, term) for i, term in enumerate(columns) if i >= 2 and not ROLLING_COLUMN.match(term)]
+    present = []
+    changed = []
+    for row in rows:
+        hub, deployment = row[0], row[1]
+        if hub in SUMMARY_ROWS:
+            continue
+        present.append((run_date, hub, deployment))
+        for i, term in terms:
+            value = int(row[i])
+            if previous.get((hub, deployment, term)) != value:
+                changed.append((hub, deployment, term, run_date, value))
+
+    with conn:
+        conn.execute("DELETE FROM counts WHERE run_date = ?", (run_date,))
+        conn.execute("DELETE FROM run_hubs WHERE run_date = ?", (run_date,))
+        conn.execute("INSERT OR IGNORE INTO runs (run_date) VALUES (?)", (run_date,))
+        conn.executemany("INSERT OR IGNORE INTO run_hubs VALUES (?, ?, ?)", present)
+        conn.executemany("INSERT INTO counts VALUES (?, ?, ?, ?, ?)", changed)
+    return len(changed)
+
+
+def _hubs_in_run(conn, run_date):
+    """{(hub, deployment)} in the latest run at or before run_date, or None if
+    that run was recorded before run_hubs existed."""
+    latest = conn.execute("SELECT MAX(run_date) FROM runs WHERE run_date <= ?", (run_date,)).fetchone()[0]
+    hubs = set(conn.execute("SELECT hub, deployment FROM run_hubs WHERE run_date = ?", (latest,)))
+    return hubs or None
+
+
+def _value_as_of(conn, hub, deployment, term, run_date):
+    hubs = _hubs_in_run(conn, run_date)
+    if hubs is not None and (hub, deployment) not in hubs:
+        return None
+    row = conn.execute(
+        """
+        SELECT value FROM counts
+        WHERE hub = ? AND deployment = ? AND term = ? AND run_date <= ?
+        ORDER BY run_date DESC LIMIT 1
+        """,
+        (hub, deployment, term, run_date),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def hub_trend(conn, hub, where, term, start=None, end=None):
+    """
+    Returns a hub's value for one term on every run in a date range.
+
+    Args:
+        conn (sqlite3.Connection): History database.
+        hub (str): Hub name (users.csv "college").
+        where (str): Deployment type.
+        term (str): Term column, e.g. "fall_2025" or "all-users".
+        start (date): First run date to include (default: all).
+        end (date): Last run date to include (default: all).
+
+    Returns:
+        list: (run_date, value) tuples; value is None before the hub was first
+        seen and on runs the hub was missing from.
+    """
+    run_dates = conn.execute(
+        "SELECT run_date FROM runs WHERE run_date BETWEEN ? AND ? ORDER BY run_date",
+        ((start or date.min).isoformat(), (end or date.max).isoformat()),
+    ).fetchall()
+    return [(d, _value_as_of(conn, hub, where, term, d)) for (d,) in run_dates]
+
+
+def week_over_week(conn, term, run_date=None):
+    """
+    Compares every hub's value for a term with the run one week earlier.
+    Hubs missing from the run are left out; value_week_before is None if the
+    hub was missing a week earlier.
+
+    Args:
+        conn (sqlite3.Connection): History database.
+        term (str): Term column.
+        run_date (date): Run to compare (default: latest run).
+
+    Returns:
+        list: (hub, where, value, value_week_before, delta) tuples, largest delta first.
+    """
+    if run_date is None:
+        latest = conn.execute("SELECT MAX(run_date) FROM runs").fetchone()[0]
+        if latest is None:
+            return []
+        run_date = date.fromisoformat(latest)
+    week_before = (run_date - timedelta(days=7)).isoformat()
+    run_date = run_date.isoformat()
+
+    hubs = conn.execute(
+        "SELECT DISTINCT hub, deployment FROM counts WHERE term = ? AND run_date <= ?",
+        (term, run_date),
+    ).fetchall()
+    deltas = []
+    for hub, deployment in hubs:
+        now = _value_as_of(conn, hub, deployment, term, run_date)
+        if now is None:
+            continue
+        before = _value_as_of(conn, hub, deployment, term, week_before)
+        deltas.append((hub, deployment, now, before, now - (before or 0)))
+    return sorted(deltas, key=lambda d: (-d[4], d[0]))
+
+
+def first_seen(conn, hub, where):
+    """
+    Returns the first run date a hub appears in the history, or None.
+    """
+    row = conn.execute(
+        "SELECT MIN(run_date) FROM counts WHERE hub = ? AND deployment = ?", (hub, where)
+    ).fetchone()
+    return date.fromisoformat(row[0]) if row[0] else None
+
+
+def last_active(conn, hub, where):
+    """
+    Returns the last run date on which any of a hub's counts changed, i.e. the
+    last night a user's activity moved the numbers. None if nothing has changed
+    since the hub was first seen. See last_seen for whether it is still collected.
+    """
+    row = conn.execute(
+        """
+        SELECT MAX(run_date) FROM counts
+        WHERE hub = ? AND deployment = ?
+          AND run_date > (SELECT MIN(run_date) FROM counts WHERE hub = ? AND deployment = ?)
+        """,
+        (hub, where, hub, where),
+    ).fetchone()
+    return date.fromisoformat(row[0]) if row[0] else None
+
+
+def last_seen(conn, hub, where):
+    """
+    Returns the last run date a hub was in, or None. Runs recorded before
+    run_hubs existed only count if one of the hub's values changed on them.
+    """
+    row = conn.execute(
+        """
+        SELECT MAX(run_date) FROM (
+            SELECT run_date FROM run_hubs WHERE hub = ? AND deployment = ?
+            UNION ALL
+            SELECT run_date FROM counts WHERE hub = ? AND deployment = ?
+        )
+        """,
+        (hub, where, hub, where),
+    ).fetchone()
+    return date.fromisoformat(row[0]) if row[0] else None
+
+
+def main(users_csv, run_date):
+    """
+    Appends a users.csv file to the history database.
+
+    Args:
+        users_csv (str): Path to a users.csv snapshot.
+        run_date (date): Date the snapshot was collected.
+    """
+    with open(users_csv) as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        rows = list(reader)
+    conn = connect()
+    try:
+        return append_run(conn, run_date, columns, rows)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    users_csv = sys.argv[1] if len(sys.argv) > 1 else "users.csv"
+    run_date = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else date.today()
+    try:
+        changed = main(users_csv, run_date)
+        print(f"Finished successfully: history {run_date.isoformat()} changed={changed}")
+    except Exception as exc:
+        print(f"Finished with failure: {exc}")
+        sys.exit(1)
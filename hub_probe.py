@@ -0,0 +1,229 @@
+"""
+hub_probe.py
+
+Quick, concurrent health and token check of every pilot hub, so dead hubs and
+expired tokens show up before the users crawl instead of halfway through it.
+
+For each pilot this measures:
+    - TCP connect and TLS handshake time to the hub's host (port 443)
+    - GET <api>/ (unauthenticated): HTTP status, latency and JupyterHub version
+    - GET <api>/user with the pilot's token: HTTP status (the token's whoami)
+
+and classifies the hub as "ok", "slow", "unauthorized" or "unreachable". A hub
+that doesn't answer, or answers 5xx, is probed once more before it is called
+unreachable, so one transient error doesn't cost it the night's crawl.
+Results are keyed by pilot_key, (url, where), since hub slugs are reused
+across clusters (e.g. "dvc").
+users.main skips hubs that are unauthorized or unreachable, and
+scripts/check_deployment_sync.py --probe lists anything that isn't "ok".
+
+Usage:
+    python hub_probe.py    # probe every pilot in pilots.json and print the results
+"""
+
+import json
+import socket
+import ssl
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+PROBE_TIMEOUT = 10  # seconds, per request
+SLOW_MS = 2000  # API latency above this is reported as slow
+PROBE_ATTEMPTS = 2  # an unreachable hub is probed this many times before it's reported
+PROBE_RETRY_DELAY = 2  # seconds between attempts
+DEAD_VERDICTS = {"unauthorized", "unreachable"}
+
+
+def pilot_key(pilot):
+    """(url, where) identifying a pilot: the same url can be a hub in both clusters."""
+    return pilot["url"], pilot["where"]
+
+
+def hub_api_url(url, where):
+    """
+    Returns the JupyterHub REST API base URL for a pilot.
+
+    Args:
+        url (str): Hub URL prefix.
+        where (str): Deployment type.
+
+    Returns:
+        str: API base URL, without a trailing slash.
+    """
+    api_url = f'http://{url}.cloudbank.2i2c.cloud/hub/api'
+    if url == "mills":
+        api_url = f'http://datahub.{url}.edu/hub/api'
+    if where == "icor":
+        api_url = f'http://{url}.jupyter.cal-icor.org/hub/api'
+    return api_url
+
+
+class ProbeResult(NamedTuple):
+    url: str
+    where: str
+    name: str
+    api_status: Optional[int]
+    whoami_status: Optional[int]
+    version: Optional[str]
+    latency_ms: Optional[float]
+    connect_ms: Optional[float]
+    tls_ms: Optional[float]
+    error: Optional[str]
+
+    @property
+    def verdict(self):
+        if self.api_status is None or self.api_status >= 500:
+            return "unreachable"
+        if self.whoami_status in (401, 403):
+            return "unauthorized"
+        if self.latency_ms is not None and self.latency_ms > SLOW_MS:
+            return "slow"
+        return "ok"
+
+    def describe(self):
+        """One-line summary for reports, e.g. "api 200, whoami 403, JupyterHub 4.1.5, 180 ms"."""
+        parts = []
+        if self.error:
+            parts.append(self.error)
+        if self.api_status is not None:
+            parts.append(f"api {self.api_status}")
+        if self.whoami_status is not None:
+            parts.append(f"whoami {self.whoami_status}")
+        if self.version:
+            parts.append(f"JupyterHub {self.version}")
+        if self.latency_ms is not None:
+            parts.append(f"{self.latency_ms:.0f} ms")
+        if self.tls_ms is not None:
+            parts.append(f"TLS {self.tls_ms:.0f} ms")
+        return ", ".join(parts)
+
+
+def _handshake_times(host):
+    """(connect_ms, tls_ms) to host:443, or (None, None) if either step fails."""
+    try:
+        start = time.perf_counter()
+        with socket.create_connection((host, 443), timeout=PROBE_TIMEOUT) as sock:
+            connected = time.perf_counter()
+            with ssl.create_default_context().wrap_socket(sock, server_hostname=host):
+                done = time.perf_counter()
+    except (OSError, ssl.SSLError):
+        return None, None
+    return (connected - start) * 1000, (done - connected) * 1000
+
+
+def probe_steps(pilot):
+    """
+    Drives the probe of one pilot hub without doing any I/O, so the blocking
+    probe here and async_pipeline's share it (like users.users_pager). Makes
+    up to PROBE_ATTEMPTS attempts while the hub is unreachable.
+
+    Yields each step to take, and must be sent its outcome:
+        ("sleep", seconds): None
+        ("handshake", host): (connect_ms, tls_ms), see _handshake_times
+        ("get", url, headers): (response, latency_ms), or (None, error name)
+            if the request failed
+
+    Args:
+        pilot (dict): Pilot metadata (url, where, name, token).
+
+    Returns:
+        ProbeResult: Measurements for the hub, as the generator's return value.
+    """
+    api_url = hub_api_url(pilot["url"], pilot["where"])
+    for attempt in range(PROBE_ATTEMPTS):
+        if attempt:
+            yield "sleep", PROBE_RETRY_DELAY
+        connect_ms, tls_ms = yield "handshake", urlsplit(api_url).hostname
+        api_status = whoami_status = version = latency_ms = error = None
+        r, outcome = yield "get", api_url + "/", {}
+        if r is None:
+            error = outcome
+        else:
+            latency_ms = outcome
+            api_status = r.status_code
+            if 200 <= r.status_code < 300:
+                try:
+                    body = r.json()
+                except ValueError as exc:
+                    error = type(exc).__name__  # e.g. an HTML page; the token is still checked
+                else:
+                    version = body.get("version") if isinstance(body, dict) else None
+            # Whatever the API root answered, an expired token must still show up
+            r, outcome = yield "get", api_url + "/user", {"Authorization": f"token {pilot['token']}"}
+            if r is None:
+                error = error or outcome
+            else:
+                whoami_status = r.status_code
+        result = ProbeResult(
+            pilot["url"], pilot["where"], pilot["name"], api_status, whoami_status, version,
+            latency_ms, connect_ms, tls_ms, error,
+        )
+        if result.verdict != "unreachable":
+            break
+    return result
+
+
+def probe_pilot(pilot):
+    """
+    Probes one pilot hub (see probe_steps). Never raises; failures are
+    recorded in the result.
+
+    Args:
+        pilot (dict): Pilot metadata (url, where, name, token).
+
+    Returns:
+        ProbeResult: Measurements for the hub.
+    """
+    steps = probe_steps(pilot)
+    outcome = None
+    while True:
+        try:
+            step = steps.send(outcome)
+        except StopIteration as done:
+            return done.value
+        if step[0] == "sleep":
+            time.sleep(step[1])
+            outcome = None
+        elif step[0] == "handshake":
+            outcome = _handshake_times(step[1])
+        else:
+            try:
+                start = time.perf_counter()
+                r = requests.get(step[1], headers=step[2], timeout=PROBE_TIMEOUT)
+                outcome = r, (time.perf_counter() - start) * 1000
+            except requests.RequestException as exc:
+                outcome = None, type(exc).__name__
+
+
+def probe_pilots(pilots, max_workers=10):
+    """
+    Probes pilot hubs concurrently.
+
+    Args:
+        pilots (list): Pilot metadata dicts.
+        max_workers (int): Concurrent probes.
+
+    Returns:
+        dict: {pilot_key: ProbeResult}, in pilots order.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(probe_pilot, pilots))
+    return {pilot_key(pilot): result for pilot, result in zip(pilots, results)}
+
+
+if __name__ == "__main__":
+    with open("pilots.json") as f:
+        pilots = json.load(f)["pilots"]
+    results = probe_pilots(pilots)
+    for result in results.values():
+        print(f"{result.verdict:12} {result.name} ({result.url}): {result.describe()}")
+    dead = [r for r in results.values() if r.verdict in DEAD_VERDICTS]
+    if dead:
+        print(f"Finished with failure: {len(dead)} of {len(results)} hubs unauthorized or unreachable")
+        sys.exit(1)
+    print(f"Finished successfully: probed {len(results)} hubs")
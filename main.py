@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
 
+import argparse
 import sys
 import threading
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+import async_pipeline
+import history
 import users
 import otter_standalone_use
 import subprocess
 
+sys.path.insert(0, str(Path(__file__).parent / "scripts"))
+from build_dashboard import build_dashboard  # noqa: E402
+
 
 def format_final_message(user_summary, otter_summary, failures):
     otter_part = (
@@ -28,15 +39,28 @@ def format_final_message(user_summary, otter_summary, failures):
     return " | ".join(detail_parts)
 
 
-def main():
-    # Decrypt pilot tokens
-    open('pilots.json', 'w').write(
-        subprocess.run(['sops', '--decrypt', 'enc-pilots.json'], capture_output=True, text=True).stdout
-    )
+def collect(use_async=False):
+    """
+    Collects user statistics and notebook usage, concurrently.
 
+    Args:
+        use_async (bool): Run both on one event loop (see async_pipeline.py)
+            instead of one thread each.
+
+    Returns:
+        tuple: ({"users": users.main summary, "otter": otter_standalone_use.main
+        summary}, with None for a part that failed; list of errors).
+    """
     errors = []
     results = {}
 
+    if use_async:
+        try:
+            results["users"], results["otter"] = async_pipeline.run()
+        except Exception as e:
+            errors.append(e)
+        return results, errors
+
     def run_thread(key, fn, *args):
         try:
             results[key] = fn(*args)
@@ -44,18 +68,53 @@ def main():
             errors.append(e)
             results[key] = None
 
-    # Run user statistics and notebook usage aggregation in parallel
-    thread1 = threading.Thread(target=run_thread, args=("users", users.main, True, None))
-    thread2 = threading.Thread(target=run_thread, args=("otter", otter_standalone_use.main))
+    # The users decode pool is created before either thread starts (see users.decode_pool)
+    pool = users.decode_pool(users.DECODE_PROCESSES)
+    try:
+        # Run user statistics and notebook usage aggregation in parallel
+        thread1 = threading.Thread(target=run_thread, args=("users", users.main, True, None, True, None, pool))
+        thread2 = threading.Thread(target=run_thread, args=("otter", otter_standalone_use.main))
+
+        thread1.start()
+        thread2.start()
+
+        thread1.join()
+        thread2.join()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results, errors
 
-    thread1.start()
-    thread2.start()
 
-    thread1.join()
-    thread2.join()
+def main(use_async=False):
+    # Decrypt pilot tokens
+    open('pilots.json', 'w').write(
+        subprocess.run(['sops', '--decrypt', 'enc-pilots.json'], capture_output=True, text=True).stdout
+    )
+
+    results, errors = collect(use_async)
 
     if results.get("users") is None or results.get("otter") is None:
-        raise Exception(f"Thread errors: {errors}")
+        raise Exception(f"Collection errors: {errors}")
+
+    # Hand the collected rows straight to the dashboard instead of re-reading the CSVs
+    try:
+        build_dashboard(
+            pd.DataFrame(results["users"]["rows"], columns=results["users"]["columns"]),
+            pd.DataFrame(results["otter"]["rows"], columns=results["otter"]["columns"]),
+        )
+    except Exception as e:
+        errors.append(e)
+
+    # Append tonight's counts to the history store so trends don't depend on git history
+    try:
+        conn = history.connect()
+        try:
+            history.append_run(conn, date.today(), results["users"]["columns"], results["users"]["rows"])
+        finally:
+            conn.close()
+    except Exception as e:
+        errors.append(e)
 
     return {
         "users": results["users"],
@@ -65,8 +124,15 @@ def main():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true",
+        help="Collect on one event loop with async HTTP and Firestore clients (see async_pipeline.py)",
+    )
+    args = parser.parse_args()
     try:
-        summary = main()
+        summary = main(args.use_async)
+        print(users.format_transfers(summary["users"]["transfers"]))
         has_failures = bool(summary["errors"] or summary["users"]["failed_pilots"])
         status = "Finished with failure" if has_failures else "Finished successfully"
         print(f"{status}: {format_final_message(summary['users'], summary['otter'], summary['errors'])}")
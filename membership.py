@@ -0,0 +1,273 @@
+"""
+membership.py
+
+Records which users were active in each term, per hub, so retention and
+cohort questions ("how many fall users came back in spring?") can be answered
+without re-crawling.
+
+Every user gets a stable index within their hub (hub, deployment), assigned
+the first time they are seen. A term's membership is a bitset over those
+indexes. JupyterHub only keeps each user's latest activity, so a user active
+in fall who comes back in spring no longer looks active in fall. Each nightly
+run therefore ORs its bitsets into the stored ones, and membership only
+grows. Retention, churn, unions and intersections are bitwise operations
+on Python ints.
+
+Bitsets are stored roaring-style: as a sorted uint32 array when that is
+smaller (sparse terms), otherwise as a raw little-endian bitmap.
+
+Usernames are never stored: members are keyed by an HMAC-SHA256 of
+"<hub>:<where>:<username>" under the NSF_HASH_KEY secret (the key
+scripts/build_nsf_report.py pseudonymizes usernames with). Usernames are
+mostly guessable email addresses, so a plain hash could be reversed by
+trying candidates; without the secret these keys can't. The same secret has
+to be used every night (a new one makes every user look new), so rotating it
+means starting a new database. The database is still per-user data, so it is
+git-ignored (not committed like history.sqlite) and carried between nightly
+runs by the workflow cache.
+
+Usage:
+    python membership.py <hub> <where> <from_term> <to_term>    # retention between two terms
+
+Outputs:
+    - membership.sqlite: user indexes and term bitsets
+"""
+
+import hashlib
+import hmac
+import os
+import sqlite3
+import struct
+import sys
+
+MEMBERSHIP_PATH = "membership.sqlite"
+HASH_KEY_ENV = "NSF_HASH_KEY"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    hub TEXT NOT NULL,
+    deployment TEXT NOT NULL,
+    user_key BLOB NOT NULL,
+    idx INTEGER NOT NULL,
+    PRIMARY KEY (hub, deployment, user_key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS term_members (
+    hub TEXT NOT NULL,
+    deployment TEXT NOT NULL,
+    term TEXT NOT NULL,
+    encoding TEXT NOT NULL,
+    data BLOB NOT NULL,
+    cardinality INTEGER NOT NULL,
+    updated TEXT NOT NULL,
+    PRIMARY KEY (hub, deployment, term)
+) WITHOUT ROWID;
+"""
+
+
+def connect(path=MEMBERSHIP_PATH):
+    """
+    Opens (and if needed creates) the membership database.
+
+    Args:
+        path (str): SQLite file path.
+
+    Returns:
+        sqlite3.Connection: Open connection.
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def popcount(bits):
+    return bin(bits).count("1")
+
+
+def bit_indexes(bits):
+    """Sorted indexes of the set bits."""
+    indexes = []
+    raw = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for byte_index, byte in enumerate(raw):
+        while byte:
+            low = byte & -byte
+            indexes.append(byte_index * 8 + low.bit_length() - 1)
+            byte ^= low
+    return indexes
+
+
+def bits_from_indexes(indexes):
+    """Bitset with the given indexes set."""
+    indexes = list(indexes)
+    if not indexes:
+        return 0
+    raw = bytearray(max(indexes) // 8 + 1)
+    for index in indexes:
+        raw[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(raw, "little")
+
+
+def encode(bits):
+    """
+    Serializes a bitset as ("array", uint32 indexes) or ("bitmap", bytes),
+    whichever is smaller.
+    """
+    bitmap = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    cardinality = popcount(bits)
+    if cardinality * 4 < len(bitmap):
+        return "array", struct.pack(f"<{cardinality}I", *bit_indexes(bits))
+    return "bitmap", bitmap
+
+
+def decode(encoding, data):
+    """Inverse of encode."""
+    if encoding == "array":
+        return bits_from_indexes(struct.unpack(f"<{len(data) // 4}I", data))
+    return int.from_bytes(data, "little")
+
+
+def hash_key():
+    """The HMAC key members are keyed with, from NSF_HASH_KEY, or None if it isn't set."""
+    return os.environ.get(HASH_KEY_ENV) or None
+
+
+def user_keys(hmac_key, hub, where, usernames):
+    """{username: HMAC-SHA256(hmac_key, "<hub>:<where>:<username>")} for each username."""
+    prototype = hmac.new(hmac_key.encode(), digestmod=hashlib.sha256)
+    keys = {}
+    for username in usernames:
+        h = prototype.copy()
+        h.update(f"{hub}:{where}:{username}".encode())
+        keys[username] = h.digest()
+    return keys
+
+
+def _assign_indexes(conn, hmac_key, hub, where, usernames):
+    keys = user_keys(hmac_key, hub, where, usernames)
+    known = dict(conn.execute(
+        "SELECT user_key, idx FROM members WHERE hub = ? AND deployment = ?", (hub, where)
+    ).fetchall())
+    next_index = max(known.values(), default=-1) + 1
+    new = []
+    for username in sorted(usernames):
+        if keys[username] not in known:
+            known[keys[username]] = next_index
+            new.append((hub, where, keys[username], next_index))
+            next_index += 1
+    conn.executemany("INSERT INTO members VALUES (?, ?, ?, ?)", new)
+    return {username: known[keys[username]] for username in usernames}, len(new)
+
+
+def record_run(conn, hmac_key, run_date, hub, where, term_usernames):
+    """
+    Merges one night's term membership for a hub into the stored bitsets.
+
+    Args:
+        conn (sqlite3.Connection): Membership database.
+        hmac_key (str): Secret usernames are keyed with (see hash_key).
+        run_date (date): Collection date.
+        hub (str): Hub name (users.csv "college").
+        where (str): Deployment type.
+        term_usernames (dict): {term: usernames active in that term}.
+
+    Returns:
+        int: Number of users seen for the first time.
+    """
+    usernames = {username for names in term_usernames.values() for username in names}
+    with conn:
+        indexes, new_users = _assign_indexes(conn, hmac_key, hub, where, usernames)
+        for term, names in term_usernames.items():
+            bits = term_bits(conn, hub, where, term) | bits_from_indexes(indexes[u] for u in names)
+            encoding, data = encode(bits)
+            conn.execute(
+                "INSERT OR REPLACE INTO term_members VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (hub, where, term, encoding, data, popcount(bits), run_date.isoformat()),
+            )
+    return new_users
+
+
+def term_bits(conn, hub, where, term):
+    """
+    Returns a hub's membership bitset for a term (0 if nothing is recorded).
+    """
+    row = conn.execute(
+        "SELECT encoding, data FROM term_members WHERE hub = ? AND deployment = ? AND term = ?",
+        (hub, where, term),
+    ).fetchone()
+    return decode(*row) if row else 0
+
+
+def _hubs(conn, hub, where):
+    if hub is not None:
+        return [(hub, where)]
+    return conn.execute("SELECT DISTINCT hub, deployment FROM term_members ORDER BY hub, deployment").fetchall()
+
+
+def retention(conn, from_term, to_term, hub=None, where=None):
+    """
+    Counts users active in from_term who were also active in to_term.
+
+    Args:
+        conn (sqlite3.Connection): Membership database.
+        from_term (str): Base term, e.g. "fall_2025".
+        to_term (str): Later term, e.g. "spring_2026".
+        hub (str): Hub name, or None for all hubs (summed per hub).
+        where (str): Deployment type (with hub).
+
+    Returns:
+        tuple: (returned, base, rate); rate is None when base is 0.
+    """
+    returned = base = 0
+    for h, w in _hubs(conn, hub, where):
+        earlier = term_bits(conn, h, w, from_term)
+        base += popcount(earlier)
+        returned += popcount(earlier & term_bits(conn, h, w, to_term))
+    return returned, base, (returned / base if base else None)
+
+
+def churn(conn, from_term, to_term, hub=None, where=None):
+    """
+    Counts users active in from_term who were not active in to_term.
+    """
+    returned, base, _ = retention(conn, from_term, to_term, hub, where)
+    return base - returned
+
+
+def union_count(conn, terms, hub=None, where=None):
+    """
+    Counts distinct users active in any of the terms.
+    """
+    total = 0
+    for h, w in _hubs(conn, hub, where):
+        bits = 0
+        for term in terms:
+            bits |= term_bits(conn, h, w, term)
+        total += popcount(bits)
+    return total
+
+
+def intersection_count(conn, terms, hub=None, where=None):
+    """
+    Counts users active in every one of the terms.
+    """
+    total = 0
+    for h, w in _hubs(conn, hub, where):
+        bits = None
+        for term in terms:
+            term_set = term_bits(conn, h, w, term)
+            bits = term_set if bits is None else bits & term_set
+        total += popcount(bits or 0)
+    return total
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5:
+        print("usage: python membership.py <hub> <where> <from_term> <to_term>")
+        sys.exit(1)
+    hub, where, from_term, to_term = sys.argv[1:]
+    conn = connect()
+    try:
+        returned, base, rate = retention(conn, from_term, to_term, hub, where)
+    finally:
+        conn.close()
+    rate_text = f"{rate:.1%}" if rate is not None else "n/a"
+    print(f"{hub} ({where}): {returned} of {base} {from_term} users active in {to_term} ({rate_text})")
@@ -2,7 +2,9 @@
 otter_standalone_use.py
 
 Collects weekly usage statistics for Otter Standalone notebooks from Firestore.
-Aggregates the number of users and notebooks per week and writes results to a CSV file.
+Aggregates the number of users and notebooks per week and writes results to a typed
+Arrow IPC file (otter_standalone_use.arrow, total notebooks in its metadata) and to a
+human-readable CSV file, including the Monday each ISO week starts on.
 """
 
 import datetime
@@ -10,11 +12,22 @@ import os
 import sys
 
 import firebase_admin
+import pyarrow as pa
 from firebase_admin import credentials, firestore
 
+import columnar
+
 
 DEFAULT_PROJECT_IDS = ["cb-1003-1696", "data8x-scratch"]
 COLLECTION_NAME = "otter-stdalone-prod-count"
+CSV_COLUMNS = ["Year-Month", "Week Of Year", "Number of Users", "Number of Notebooks", "Week Start"]
+ARROW_SCHEMA = pa.schema([
+    pa.field("Year-Month", pa.string()),
+    pa.field("Week Of Year", pa.int8()),
+    pa.field("Number of Users", pa.int32()),
+    pa.field("Number of Notebooks", pa.int64()),
+    pa.field("Week Start", pa.date32()),
+])
 
 
 def get_project_ids():
@@ -48,51 +61,94 @@ def get_firestore_clients(project_ids):
     return clients
 
 
-def main():
+def aggregate_weeks(records):
     """
-    Connects to Firestore, retrieves Otter Standalone usage records,
-    aggregates statistics by week, and writes results to a CSV file.
-    """
-    docs = []
-    project_ids = get_project_ids()
-    for _, db in get_firestore_clients(project_ids):
-        project_docs = list(db.collection(COLLECTION_NAME).stream())
-        docs.extend(project_docs)
+    Aggregates usage records into one row per (month, ISO week).
 
+    Args:
+        records (iterable[dict]): Firestore records with "timestamp"
+            ("YYYY-MM-DD ...") and "message" (number of notebooks).
+
+    Returns:
+        tuple: (rows of [Year-Month, Week Of Year, Number of Users,
+        Number of Notebooks, Week Start], newest week first; total notebooks).
+    """
     total_notebooks = 0
     weeks_dict = {}
-    for doc in docs:
-        rec = doc.to_dict()
+    for rec in records:
         ts = rec.get("timestamp")
         year, month, date = list(map(lambda item: int(item), ts.split(" ")[0].split("-")))
-        week = datetime.date(year, month, date).isocalendar()[1]
+        day = datetime.date(year, month, date)
+        week = day.isocalendar()[1]
         two_digit_month = "{:02d}".format(month)
         two_digit_week = "{:02d}".format(week)
         key = f"{year}-{two_digit_month} {two_digit_week}"
         num_notebooks = int(rec.get('message'))
         if key not in weeks_dict:
-            weeks_dict[key] = [1, num_notebooks]
+            # Monday of the ISO week, so readers don't have to reverse-engineer it from the key
+            week_start = day - datetime.timedelta(days=day.weekday())
+            weeks_dict[key] = [1, num_notebooks, week_start.isoformat()]
         else:
             weeks_dict[key][0] += 1
             weeks_dict[key][1] += num_notebooks
         total_notebooks += num_notebooks
 
     s_dict = dict(reversed(sorted(weeks_dict.items())))
+    rows = []
+    for row in s_dict.items():
+        d = row[0].split(" ")
+        rows.append([d[0], d[1], row[1][0], row[1][1], row[1][2]])
+    return rows, total_notebooks
+
+
+def write_results(project_ids, records):
+    """
+    Aggregates usage records by week and writes the Arrow and CSV outputs.
+
+    Args:
+        project_ids (list[str]): Firestore project IDs the records came from.
+        records (list[dict]): Firestore records (see aggregate_weeks).
+
+    Returns:
+        dict: The main() summary.
+    """
+    rows, total_notebooks = aggregate_weeks(records)
+    columnar.write_table(
+        "otter_standalone_use.arrow",
+        ARROW_SCHEMA,
+        [[ym, int(week), n_users, n_notebooks, datetime.date.fromisoformat(week_start)]
+         for ym, week, n_users, n_notebooks, week_start in rows],
+        {"total_notebooks": total_notebooks},
+    )
     with open("otter_standalone_use.csv", "w") as f:
         f.write(f"Total: {total_notebooks}\n")
-        f.write("Year-Month, Week Of Year, Number of Users, Number of Notebooks\n")
-        for row in s_dict.items():
-            d = row[0].split(" ")
-            f.write(f"{d[0]}, {d[1]}, {row[1][0]}, {row[1][1]}\n")
+        f.write(", ".join(CSV_COLUMNS) + "\n")
+        for row in rows:
+            f.write(", ".join(map(str, row)) + "\n")
 
     return {
         "project_count": len(project_ids),
-        "records": len(docs),
-        "weeks": len(weeks_dict),
+        "records": len(records),
+        "weeks": len(rows),
         "total_notebooks": total_notebooks,
+        # Weekly rows as written to otter_standalone_use.csv, for in-memory callers
+        "columns": CSV_COLUMNS,
+        "rows": rows,
     }
 
 
+def main():
+    """
+    Connects to Firestore, retrieves Otter Standalone usage records,
+    aggregates statistics by week, and writes results to a CSV file.
+    """
+    records = []
+    project_ids = get_project_ids()
+    for _, db in get_firestore_clients(project_ids):
+        records.extend(doc.to_dict() for doc in db.collection(COLLECTION_NAME).stream())
+    return write_results(project_ids, records)
+
+
 if __name__ == "__main__":
     try:
         summary = main()
@@ -1,10 +1,31 @@
+import argparse
+import hashlib
 import json
+import re
+import sys
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import date, timedelta
 
 BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import columnar  # noqa: E402
+
 DOCS_DIR = BASE_DIR / "docs"
+USERS_CSV = BASE_DIR / "users.csv"
+OTTER_CSV = BASE_DIR / "otter_standalone_use.csv"
+USERS_ARROW = BASE_DIR / "users.arrow"
+OTTER_ARROW = BASE_DIR / "otter_standalone_use.arrow"
+MANIFEST_NAME = "build_manifest.json"
+DATA_DIR_NAME = "data"
+
+SUMMARY_ROWS = ["Total", "Total Schools > 5 Users"]
+FIXED_USER_COLS = ["college", "where", "all-users", "all-users-ever-active"]
+# Term columns (users.csv also has rolling "active-<n>d" columns, which aren't terms)
+TERM_COL = re.compile(r"^(spring|summer|fall)_\d{4}$")
+INSTITUTION_THRESHOLD = 5
 
 
 def resolve_week_start(year_month, week_number):
@@ -39,149 +60,300 @@ def resolve_week_start(year_month, week_number):
     return max(candidates)[-1]
 
 
+def _epoch_days_to_year_month(days):
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    return months // 12 + 1970, months % 12 + 1
+
+
+def resolve_week_starts(year_months, week_numbers):
+    """Column-wise resolve_week_start: same scoring, evaluated with numpy.
+
+    Each distinct (year_month, week) pair is resolved once and broadcast back
+    to every row that shares it, so the cost tracks the number of distinct
+    weeks rather than the row count. Returns a datetime64 Series aligned with
+    year_months.
+    """
+    index = getattr(year_months, "index", None)
+    rows = pd.DataFrame({
+        "year_month": np.asarray(year_months).astype(str),
+        "week": np.asarray(week_numbers).astype(np.int64),
+    })
+    memo = rows.drop_duplicates().reset_index(drop=True)
+
+    year_month = memo["year_month"].str.split("-", n=1, expand=True).astype(np.int64)
+    year = year_month[0].to_numpy()
+    month = year_month[1].to_numpy()
+    week = memo["week"].to_numpy()
+    month_anchor = ((year - 1970) * 12 + month - 1).astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+
+    best_score = np.full(len(memo), -1, dtype=np.int64)
+    best_distance = np.zeros(len(memo), dtype=np.int64)
+    best_start = np.zeros(len(memo), dtype=np.int64)
+    for iso_year in (year - 1, year, year + 1):
+        # ISO week 1 is the week containing Jan 4; a year has 53 weeks when Dec 28 falls in week 53.
+        jan4 = (iso_year - 1970).astype("datetime64[Y]").astype("datetime64[D]").astype(np.int64) + 3
+        week1_monday = jan4 - (jan4 + 3) % 7
+        dec28 = (iso_year - 1969).astype("datetime64[Y]").astype("datetime64[D]").astype(np.int64) - 4
+        weeks_in_year = (dec28 - week1_monday) // 7 + 1
+        valid = (week >= 1) & (week <= weeks_in_year)
+
+        week_start = week1_monday + 7 * (week - 1)
+        week_end = week_start + 6
+        start_year, start_month = _epoch_days_to_year_month(week_start)
+        end_year, end_month = _epoch_days_to_year_month(week_end)
+        score = (
+            2 * ((start_year == year) & (start_month == month))
+            + 2 * ((end_year == year) & (end_month == month))
+            + ((start_year == year) | (end_year == year))
+        )
+        distance = np.minimum(np.abs(week_start - month_anchor), np.abs(week_end - month_anchor))
+
+        better = valid & (
+            (score > best_score)
+            | ((score == best_score) & (
+                (distance < best_distance)
+                | ((distance == best_distance) & (week_start > best_start))
+            ))
+        )
+        best_score = np.where(better, score, best_score)
+        best_distance = np.where(better, distance, best_distance)
+        best_start = np.where(better, week_start, best_start)
+
+    unresolved = np.flatnonzero(best_score < 0)
+    if len(unresolved):
+        first = memo.iloc[unresolved[0]]
+        raise ValueError(f"Unable to resolve week {first['week']} for {first['year_month']}")
+
+    memo["week_start"] = best_start.astype("datetime64[D]").astype("datetime64[ns]")
+    resolved = rows.merge(memo, on=["year_month", "week"], how="left")["week_start"]
+    return pd.Series(resolved.to_numpy(), index=index, name="week_start")
+
+
 def format_semester_label(semester):
     season, year = semester.split("_", 1)
     return f"{season.title()} {year}"
 
 
-# -- Load users.csv --
-users_df = pd.read_csv(BASE_DIR / "users.csv")
+def load_users_csv(path=USERS_CSV):
+    return pd.read_csv(path)
+
+
+def load_otter_csv(path=OTTER_CSV):
+    otter_df = pd.read_csv(path, skiprows=1, skipinitialspace=True)
+    otter_df.columns = [c.strip() for c in otter_df.columns]
+    return otter_df
+
 
-# Remove summary rows
-users_df = users_df[~users_df["college"].isin(["Total", "Total Schools > 5 Users"])]
+def load_users():
+    """Memory-maps the typed users.arrow, falling back to users.csv when only the
+    CSV exists (e.g. a checkout from before the Arrow output was added)."""
+    if USERS_ARROW.exists():
+        return columnar.read_frame(str(USERS_ARROW))
+    return load_users_csv()
 
-# Semester columns are everything after the fixed metadata columns
-fixed_cols = ["college", "where", "all-users", "all-users-ever-active"]
-semester_cols = [c for c in users_df.columns if c not in fixed_cols]
 
-cloudbank_df = users_df[users_df["where"] == "cloudbank"]
-icor_df = users_df[users_df["where"] == "icor"]
+def load_otter():
+    if OTTER_ARROW.exists():
+        return columnar.read_frame(str(OTTER_ARROW))
+    return load_otter_csv()
+
+
+def normalize_users(users_df):
+    """Drops the CSV summary rows and puts institutions in a stable order, so the
+    same data yields the same dashboard whether it came from users.csv or from
+    users.main in memory (which collects hubs in completion order)."""
+    users_df = users_df[~users_df["college"].isin(SUMMARY_ROWS)]
+    return users_df.sort_values(["college", "where"], kind="stable").reset_index(drop=True)
+
+
+def normalize_otter(otter_df):
+    otter_df = otter_df.rename(columns=lambda c: c.strip())
+    numeric_cols = ["Week Of Year", "Number of Users", "Number of Notebooks"]
+    otter_df = otter_df.astype({c: "int64" for c in numeric_cols})
+    return otter_df.sort_values(["Year-Month", "Week Of Year"], kind="stable").reset_index(drop=True)
+
+
+def frame_fingerprint(df):
+    return hashlib.sha256(df.to_csv(index=False).encode()).hexdigest()
+
+
+def academic_year_start(today):
+    # Fall starts in August; Jan–Jul belongs to the AY that began the previous Fall
+    # (summer is the tail of its AY).
+    return today.year if today.month >= 8 else today.year - 1
+
+
+def users_section_columns(users_df):
+    """The columns build_users_section reads: the fixed metadata and the term columns.
+    The rolling active-<n>d columns change nightly and are left out, so they
+    don't invalidate the users section's fingerprint."""
+    return FIXED_USER_COLS + [c for c in users_df.columns if TERM_COL.match(c)]
+
+
+def build_users_section(users_df, ay_start):
+    # Semester columns are the term columns after the fixed metadata columns
+    semester_cols = users_section_columns(users_df)[len(FIXED_USER_COLS):]
+
+    cloudbank_df = users_df[users_df["where"] == "cloudbank"]
+    icor_df = users_df[users_df["where"] == "icor"]
+
+    semester_data = []
+    for col in semester_cols:
+      semester_data.append(
+        {
+          "semester": col,
+          "cloudbank": int(cloudbank_df[col].sum()),
+          "icor": int(icor_df[col].sum()),
+        }
+      )
+
+    # Current + 3 previous semesters for the table
+    recent_sems = semester_cols[-4:]
+
+    # Table sort/label key: the most recent term that actually has data, so we never key
+    # off an all-zero future term (e.g. spring_2027, which generate_dates emits ahead of time).
+    current_sem = next(
+        (s for s in reversed(semester_cols) if int(users_df[s].sum()) > 0),
+        recent_sems[-1],
+    )
+
+    # Current academic year terms (Fall Y / Spring Y+1 / Summer Y+1).
+    ay_terms = [t for t in (f"fall_{ay_start}", f"spring_{ay_start + 1}", f"summer_{ay_start + 1}")
+                if t in semester_cols]
+    ay_label = f"AY {ay_start}–{str(ay_start + 1)[2:]}"
+
+    def _ay_institution_count(df):
+        """Institutions with >5 users in ANY term of the current academic year."""
+        if not ay_terms:
+            return 0
+        return int((df[ay_terms].max(axis=1) > INSTITUTION_THRESHOLD).sum())
+
+    institutions = (
+        users_df[FIXED_USER_COLS + recent_sems]
+        .sort_values(current_sem, ascending=False, kind="stable")
+        .to_dict(orient="records")
+    )
+
+    # Default the table sort to the most recent term that actually has data, so
+    # the dashboard doesn't open sorted by an all-zero future term (e.g. spring_2027).
+    default_sort_sem = next(
+        (s for s in reversed(recent_sems) if int(users_df[s].sum()) > 0),
+        current_sem,
+    )
+
+    return {
+        "semesters": semester_data,
+        "institutions": institutions,
+        "recent_sems": recent_sems,
+        "recent_sem_labels": {s: format_semester_label(s) for s in recent_sems},
+        "current_sem": current_sem,
+        "default_sort": default_sort_sem,
+        "summary_cards": [
+            {
+                "label": f"CloudBank Institutions > {INSTITUTION_THRESHOLD}",
+                "value": _ay_institution_count(cloudbank_df),
+                "detail": ay_label,
+            },
+            {
+                "label": f"ICOR Institutions > {INSTITUTION_THRESHOLD}",
+                "value": _ay_institution_count(icor_df),
+                "detail": ay_label,
+            },
+        ],
+    }
+
 
-semester_data = []
-for col in semester_cols:
-  semester_data.append(
-    {
-      "semester": col,
-      "cloudbank": int(cloudbank_df[col].sum()),
-      "icor": int(icor_df[col].sum()),
+def build_otter_section(otter_df):
+    otter_df = otter_df.copy()
+    # Newer collector runs write the true week start; older files only have the
+    # (Year-Month, Week Of Year) key, which has to be resolved back to a date.
+    if "Week Start" in otter_df.columns:
+        otter_df["week_start"] = pd.to_datetime(otter_df["Week Start"])
+    else:
+        otter_df["week_start"] = resolve_week_starts(otter_df["Year-Month"], otter_df["Week Of Year"])
+
+    weekly_otter_df = (
+        otter_df.groupby("week_start", sort=True)
+        .agg({"Number of Users": "sum", "Number of Notebooks": "sum"})
+        .reset_index()
+    )
+
+    latest_week = weekly_otter_df.iloc[-1]
+    latest_week_label = latest_week["week_start"].strftime("%b %-d, %Y")
+
+    otter_cutoff = weekly_otter_df["week_start"].max() - pd.DateOffset(months=12)
+    weekly_otter = weekly_otter_df[weekly_otter_df["week_start"] >= otter_cutoff].copy()
+    weekly_otter["label"] = weekly_otter["week_start"].dt.strftime("%Y-%m-%d")
+    weekly_otter["week_start"] = weekly_otter["week_start"].dt.strftime("%Y-%m-%d")
+
+    return {
+        "weekly": weekly_otter.to_dict(orient="records"),
+        "summary_cards": [
+            {
+                "label": "Notebooks Graded This Week",
+                "value": int(latest_week["Number of Notebooks"]),
+                "detail": latest_week_label,
+            },
+            {
+                "label": "Submissions This Week",
+                "value": int(latest_week["Number of Users"]),
+                "detail": latest_week_label,
+            },
+        ],
     }
-  )
-
-# Current + 3 previous semesters for the table
-recent_sems = semester_cols[-4:]
-
-# Table sort/label key: the most recent term that actually has data, so we never key
-# off an all-zero future term (e.g. spring_2027, which generate_dates emits ahead of time).
-current_sem = next(
-    (s for s in reversed(semester_cols) if int(users_df[s].sum()) > 0),
-    recent_sems[-1],
-)
-current_sem_label = format_semester_label(current_sem)
-
-# Current academic year terms (Fall Y / Spring Y+1 / Summer Y+1). Fall starts in August;
-# Jan–Jul belongs to the AY that began the previous Fall (summer is the tail of its AY).
-_today = date.today()
-_ay_start = _today.year if _today.month >= 8 else _today.year - 1
-ay_terms = [t for t in (f"fall_{_ay_start}", f"spring_{_ay_start + 1}", f"summer_{_ay_start + 1}")
-            if t in semester_cols]
-ay_label = f"AY {_ay_start}–{str(_ay_start + 1)[2:]}"
-
-institution_threshold = 5
-
-def _ay_institution_count(df):
-    """Institutions with >5 users in ANY term of the current academic year."""
-    if not ay_terms:
-        return 0
-    return int((df[ay_terms].max(axis=1) > institution_threshold).sum())
-
-current_institution_counts = {
-    "cloudbank": _ay_institution_count(cloudbank_df),
-    "icor": _ay_institution_count(icor_df),
-}
-
-institutions = (
-    users_df[["college", "where", "all-users", "all-users-ever-active"] + recent_sems]
-    .sort_values(current_sem, ascending=False)
-    .to_dict(orient="records")
-)
-
-# -- Load otter_standalone_use.csv --
-otter_df = pd.read_csv(BASE_DIR / "otter_standalone_use.csv", skiprows=1, skipinitialspace=True)
-otter_df.columns = [c.strip() for c in otter_df.columns]
-
-otter_df["week_start"] = pd.to_datetime(
-    otter_df.apply(lambda row: resolve_week_start(row["Year-Month"], row["Week Of Year"]), axis=1)
-)
-
-weekly_otter_df = (
-    otter_df.groupby("week_start", sort=True)
-    .agg({"Number of Users": "sum", "Number of Notebooks": "sum"})
-    .reset_index()
-)
-
-latest_week = weekly_otter_df.iloc[-1]
-latest_week_label = latest_week["week_start"].strftime("%b %-d, %Y")
-
-otter_cutoff = weekly_otter_df["week_start"].max() - pd.DateOffset(months=12)
-weekly_otter = weekly_otter_df[weekly_otter_df["week_start"] >= otter_cutoff].copy()
-weekly_otter["label"] = weekly_otter["week_start"].dt.strftime("%Y-%m-%d")
-weekly_otter["week_start"] = weekly_otter["week_start"].dt.strftime("%Y-%m-%d")
-weekly_otter = weekly_otter.to_dict(orient="records")
-
-summary_cards = [
-    {
-        "label": f"CloudBank Institutions > {institution_threshold}",
-        "value": current_institution_counts["cloudbank"],
-        "detail": ay_label,
-    },
-    {
-        "label": f"ICOR Institutions > {institution_threshold}",
-        "value": current_institution_counts["icor"],
-        "detail": ay_label,
-    },
-    {
-        "label": "Notebooks Graded This Week",
-        "value": int(latest_week["Number of Notebooks"]),
-        "detail": latest_week_label,
-    },
-    {
-        "label": "Submissions This Week",
-        "value": int(latest_week["Number of Users"]),
-        "detail": latest_week_label,
-    },
-]
-
-# -- Build HTML --
-updated = date.today().isoformat()
-recent_sem_labels = {s: format_semester_label(s) for s in recent_sems}
-semester_json = json.dumps(semester_data)
-institutions_json = json.dumps(institutions)
-otter_json = json.dumps(weekly_otter)
-recent_sems_json = json.dumps(recent_sems)
-recent_sem_labels_json = json.dumps(recent_sem_labels)
-current_sem_json = json.dumps(current_sem)
-
-# Default the table sort to the most recent term that actually has data, so
-# the dashboard doesn't open sorted by an all-zero future term (e.g. spring_2027).
-default_sort_sem = next(
-    (s for s in reversed(recent_sems) if int(users_df[s].sum()) > 0),
-    current_sem,
-)
-default_sort_json = json.dumps(default_sort_sem)
-summary_json = json.dumps(summary_cards)
-
-# Pre-render the semester <option>s for the term filter
-sem_options_html = "".join(
-    f'<option value="{s}">{recent_sem_labels[s]}</option>' for s in recent_sems
-)
-
-html = f"""<!DOCTYPE html>
+
+
+def write_data_file(data_dir, name, payload):
+    """Writes payload to data/<name>.<content hash>.json and removes older
+    versions of the same file. The hash in the name lets the page be cached
+    aggressively and means an unchanged payload is never rewritten. GitHub
+    Pages compresses it on the fly, so no precompressed copies are kept.
+
+    Returns:
+        str: Path of the JSON file relative to docs/.
+    """
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    filename = f"{name}.{hashlib.sha256(body).hexdigest()[:12]}.json"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    if not (data_dir / filename).exists():
+        (data_dir / filename).write_bytes(body)
+    for stale in data_dir.glob(f"{name}.*.json*"):
+        if stale.name != filename:
+            stale.unlink()
+    return f"{DATA_DIR_NAME}/{filename}"
+
+
+def _read_data_file(docs_dir, data_file):
+    """The payload in data_file (relative to docs/), or None if it is gone or unreadable."""
+    try:
+        return json.loads((docs_dir / data_file).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def render_html(users_section, otter_section, data_files, updated):
+    recent_sems = users_section["recent_sems"]
+    recent_sem_labels = users_section["recent_sem_labels"]
+    semester_json = json.dumps(users_section["semesters"])
+    data_files_json = json.dumps(data_files)
+    recent_sems_json = json.dumps(recent_sems)
+    recent_sem_labels_json = json.dumps(recent_sem_labels)
+    current_sem_json = json.dumps(users_section["current_sem"])
+    default_sort_json = json.dumps(users_section["default_sort"])
+    summary_json = json.dumps(users_section["summary_cards"] + otter_section["summary_cards"])
+
+    # Pre-render the semester <option>s for the term filter
+    sem_options_html = "".join(
+        f'<option value="{s}">{recent_sem_labels[s]}</option>' for s in recent_sems
+    )
+
+    html = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta charset="UTF-8" />
   <meta name="viewport" content="width=device-width, initial-scale=1.0" />
   <title>Cal-ICOR and CloudBank Pilot Hub Users</title>
-  <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+  <script src="https://cdn.jsdelivr.net/npm/chart.js" defer></script>
   <style>
     * {{ box-sizing: border-box; margin: 0; padding: 0; }}
     body {{ font-family: system-ui, sans-serif; background: #f5f5f5; color: #222; padding: 2rem; }}
@@ -233,6 +405,7 @@ html = f"""<!DOCTYPE html>
   <div class="card">
     <h2>Otter Standalone Weekly Usage</h2>
     <canvas id="otterChart"></canvas>
+    <p class="empty" id="otter-msg">Loading weekly usage...</p>
   </div>
 
   <div class="card">
@@ -256,18 +429,50 @@ html = f"""<!DOCTYPE html>
       <tbody id="table-body"></tbody>
     </table>
     <p class="empty" id="empty-msg" hidden>No institutions match the current filters.</p>
+    <p class="empty" id="table-msg">Loading institutions...</p>
   </div>
 
-  <script>
+  <!-- A module script is deferred like chart.js above and runs after it, so
+       neither blocks first paint. The table rows and the otter series live in
+       separate data files that are fetched once their card nears the viewport. -->
+  <script type="module">
     const semesters       = {semester_json};
-    const institutions    = {institutions_json};
-    const otter           = {otter_json};
+    const dataFiles       = {data_files_json};
     const recentSems      = {recent_sems_json};
     const recentSemLabels = {recent_sem_labels_json};
     const currentSem      = {current_sem_json};
     const defaultSort     = {default_sort_json};
     const summaries       = {summary_json};
 
+    function whenVisible(el, load) {{
+      if (!("IntersectionObserver" in window)) {{
+        load();
+        return;
+      }}
+      const observer = new IntersectionObserver(entries => {{
+        if (entries.some(e => e.isIntersecting)) {{
+          observer.disconnect();
+          load();
+        }}
+      }}, {{ rootMargin: "300px" }});
+      observer.observe(el);
+    }}
+
+    function loadData(url, msgEl, onLoad) {{
+      fetch(url)
+        .then(r => {{
+          if (!r.ok) throw new Error(`${{r.status}} fetching ${{url}}`);
+          return r.json();
+        }})
+        .then(data => {{
+          msgEl.hidden = true;
+          onLoad(data);
+        }})
+        .catch(err => {{
+          msgEl.textContent = `Could not load data (${{err.message}}).`;
+        }});
+    }}
+
     // --- Summary cards ---
     const summaryGrid = document.getElementById("summary-grid");
     summaryGrid.innerHTML = summaries.map(item => `
@@ -296,43 +501,48 @@ html = f"""<!DOCTYPE html>
     }});
 
     // --- Otter chart ---
-    new Chart(document.getElementById("otterChart"), {{
-      type: "line",
-      data: {{
-        labels: otter.map(r => r.label),
-        datasets: [
-          {{
-            label: "Submissions",
-            data: otter.map(r => r["Number of Users"]),
-            borderColor: "#4e79a7",
-            backgroundColor: "rgba(78,121,167,0.1)",
-            tension: 0.3,
-            fill: true
-          }},
-          {{
-            label: "Notebooks",
-            data: otter.map(r => r["Number of Notebooks"]),
-            borderColor: "#59a14f",
-            backgroundColor: "rgba(89,161,79,0.1)",
-            tension: 0.3,
-            fill: true
-          }},
-        ]
-      }},
-      options: {{
-        responsive: true,
-        plugins: {{ legend: {{ position: "top" }} }},
-        scales: {{
-          x: {{ ticks: {{ maxTicksLimit: 12 }} }},
-          y: {{ beginAtZero: true, ticks: {{ precision: 0 }} }}
+    const otterCanvas = document.getElementById("otterChart");
+    whenVisible(otterCanvas, () => loadData(dataFiles.otter, document.getElementById("otter-msg"), section => {{
+      const otter = section.weekly;
+      new Chart(otterCanvas, {{
+        type: "line",
+        data: {{
+          labels: otter.map(r => r.label),
+          datasets: [
+            {{
+              label: "Submissions",
+              data: otter.map(r => r["Number of Users"]),
+              borderColor: "#4e79a7",
+              backgroundColor: "rgba(78,121,167,0.1)",
+              tension: 0.3,
+              fill: true
+            }},
+            {{
+              label: "Notebooks",
+              data: otter.map(r => r["Number of Notebooks"]),
+              borderColor: "#59a14f",
+              backgroundColor: "rgba(89,161,79,0.1)",
+              tension: 0.3,
+              fill: true
+            }},
+          ]
+        }},
+        options: {{
+          responsive: true,
+          plugins: {{ legend: {{ position: "top" }} }},
+          scales: {{
+            x: {{ ticks: {{ maxTicksLimit: 12 }} }},
+            y: {{ beginAtZero: true, ticks: {{ precision: 0 }} }}
+          }}
         }}
-      }}
-    }});
+      }});
+    }}));
 
     // --- Institution table (sortable + filterable) ---
     const thead = document.getElementById("table-head");
     const tbody = document.getElementById("table-body");
     const emptyMsg = document.getElementById("empty-msg");
+    let institutions = null;
 
     const programLabels = {{ cloudbank: "CloudBank", icor: "ICOR" }};
     const state = {{ program: "all", semester: "all", search: "", sortKey: defaultSort, sortDir: "desc" }};
@@ -390,6 +600,7 @@ html = f"""<!DOCTYPE html>
         }});
       }});
 
+      if (institutions === null) return;
       const rows = sortRows(applyFilters());
       emptyMsg.hidden = rows.length > 0;
 
@@ -429,11 +640,99 @@ html = f"""<!DOCTYPE html>
     }});
 
     render();
+    whenVisible(document.getElementById("inst-table"), () => loadData(dataFiles.users, document.getElementById("table-msg"), section => {{
+      institutions = section.institutions;
+      render();
+    }}));
   </script>
 </body>
 </html>
 """
+    return html
+
+
+def _load_manifest(manifest_path):
+    if not manifest_path.exists():
+        return {}
+    try:
+        return json.loads(manifest_path.read_text())
+    except ValueError:
+        return {}
+
+
+def build_dashboard(users_df, otter_df, docs_dir=DOCS_DIR, today=None, force=False):
+    """Builds docs/index.html from in-memory users.csv / otter_standalone_use.csv frames.
+
+    Each section's payload is written whole to a versioned data file (see
+    write_data_file), which the page fetches for the table rows and the otter
+    series. A small manifest next to the page records a fingerprint of each
+    section's inputs (plus this generator's own source) and its data file. A
+    section whose fingerprint is unchanged is read back from its data file
+    instead of recomputed; when nothing changed at all, nothing is written, so
+    an unchanged night leaves docs/ untouched.
+
+    Returns:
+        dict: {"written": bool, "rebuilt": [section names recomputed]}
+    """
+    today = today or date.today()
+    index_path = docs_dir / "index.html"
+    manifest_path = docs_dir / MANIFEST_NAME
+    manifest = {} if force else _load_manifest(manifest_path)
+    cached = manifest.get("sections", {})
+    generator = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+    if manifest.get("generator") != generator or not index_path.exists():
+        cached = {}
+
+    users_df = normalize_users(users_df)
+    otter_df = normalize_otter(otter_df)
+    fingerprints = {
+        "users": f"{frame_fingerprint(users_df[users_section_columns(users_df)])}:{academic_year_start(today)}",
+        "otter": frame_fingerprint(otter_df),
+    }
+    builders = {
+        "users": lambda: build_users_section(users_df, academic_year_start(today)),
+        "otter": lambda: build_otter_section(otter_df),
+    }
+
+    sections = {}
+    rebuilt = []
+    for name, fingerprint in fingerprints.items():
+        entry = cached.get(name)
+        if entry is not None and entry.get("fingerprint") == fingerprint:
+            sections[name] = _read_data_file(docs_dir, entry["data_file"])
+            if sections[name] is not None:
+                continue
+        sections[name] = builders[name]()
+        rebuilt.append(name)
+
+    if not rebuilt:
+        return {"written": False, "rebuilt": []}
+
+    data_dir = docs_dir / DATA_DIR_NAME
+    data_files = {name: write_data_file(data_dir, name, section) for name, section in sections.items()}
+    html = render_html(sections["users"], sections["otter"], data_files, today.isoformat())
+    index_path.write_text(html)
+    manifest = {
+        "generator": generator,
+        "sections": {
+            name: {"fingerprint": fingerprints[name], "data_file": data_files[name]} for name in sections
+        },
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=1, sort_keys=True) + "\n")
+    return {"written": True, "rebuilt": rebuilt}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--force", action="store_true", help="Rebuild every section even if its inputs are unchanged")
+    args = parser.parse_args()
+
+    result = build_dashboard(load_users(), load_otter(), force=args.force)
+    if result["written"]:
+        print(f"Dashboard written to {DOCS_DIR / 'index.html'} (rebuilt: {', '.join(result['rebuilt'])})")
+    else:
+        print(f"Dashboard unchanged, inputs match {DOCS_DIR / MANIFEST_NAME}")
+
 
-DOCS_DIR.mkdir(exist_ok=True)
-(DOCS_DIR / "index.html").write_text(html)
-print(f"Dashboard written to {DOCS_DIR / 'index.html'}")
+if __name__ == "__main__":
+    main()
@@ -21,43 +21,59 @@ Requires:
     - env NSF_HASH_KEY: HMAC key used to pseudonymize hub usernames
 
 Usage:
-    python scripts/build_nsf_report.py             # build and submit
-    python scripts/build_nsf_report.py --dry-run    # build and print only
+    python scripts/build_nsf_report.py             # build and submit new/changed records
+    python scripts/build_nsf_report.py --full      # build and submit every record
+    python scripts/build_nsf_report.py --dry-run    # build and spool the payload only
+
+Submissions are delta-only: nsf_submission_ledger.json remembers a digest of
+each hashed_user_id's last submitted record, and only new or changed records
+are sent. Every FULL_RESYNC_DAYS (or with --full) everything is resent and,
+once every chunk is accepted, the ledger is rebuilt from scratch. A full resync
+with failed chunks only adds what was accepted, and is tried again next run.
+
+Records are filtered against the ledger and spooled as each institution's hub
+finishes, into gzip-compressed JSON chunks under nsf_report_chunks/ (at most
+CHUNK_MAX_BYTES of JSON each), so the report is never held in memory. Chunks are uploaded
+and retried independently; records in a chunk that still fails are left out of
+the ledger, so the next run resends just those.
 """
 
 import argparse
+import gzip
 import hashlib
 import hmac
 import json
 import os
-import re
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from pathlib import Path
 
-import pandas as pd
 import requests
 
 BASE_DIR = Path(__file__).parent.parent
 sys.path.insert(0, str(BASE_DIR))
 
 from users import convert, get_users  # noqa: E402
-SHEET_CSV_URL = (
-    "https://docs.google.com/spreadsheets/d/"
-    "1pYQTs-zFvbvBl9FdMIjCUKRv9_O5vGvfdRgNgyBy9-0/export?format=csv&gid=352213565"
-)
-ACCESS_ID_PATTERN = re.compile(r"^[A-Z]{2,6}\d{6}$")
+from pseudonyms import hash_usernames  # noqa: E402
+import roster  # noqa: E402
+
 MAPPING_PATH = BASE_DIR / "config" / "institution_mapping.json"
 PILOTS_PATH = BASE_DIR / "pilots.json"
-XDMOD_ENDPOINT = "https://data.ccr.xdmod.org/resource-manager-logs"
+# Overridable so a local stand-in for the endpoint can be used for testing.
+XDMOD_ENDPOINT = os.environ.get("XDMOD_ENDPOINT", "https://data.ccr.xdmod.org/resource-manager-logs")
+LEDGER_PATH = BASE_DIR / "nsf_submission_ledger.json"
+FULL_RESYNC_DAYS = 7
+SPOOL_DIR = BASE_DIR / "nsf_report_chunks"
+CHUNK_MAX_BYTES = 5 * 1024 * 1024  # uncompressed JSON per uploaded file
+SUBMIT_ATTEMPTS = 3
+MAX_WORKERS = 10
 
 
 def fetch_qualifying_access_ids():
     """Returns {institution name: access id} for rows with a current ACCESS allocation."""
-    df = pd.read_csv(SHEET_CSV_URL)
-    df["Notes"] = df["Notes"].astype(str).str.strip()
-    qualifying = df[df["Notes"].str.match(ACCESS_ID_PATTERN, na=False)]
-    return dict(zip(qualifying["Institution"], qualifying["Notes"]))
+    return roster.qualifying_access_ids()
 
 
 def load_reviewed_mapping():
@@ -88,80 +104,258 @@ def hub_users(pilot):
 
 
 def hash_user_id(hmac_key, institutional_id, username):
+    """Reference single-user pseudonym; build_report hashes in batches with
+    pseudonyms.hash_usernames, which produces the same values."""
     message = f"{institutional_id}:{username}".encode()
     return hmac.new(hmac_key.encode(), message, hashlib.sha256).hexdigest()
 
 
-def build_report(hmac_key):
-    """Returns (records, problems, warnings). problems is non-empty if the report is
-    incomplete (blocks submission for that institution). warnings flag hub users
-    excluded from the report because they have no recorded activity at all — these
-    are typically bulk-provisioned accounts (roster imports, etc.) that were never
-    actually used, so they're not reported as ACCESS allocation users. Tracked as
-    warnings (not silently dropped) so the exclusion stays visible."""
-    current_access_ids = fetch_qualifying_access_ids()
-    reviewed = load_reviewed_mapping()
-
+def process_institution(institution, access_id, entry, hmac_key):
+    """Fetches and hashes one institution's hub users. Returns (records, problems,
+    warnings) for that institution alone, so institutions can run concurrently and
+    be merged afterwards in a fixed order."""
     problems = []
     warnings = []
     records = []
 
-    for institution, access_id in current_access_ids.items():
-        entry = reviewed.get(institution)
-        if entry is None:
-            problems.append(
-                f"'{institution}' has ACCESS allocation {access_id} in the sheet but no "
-                f"reviewed entry in {MAPPING_PATH.name} — run scripts/generate_institution_mapping.py "
-                f"and review it before this institution can be reported"
+    pilot = load_pilot(entry["hub_url"])
+    try:
+        users = hub_users(pilot)
+    except Exception as exc:
+        problems.append(f"'{institution}' ({entry['hub_url']}): failed to fetch hub users: {exc}")
+        return records, problems, warnings
+
+    active = []
+    for user in users:
+        if not user["last_activity"]:
+            warnings.append(
+                {"institution": institution, "hub_url": entry["hub_url"], "username": user["name"]}
             )
             continue
-        if entry["hub_url"] is None or entry["institutional_id"] is None:
-            # Known, reviewed gap (e.g. no CloudBank hub, or no IPEDS UnitID). Not an error,
-            # just nothing to report for this institution.
-            continue
+        active.append(user)
+
+    hashed = hash_usernames(hmac_key, entry["institutional_id"], [user["name"] for user in active])
+    for user, hashed_user_id in zip(active, hashed):
+        records.append(
+            {
+                "access_id": access_id,
+                "institutional_id": entry["institutional_id"],
+                "institution_name": entry["canonical_name"],
+                "hashed_user_id": hashed_user_id,
+                "last_activity_date": convert(user["last_activity"]).date().isoformat(),
+            }
+        )
 
-        pilot = load_pilot(entry["hub_url"])
-        try:
-            users = hub_users(pilot)
-        except Exception as exc:
-            problems.append(f"'{institution}' ({entry['hub_url']}): failed to fetch hub users: {exc}")
-            continue
+    return records, problems, warnings
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def build_report(hmac_key, problems, warnings, timings, max_workers=MAX_WORKERS):
+    """Yields the report's records, one institution at a time. problems is
+    appended to if the report is incomplete (blocks submission for that
+    institution). warnings is appended to for hub users excluded from the
+    report because they have no recorded activity at all — these are typically
+    bulk-provisioned accounts (roster imports, etc.) that were never actually
+    used, so they're not reported as ACCESS allocation users. Tracked as
+    warnings (not silently dropped) so the exclusion stays visible. timings is
+    filled with {institution: seconds} for every institution whose hub was fetched.
 
-        for user in users:
-            if not user["last_activity"]:
-                warnings.append(
-                    {"institution": institution, "hub_url": entry["hub_url"], "username": user["name"]}
+    Hubs are fetched on a bounded thread pool (like users.main), and each
+    institution's records are yielded as soon as it and every institution before
+    it in sheet order have finished. So the records come out in the same order
+    as a serial run, and only the institutions in flight are held in memory."""
+    current_access_ids = fetch_qualifying_access_ids()
+    reviewed = load_reviewed_mapping()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for institution, access_id in current_access_ids.items():
+            entry = reviewed.get(institution)
+            if entry is None:
+                continue
+            if entry["hub_url"] is None or entry["institutional_id"] is None:
+                continue
+            futures[institution] = executor.submit(
+                _timed, process_institution, institution, access_id, entry, hmac_key
+            )
+
+        for institution, access_id in current_access_ids.items():
+            entry = reviewed.get(institution)
+            if entry is None:
+                problems.append(
+                    f"'{institution}' has ACCESS allocation {access_id} in the sheet but no "
+                    f"reviewed entry in {MAPPING_PATH.name} — run scripts/generate_institution_mapping.py "
+                    f"and review it before this institution can be reported"
                 )
                 continue
+            if institution not in futures:
+                # Known, reviewed gap (e.g. no CloudBank hub, or no IPEDS UnitID). Not an error,
+                # just nothing to report for this institution.
+                continue
 
-            records.append(
-                {
-                    "access_id": access_id,
-                    "institutional_id": entry["institutional_id"],
-                    "institution_name": entry["canonical_name"],
-                    "hashed_user_id": hash_user_id(hmac_key, entry["institutional_id"], user["name"]),
-                    "last_activity_date": convert(user["last_activity"]).date().isoformat(),
-                }
-            )
+            try:
+                (inst_records, inst_problems, inst_warnings), elapsed = futures.pop(institution).result()
+            except Exception as exc:
+                problems.append(f"'{institution}' ({entry['hub_url']}): failed to build report: {exc}")
+                continue
+            problems.extend(inst_problems)
+            warnings.extend(inst_warnings)
+            timings[institution] = elapsed
+            yield from inst_records
 
-    return records, problems, warnings
 
+def record_digest(record):
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode()).hexdigest()[:16]
 
-def submit(records, token):
-    payload = json.dumps(records).encode()
-    filename = f"{date.today().isoformat()}.cloudbank-classroom.json"
-    response = requests.post(
-        XDMOD_ENDPOINT,
-        headers={"Authorization": f"Bearer {token}"},
-        files={"file": (filename, payload, "application/json")},
-    )
-    response.raise_for_status()
-    return response
+
+def load_ledger():
+    """What XDMoD was last sent: {"last_full_submission": ISO date or None,
+    "submitted": {hashed_user_id: record_digest}}. Holds only pseudonyms and
+    digests, never usernames."""
+    if not LEDGER_PATH.exists():
+        return {"last_full_submission": None, "submitted": {}}
+    return json.loads(LEDGER_PATH.read_text())
+
+
+def needs_full_resync(ledger, today, every_days=FULL_RESYNC_DAYS):
+    last_full = ledger.get("last_full_submission")
+    return last_full is None or (today - date.fromisoformat(last_full)).days >= every_days
+
+
+def select_delta(records, ledger):
+    """Yields the records that are new or differ from what the ledger says was last submitted."""
+    submitted = ledger["submitted"]
+    for record in records:
+        if submitted.get(record["hashed_user_id"]) != record_digest(record):
+            yield record
+
+
+def tally(records, counts):
+    """Passes records through, counting them per institutional_id into counts."""
+    for record in records:
+        counts[record["institutional_id"]] = counts.get(record["institutional_id"], 0) + 1
+        yield record
+
+
+def update_ledger(ledger, digests, full, today):
+    """Records what XDMoD accepted ({hashed_user_id: record_digest}). A full
+    submission that was accepted in full replaces the ledger, so users who have
+    left every hub stop being tracked. Otherwise the accepted digests are merged
+    in, and anything in a chunk that failed is simply absent, so the next delta
+    run sends it again."""
+    if full:
+        ledger = {"last_full_submission": today.isoformat(), "submitted": digests}
+    else:
+        ledger["submitted"].update(digests)
+    LEDGER_PATH.write_text(json.dumps(ledger, sort_keys=True) + "\n")
+    return ledger
+
+
+def spool_chunks(records, spool_dir, max_bytes=CHUNK_MAX_BYTES):
+    """Serializes records one at a time, as they are produced, into
+    gzip-compressed JSON-array files of at most max_bytes (uncompressed) each,
+    so no full in-memory payload is ever built. Each chunk's
+    "<hashed_user_id> <record_digest>" lines for the ledger go to a .digests
+    file next to it. Replaces any chunks left in spool_dir by an earlier run.
+
+    Returns:
+        list: One dict per chunk: {"path", "digests_path", "count", "bytes"}.
+    """
+    spool_dir.mkdir(exist_ok=True)
+    for stale in [*spool_dir.glob("*.json.gz"), *spool_dir.glob("*.digests")]:
+        stale.unlink()
+
+    chunks = []
+    out = digests = None
+
+    def close():
+        out.write(b"]")
+        out.close()
+        digests.close()
+
+    for record in records:
+        line = json.dumps(record).encode()
+        if out is not None and chunks[-1]["bytes"] + len(line) + 2 > max_bytes:
+            close()
+            out = None
+        if out is None:
+            path = spool_dir / f"part-{len(chunks):04d}.json.gz"
+            digests_path = spool_dir / f"part-{len(chunks):04d}.digests"
+            # mtime=0 keeps identical payloads byte-identical across runs
+            out = gzip.GzipFile(path, "wb", compresslevel=6, mtime=0)
+            digests = open(digests_path, "w")
+            out.write(b"[")
+            chunks.append({"path": path, "digests_path": digests_path, "count": 0, "bytes": 2})
+        else:
+            out.write(b",")
+            chunks[-1]["bytes"] += 1
+        out.write(line)
+        digests.write(f"{record['hashed_user_id']} {record_digest(record)}\n")
+        chunks[-1]["count"] += 1
+        chunks[-1]["bytes"] += len(line)
+    if out is not None:
+        close()
+    return chunks
+
+
+def read_digests(path):
+    """{hashed_user_id: record_digest} from a chunk's .digests file."""
+    with open(path) as f:
+        return dict(line.split() for line in f)
+
+
+def submit_chunk(path, filename, token, attempts=SUBMIT_ATTEMPTS):
+    """Uploads one spooled chunk, retrying transient failures (connection errors
+    and 5xx responses) with backoff. Only this chunk is ever resent."""
+    with gzip.open(path, "rb") as f:
+        payload = f.read()
+    for attempt in range(1, attempts + 1):
+        try:
+            response = requests.post(
+                XDMOD_ENDPOINT,
+                headers={"Authorization": f"Bearer {token}"},
+                files={"file": (filename, payload, "application/json")},
+            )
+            response.raise_for_status()
+            return response
+        except requests.RequestException as exc:
+            retryable = exc.response is None or exc.response.status_code >= 500
+            if not retryable or attempt == attempts:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def submit_chunks(chunks, token, today):
+    """Uploads every chunk independently. Returns (accepted digests, failures)."""
+    accepted = {}
+    failures = []
+    for index, chunk in enumerate(chunks):
+        filename = f"{today.isoformat()}.cloudbank-classroom.json"
+        if len(chunks) > 1:
+            filename = f"{today.isoformat()}.cloudbank-classroom.part{index + 1:03d}.json"
+        try:
+            submit_chunk(chunk["path"], filename, token)
+        except requests.RequestException as exc:
+            body = exc.response.text[:500] if exc.response is not None else str(exc)
+            failures.append(f"{filename} ({chunk['count']} records): {body}")
+            continue
+        accepted.update(read_digests(chunk["digests_path"]))
+    return accepted, failures
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--dry-run", action="store_true", help="Build the report but do not submit it")
+    parser.add_argument("--full", action="store_true", help="Submit every record, not just new/changed ones")
+    parser.add_argument(
+        "--full-every", type=int, default=FULL_RESYNC_DAYS, metavar="DAYS",
+        help=f"Force a full resubmission when the last one is this many days old (default {FULL_RESYNC_DAYS})",
+    )
     args = parser.parse_args()
 
     hmac_key = os.environ.get("NSF_HASH_KEY")
@@ -173,10 +367,27 @@ def main():
         print("Finished with failure: XDMOD_TOKEN is not set")
         sys.exit(1)
 
-    records, problems, warnings = build_report(hmac_key)
-    institution_count = len({r["institutional_id"] for r in records})
-
-    lines = [f"Built report: {len(records)} user records across {institution_count} institutions"]
+    # Only records that are new or changed since the last successful submission
+    # are sent, with a periodic full resync so XDMoD can't drift from the ledger.
+    # Records are filtered and spooled as each institution finishes, so the
+    # report is never held in memory as a whole.
+    today = date.today()
+    ledger = load_ledger()
+    full = args.full or needs_full_resync(ledger, today, args.full_every)
+    problems = []
+    warnings = []
+    timings = {}
+    counts = {}
+    records = tally(build_report(hmac_key, problems, warnings, timings), counts)
+    chunks = spool_chunks(records if full else select_delta(records, ledger), SPOOL_DIR)
+    record_count = sum(counts.values())
+    to_submit = sum(chunk["count"] for chunk in chunks)
+
+    lines = [f"Built report: {record_count} user records across {len(counts)} institutions"]
+    lines.append(
+        f"Submission mode: {'full' if full else 'delta'} — {to_submit} of {record_count} records "
+        f"{'selected' if full else 'new or changed since the last submission'}"
+    )
     if problems:
         lines.append(f"{len(problems)} institution(s) skipped:")
         lines.extend(f"  - {p}" for p in problems)
@@ -190,6 +401,12 @@ def main():
             f"(no recorded activity):"
         )
         lines.extend(f"  - {k}: {v}" for k, v in sorted(by_institution.items()))
+    if timings:
+        lines.append(f"Hub fetch time per institution ({sum(timings.values()):.1f}s total, run concurrently):")
+        lines.extend(
+            f"  - {name}: {seconds:.1f}s"
+            for name, seconds in sorted(timings.items(), key=lambda item: -item[1])
+        )
     report = "\n".join(lines)
     print(report)
 
@@ -202,18 +419,16 @@ def main():
         detail_lines = [f"{w['institution']} ({w['hub_url']}): {w['username']}" for w in warnings]
         (BASE_DIR / "nsf_report_warnings.txt").write_text("\n".join(detail_lines) + "\n")
 
+    failed_chunks = []
     if args.dry_run:
-        out_path = BASE_DIR / "nsf_report.dry_run.json"
-        out_path.write_text(json.dumps(records, indent=2) + "\n")
-        print(f"Dry run — wrote {out_path}, did not submit")
-    elif records:
-        try:
-            response = submit(records, token)
-        except requests.RequestException as exc:
-            body = exc.response.text[:2000] if exc.response is not None else str(exc)
-            print(f"Finished with failure: XDMoD submission failed: {body}")
-            sys.exit(1)
-        print(f"Submitted {len(records)} records, status={response.status_code}")
+        print(f"Dry run — spooled {len(chunks)} gzip chunk(s) to {SPOOL_DIR}, did not submit")
+    elif chunks:
+        accepted, failed_chunks = submit_chunks(chunks, token, today)
+        if accepted:
+            # A full resync only replaces the ledger (and resets its date) if every
+            # chunk got through; otherwise it is retried on the next run
+            update_ledger(ledger, accepted, full and not failed_chunks, today)
+        print(f"Submitted {len(accepted)} of {to_submit} records in {len(chunks) - len(failed_chunks)}/{len(chunks)} chunk(s)")
     else:
         print("Nothing to submit")
 
@@ -226,11 +441,17 @@ def main():
     github_output = os.environ.get("GITHUB_OUTPUT")
     if github_output:
         with open(github_output, "a") as f:
-            f.write(f"record_count={len(records)}\n")
-            f.write(f"institution_count={institution_count}\n")
+            f.write(f"record_count={record_count}\n")
+            f.write(f"submitted_count={to_submit}\n")
+            f.write(f"institution_count={len(counts)}\n")
             f.write(f"skipped_count={len(problems)}\n")
             f.write(f"warning_count={len(warnings)}\n")
 
+    if failed_chunks:
+        print(f"Finished with failure: XDMoD submission failed for {len(failed_chunks)} chunk(s) "
+              f"(they will be resent by the next run): {'; '.join(failed_chunks)}")
+        sys.exit(1)
+
     if problems:
         print("Finished with failure: one or more institutions were skipped (see above)")
         sys.exit(1)
@@ -12,32 +12,55 @@ completion and prints what's out of sync. The workflow that calls this
 decides whether/how to surface it (e.g. post to Slack) — it does not fail
 the job by itself.
 
+The three sources are fetched concurrently. The infra cluster.yaml is only
+downloaded and parsed when its git blob SHA differs from the one cached in
+.cache/infra_cluster.json; otherwise the hub list parsed last time is reused.
+
 Requires:
     - pilots.json: decrypted pilot hub tokens (see main.py)
     - `gh` CLI available and able to read the public 2i2c-org/infrastructure repo
+      (GH_CLI overrides the executable, e.g. to point at a local stand-in)
     - config/institution_mapping.json: used as known-good hub<->sheet_institution
       pairs so already-reviewed matches aren't re-guessed on every run
 
+With --probe, every pilot hub in pilots.json is also probed (see hub_probe.py):
+hubs that are unreachable, reject their token, or answer slowly are listed in
+the report, with latency, TLS handshake time, HTTP status and hub version.
+Slow hubs are listed for information only and don't count toward issue_count,
+since users.py crawls them as usual.
+
 Usage:
     python scripts/check_deployment_sync.py
+    python scripts/check_deployment_sync.py --probe
 """
 
-import difflib
+import argparse
+import base64
 import json
 import os
 import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-import pandas as pd
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 BASE_DIR = Path(__file__).parent.parent
-SHEET_CSV_URL = (
-    "https://docs.google.com/spreadsheets/d/"
-    "1pYQTs-zFvbvBl9FdMIjCUKRv9_O5vGvfdRgNgyBy9-0/export?format=csv&gid=352213565"
-)
+sys.path.insert(0, str(BASE_DIR))
+
+import roster  # noqa: E402
+from hub_probe import probe_pilots  # noqa: E402
+from name_matching import TrigramIndex  # noqa: E402
+
 PILOTS_PATH = BASE_DIR / "pilots.json"
 MAPPING_PATH = BASE_DIR / "config" / "institution_mapping.json"
+INFRA_CACHE_PATH = BASE_DIR / ".cache" / "infra_cluster.json"
+GH_CLI = os.environ.get("GH_CLI", "gh")
 
 INFRA_REPO = "2i2c-org/infrastructure"
 INFRA_CLUSTER_YAML_PATH = "config/clusters/cloudbank/cluster.yaml"
@@ -46,20 +69,43 @@ INFRA_CLUSTER_YAML_PATH = "config/clusters/cloudbank/cluster.yaml"
 # member institution, so they're out of scope for ACCESS-ID / roster matching.
 NON_INSTITUTION_SLUGS = {"cra", "authoring", "demo", "gpu-demo", "staging", "high"}
 
+# Report sections listed for information, not counted as issues
+INFO_ONLY = {"slow"}
+
+
+def gh_api(endpoint):
+    raw = subprocess.run([GH_CLI, "api", endpoint], capture_output=True, text=True, check=True).stdout
+    return json.loads(raw)
+
+
+def _read_infra_cache():
+    if not INFRA_CACHE_PATH.exists():
+        return None
+    try:
+        return json.loads(INFRA_CACHE_PATH.read_text())
+    except ValueError:
+        return None
+
 
 def fetch_infra_hubs():
-    """Returns {slug: display_name} for real institution hubs in the cloudbank cluster."""
-    raw = subprocess.run(
-        ["gh", "api", f"repos/{INFRA_REPO}/contents/{INFRA_CLUSTER_YAML_PATH}", "--jq", ".content"],
-        capture_output=True, text=True, check=True,
-    ).stdout
-    import base64
-    cluster = yaml.safe_load(base64.b64decode(raw))
-    return {
-        hub["name"]: hub["display_name"]
-        for hub in cluster["hubs"]
-        if hub["name"] not in NON_INSTITUTION_SLUGS
-    }
+    """Returns {slug: display_name} for real institution hubs in the cloudbank cluster.
+
+    Looks up cluster.yaml's blob SHA from its directory listing first, and only
+    downloads and parses the file when that SHA isn't the cached one."""
+    directory, filename = INFRA_CLUSTER_YAML_PATH.rsplit("/", 1)
+    listing = gh_api(f"repos/{INFRA_REPO}/contents/{directory}")
+    sha = next(entry["sha"] for entry in listing if entry["name"] == filename)
+
+    cached = _read_infra_cache()
+    if cached is not None and cached.get("sha") == sha:
+        hubs = cached["hubs"]
+    else:
+        blob = gh_api(f"repos/{INFRA_REPO}/git/blobs/{sha}")
+        cluster = yaml.load(base64.b64decode(blob["content"]), Loader=SafeLoader)
+        hubs = {hub["name"]: hub["display_name"] for hub in cluster["hubs"]}
+        INFRA_CACHE_PATH.parent.mkdir(exist_ok=True)
+        INFRA_CACHE_PATH.write_text(json.dumps({"sha": sha, "hubs": hubs}) + "\n")
+    return {slug: name for slug, name in hubs.items() if slug not in NON_INSTITUTION_SLUGS}
 
 
 def load_pilots():
@@ -74,15 +120,7 @@ def load_pilots():
 def fetch_sheet():
     """Returns {institution: access_id_or_None}, excluding rows explicitly marked icor
     (those are a separate project per Sean, not CloudBank/cloudbank-cluster scope)."""
-    df = pd.read_csv(SHEET_CSV_URL)
-    df["Notes"] = df["Notes"].astype(str).str.strip()
-    df = df[df["Institution"].notna()]
-    df = df[df["Notes"].str.lower() != "icor"]
-    access_id_pattern = df["Notes"].str.match(r"^[A-Z]{2,6}\d{6}$", na=False)
-    return {
-        row["Institution"]: (row["Notes"] if match else None)
-        for match, (_, row) in zip(access_id_pattern, df.iterrows())
-    }
+    return roster.cloudbank_institutions()
 
 
 def load_reviewed_hub_to_institution():
@@ -113,19 +151,24 @@ def match_sheet_institution(candidate_names, sheet_institutions, known_match):
     return None
 
 
-def suggest_sheet_institution(display_name, sheet_institutions):
-    best = difflib.get_close_matches(display_name, sheet_institutions, n=1, cutoff=0.6)
-    if not best:
-        return None, 0
-    score = round(difflib.SequenceMatcher(None, display_name, best[0]).ratio() * 100)
-    return best[0], score
+def suggest_sheet_institutions(display_names, sheet_institutions):
+    """[(closest_sheet_institution_or_None, score)] for each display name, as
+    difflib.get_close_matches(n=1, cutoff=0.6) would pick it."""
+    return TrigramIndex(sheet_institutions).close_matches(display_names, cutoff=0.6)
 
 
-def check():
-    infra_hubs = fetch_infra_hubs()
-    pilot_hubs = load_pilots()
-    sheet = fetch_sheet()
-    reviewed = load_reviewed_hub_to_institution()
+def check(probe=False):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        infra_future = executor.submit(fetch_infra_hubs)
+        pilots_future = executor.submit(load_pilots)
+        sheet_future = executor.submit(fetch_sheet)
+        if probe:
+            probe_future = executor.submit(probe_pilots, json.loads(PILOTS_PATH.read_text())["pilots"])
+        reviewed = load_reviewed_hub_to_institution()
+        infra_hubs = infra_future.result()
+        pilot_hubs = pilots_future.result()
+        sheet = sheet_future.result()
+        health = probe_future.result() if probe else {}
 
     infra_slugs = set(infra_hubs)
     pilot_slugs = set(pilot_hubs)
@@ -136,14 +179,22 @@ def check():
         "token_but_not_deployed": [],  # in pilots.json, not in infra — stale/decommissioned
         "deployed_no_access_id": [],       # confidently matched to a sheet row, but no ACCESS ID yet
         "needs_review": [],                # can't confidently tell if this institution has an ACCESS ID or not
+        "unreachable": [],                 # --probe: hub API didn't answer (or answered 5xx)
+        "unauthorized": [],                # --probe: hub rejected our token — users.py will skip it
+        "slow": [],                        # --probe: hub API answered, but slowly (information only)
     }
 
+    for result in health.values():
+        if result.verdict != "ok":
+            issues[result.verdict].append(f"{result.name} ({result.url}) — {result.describe()}")
+
     for slug in sorted(infra_slugs - pilot_slugs):
         issues["deployed_but_no_token"].append(f"{infra_hubs[slug]} ({slug}) — deployed in infra, no entry in pilots.json")
 
     for slug in sorted(pilot_slugs - infra_slugs):
         issues["token_but_not_deployed"].append(f"{pilot_hubs[slug]} ({slug}) — in pilots.json, no infra deployment found")
 
+    unmatched = []
     for slug in sorted(infra_slugs & pilot_slugs):
         display_name = infra_hubs[slug]
         candidate_names = [display_name, pilot_hubs[slug]]
@@ -153,8 +204,10 @@ def check():
             if sheet[matched_institution] is None:
                 issues["deployed_no_access_id"].append(f"{display_name} ({slug}) — deployed, in roster, but no ACCESS ID yet")
             continue
+        unmatched.append((slug, display_name))
 
-        suggestion, score = suggest_sheet_institution(display_name, sheet_names)
+    suggestions = suggest_sheet_institutions([name for _, name in unmatched], sheet_names)
+    for (slug, display_name), (suggestion, score) in zip(unmatched, suggestions):
         if suggestion:
             issues["needs_review"].append(
                 f"{display_name} ({slug}) — not confidently matched to a roster row; closest guess is "
@@ -166,20 +219,27 @@ def check():
     return issues
 
 
+def issue_count(issues):
+    """Number of items in issues that need attention (everything but INFO_ONLY)."""
+    return sum(len(items) for key, items in issues.items() if key not in INFO_ONLY)
+
+
 def format_report(issues):
     labels = {
         "deployed_but_no_token": "Deployed in infra but missing from pilots.json (no data can be collected)",
         "token_but_not_deployed": "In pilots.json but not found in infra (possibly decommissioned)",
         "deployed_no_access_id": "Deployed and in the roster, but no ACCESS ID yet",
         "needs_review": "Can't confidently match to a roster row (needs a human to confirm the pairing)",
+        "unreachable": "Hub API unreachable (probe)",
+        "unauthorized": "Hub rejected our API token — expired or revoked (probe)",
+        "slow": "Hub API slow to respond (probe; for information, still crawled)",
     }
     lines = []
-    total = 0
+    total = issue_count(issues)
     for key, label in labels.items():
         items = issues[key]
         if not items:
             continue
-        total += len(items)
         lines.append(f"\n{label} ({len(items)}):")
         lines.extend(f"  - {item}" for item in items)
     header = f"Deployment sync check: {total} item(s) found" if total else "Deployment sync check: everything in sync"
@@ -187,9 +247,13 @@ def format_report(issues):
 
 
 def main():
-    issues = check()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--probe", action="store_true", help="Also probe every pilot hub's health and token")
+    args = parser.parse_args()
+
+    issues = check(probe=args.probe)
     report = format_report(issues)
-    total = sum(len(v) for v in issues.values())
+    total = issue_count(issues)
     print(report)
 
     (BASE_DIR / "sync_check_report.txt").write_text(report + "\n")
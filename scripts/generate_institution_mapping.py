@@ -1,6 +1,6 @@
 """Build/update config/institution_mapping.json.
 
-This is a one-off / occasional helper, not part of the nightly pipeline. It
+Runs nightly from the sync-check workflow (and can be run by hand). It
 proposes a mapping from CloudBank roster institutions (that have an ACCESS
 allocation number) to:
   - hub_url: the matching entry in pilots.json (so we know whose users to hash)
@@ -12,30 +12,40 @@ Anything without "reviewed": true in the output must be checked by a human
 before scripts/build_nsf_report.py is trusted to run unattended. Re-running
 this script preserves any entry already marked "reviewed": true.
 
+Match results are memoized in .cache/institution_matches.json under the
+fingerprints of what they depend on (the pilots.json names/URLs plus
+HUB_URL_OVERRIDES, and the IPEDS master plus NOT_IPEDS_ELIGIBLE). Only
+institutions without a cached result are re-matched; if either fingerprint
+changes, every institution is. The cache hit rate is printed.
+
 data/ipeds_unitid_master.json is a public-domain extract (institution name +
 state -> UnitID) from NCES IPEDS, sourced via the `unitids` PyPI package's
-bundled reference table.
+bundled reference table. It is read through the memory-mapped artifact that
+scripts/ipeds_lookup.py compiles from it (recompiled when the JSON changes).
+Some names (149) belong to institutions in more than one state, so entries are
+keyed by (name, state). Names are fuzzy-matched, and the state then picks the
+institution: the roster's State column when it has one, otherwise the only
+state the name is in. A name in several states with no roster state to choose
+between them is left unmatched, with a note, for a human to resolve.
 
 Usage:
     python scripts/generate_institution_mapping.py
 """
 
-import difflib
+import hashlib
 import json
-import re
 from pathlib import Path
 
-import pandas as pd
+import ipeds_lookup
+import roster
+from name_matching import TrigramIndex
 
 BASE_DIR = Path(__file__).parent.parent
-SHEET_CSV_URL = (
-    "https://docs.google.com/spreadsheets/d/"
-    "1pYQTs-zFvbvBl9FdMIjCUKRv9_O5vGvfdRgNgyBy9-0/export?format=csv&gid=352213565"
-)
-ACCESS_ID_PATTERN = re.compile(r"^[A-Z]{2,6}\d{6}$")
 MAPPING_PATH = BASE_DIR / "config" / "institution_mapping.json"
 IPEDS_MASTER_PATH = BASE_DIR / "data" / "ipeds_unitid_master.json"
 PILOTS_PATH = BASE_DIR / "pilots.json"
+MATCH_CACHE_PATH = BASE_DIR / ".cache" / "institution_matches.json"
+MATCH_CACHE_VERSION = 2  # bump when the matching logic changes
 
 # Hand-verified corrections where automated name matching gets it wrong or
 # the sheet/pilots.json names diverge too much to match automatically.
@@ -64,62 +74,153 @@ NOT_IPEDS_ELIGIBLE = {"Albany High"}
 
 
 def fetch_qualifying_institutions():
-    df = pd.read_csv(SHEET_CSV_URL)
-    df["Notes"] = df["Notes"].astype(str).str.strip()
-    qualifying = df[df["Notes"].str.match(ACCESS_ID_PATTERN, na=False)]
-    return qualifying[["Institution", "Notes"]].rename(
-        columns={"Institution": "sheet_institution", "Notes": "access_id"}
-    )
+    """[(sheet_institution, access_id)] in sheet order."""
+    return [(row.institution, row.access_id) for row in roster.load_roster() if row.access_id]
 
 
 def load_pilots():
     return json.loads(PILOTS_PATH.read_text())["pilots"]
 
 
-def match_hub_url(sheet_institution, pilots):
-    if sheet_institution in HUB_URL_OVERRIDES:
-        return HUB_URL_OVERRIDES[sheet_institution], 100
-    names = [p["name"] for p in pilots]
-    best = difflib.get_close_matches(sheet_institution, names, n=1, cutoff=0.6)
-    if not best:
-        return None, 0
-    matched_name = best[0]
-    score = round(difflib.SequenceMatcher(None, sheet_institution, matched_name).ratio() * 100)
-    hub = next(p["url"] for p in pilots if p["name"] == matched_name)
-    return hub, score
-
-
-def match_ipeds_unitid(sheet_institution, ipeds_master):
-    """Matches against IPEDS (higher-ed only). K-12 schools need a manually-sourced
-    NCES CCD School ID instead — this function can't produce one, so entries in
-    NOT_IPEDS_ELIGIBLE are left for a human to fill in institutional_id/id_type."""
-    if sheet_institution in NOT_IPEDS_ELIGIBLE:
-        return None, 0, "not an IPEDS-eligible institution (K-12) — needs a manually-sourced NCES CCD School ID"
-    # Keys are "Name ST" (with a two-letter state suffix); strip it for name-only matching.
-    name_only_keys = {k[:-3]: k for k in ipeds_master if len(k) > 3 and k[-3] == " "}
-    best = difflib.get_close_matches(sheet_institution, list(name_only_keys.keys()), n=1, cutoff=0.6)
-    if not best:
-        return None, 0, "no confident IPEDS match"
-    matched_short = best[0]
-    full_key = name_only_keys[matched_short]
-    score = round(difflib.SequenceMatcher(None, sheet_institution, matched_short).ratio() * 100)
-    return str(ipeds_master[full_key]), score, f"matched against '{full_key}'"
+def match_hub_urls(sheet_institutions, pilots):
+    """[(hub_url, score)] for each institution, overrides first, then the closest
+    pilots.json name (difflib.get_close_matches, cutoff 0.6)."""
+    urls = {}
+    for p in pilots:
+        urls.setdefault(p["name"], p["url"])
+    pending = [name for name in sheet_institutions if name not in HUB_URL_OVERRIDES]
+    matches = dict(zip(pending, TrigramIndex(urls).close_matches(pending, cutoff=0.6)))
+    results = []
+    for name in sheet_institutions:
+        if name in HUB_URL_OVERRIDES:
+            results.append((HUB_URL_OVERRIDES[name], 100))
+            continue
+        matched_name, score = matches[name]
+        results.append((urls[matched_name], score) if matched_name is not None else (None, 0))
+    return results
+
+
+def build_ipeds_index(ipeds_master):
+    """(keys, TrigramIndex) over IPEDS names, where keys is {(name, state):
+    "Name ST" master key}. Built once per run rather than once per institution."""
+    # Keys are "Name ST" (with a two-letter state suffix); the name is matched on its own.
+    keys = {(k[:-3], k[-2:]): k for k in ipeds_master if len(k) > 3 and k[-3] == " "}
+    return keys, TrigramIndex(name for name, _ in keys)
+
+
+def match_ipeds_unitids(sheet_institutions, ipeds_master, ipeds_index=None, states=None):
+    """[(unitid, score, note)] for each institution, matched against IPEDS
+    (higher-ed only). K-12 schools need a manually-sourced NCES CCD School ID
+    instead — this can't produce one, so entries in NOT_IPEDS_ELIGIBLE are left
+    for a human to fill in institutional_id/id_type.
+
+    Names are matched the same as difflib.get_close_matches(n=1, cutoff=0.6)
+    over the IPEDS names; pass a build_ipeds_index() result to reuse the index.
+    The (name, state) key is then the one in states[institution] (the roster's
+    state), or the name's only state. A name in several states without a roster
+    state among them is left unmatched."""
+    keys, index = ipeds_index or build_ipeds_index(ipeds_master)
+    states = states or {}
+    keys_by_name = {}
+    for (ipeds_name, state), key in keys.items():
+        keys_by_name.setdefault(ipeds_name, {})[state] = key
+    pending = [name for name in sheet_institutions if name not in NOT_IPEDS_ELIGIBLE]
+    matches = dict(zip(pending, index.close_matches(pending, cutoff=0.6)))
+    results = []
+    for name in sheet_institutions:
+        if name in NOT_IPEDS_ELIGIBLE:
+            results.append((None, 0, "not an IPEDS-eligible institution (K-12) — needs a manually-sourced NCES CCD School ID"))
+            continue
+        matched_name, score = matches[name]
+        if matched_name is None:
+            results.append((None, 0, "no confident IPEDS match"))
+            continue
+        by_state = keys_by_name[matched_name]
+        state = states.get(name)
+        if state in by_state:
+            full_key = by_state[state]
+        elif len(by_state) == 1:
+            full_key = next(iter(by_state.values()))
+        else:
+            given = f"the roster gives {state}" if state else "the roster gives no state"
+            results.append((None, score, (
+                f"'{matched_name}' is in IPEDS for {', '.join(sorted(by_state))} and {given} — "
+                f"add the State to the roster or pick the UnitID by hand"
+            )))
+            continue
+        results.append((str(ipeds_master[full_key]), score, f"matched against '{full_key}'"))
+    return results
+
+
+def pilots_fingerprint(pilots):
+    """Hash of what match_hub_urls depends on: pilots.json names and URLs in file
+    order (not tokens, which rotate) and the overrides."""
+    pairs = [[p["name"], p["url"]] for p in pilots]
+    return hashlib.sha256(json.dumps([pairs, HUB_URL_OVERRIDES], sort_keys=True).encode()).hexdigest()
+
+
+def ipeds_fingerprint(ipeds_master):
+    """Hash of what match_ipeds_unitids depends on: the IPEDS master's source
+    JSON and the not-eligible list."""
+    payload = json.dumps([ipeds_master.source_digest.hex(), sorted(NOT_IPEDS_ELIGIBLE)])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load_match_cache(pilots_fp, ipeds_fp):
+    """{sheet_institution: {"hub": [...], "ipeds": [...]}} cached under these
+    fingerprints, or {} if there is no cache or it was built against other inputs."""
+    if not MATCH_CACHE_PATH.exists():
+        return {}
+    try:
+        cached = json.loads(MATCH_CACHE_PATH.read_text())
+    except ValueError:
+        return {}
+    if (cached.get("version"), cached.get("pilots"), cached.get("ipeds")) != (MATCH_CACHE_VERSION, pilots_fp, ipeds_fp):
+        return {}
+    return cached["matches"]
+
+
+def save_match_cache(pilots_fp, ipeds_fp, matches):
+    MATCH_CACHE_PATH.parent.mkdir(exist_ok=True)
+    MATCH_CACHE_PATH.write_text(json.dumps(
+        {"version": MATCH_CACHE_VERSION, "pilots": pilots_fp, "ipeds": ipeds_fp, "matches": matches}
+    ) + "\n")
 
 
 def main():
     qualifying = fetch_qualifying_institutions()
     pilots = load_pilots()
-    ipeds_master = json.loads(IPEDS_MASTER_PATH.read_text())
+    ipeds_master = ipeds_lookup.open_lookup(IPEDS_MASTER_PATH)
 
     existing = {}
     if MAPPING_PATH.exists():
         for entry in json.loads(MAPPING_PATH.read_text()):
             existing[entry["sheet_institution"]] = entry
 
+    pending = [
+        name for name, _ in qualifying
+        if not (existing.get(name) and existing[name].get("reviewed"))
+    ]
+    pilots_fp, ipeds_fp = pilots_fingerprint(pilots), ipeds_fingerprint(ipeds_master)
+    cache = load_match_cache(pilots_fp, ipeds_fp)
+    states = roster.institution_states()
+    # A cached match was made with the roster state it was given; re-match if that changed
+    stale = [
+        name for name in dict.fromkeys(pending)
+        if name not in cache or cache[name].get("state") != states.get(name)
+    ]
+    if stale:
+        for name, hub, ipeds in zip(
+            stale, match_hub_urls(stale, pilots), match_ipeds_unitids(stale, ipeds_master, states=states)
+        ):
+            cache[name] = {"hub": list(hub), "ipeds": list(ipeds), "state": states.get(name)}
+    save_match_cache(pilots_fp, ipeds_fp, {name: cache[name] for name in pending})
+    hub_matches = {name: tuple(cache[name]["hub"]) for name in pending}
+    ipeds_matches = {name: tuple(cache[name]["ipeds"]) for name in pending}
+    distinct = len(set(pending))
+
     output = []
-    for _, row in qualifying.iterrows():
-        name = row["sheet_institution"]
-        access_id = row["access_id"]
+    for name, access_id in qualifying:
 
         prior = existing.get(name)
         if prior and prior.get("reviewed"):
@@ -127,8 +228,8 @@ def main():
             output.append(prior)
             continue
 
-        hub_url, hub_score = match_hub_url(name, pilots)
-        institutional_id, ipeds_score, ipeds_note = match_ipeds_unitid(name, ipeds_master)
+        hub_url, hub_score = hub_matches[name]
+        institutional_id, ipeds_score, ipeds_note = ipeds_matches[name]
         id_type = "ipeds_unitid" if institutional_id is not None else None
 
         notes = []
@@ -158,6 +259,8 @@ def main():
     MAPPING_PATH.write_text(json.dumps(output, indent=2) + "\n")
     unresolved = [e for e in output if not e["reviewed"]]
     print(f"Wrote {MAPPING_PATH} ({len(output)} institutions, {len(unresolved)} need review)")
+    hit_rate = f"{(distinct - len(stale)) / distinct:.0%}" if distinct else "n/a"
+    print(f"Match cache: {distinct - len(stale)}/{distinct} hits ({hit_rate}), {len(stale)} re-matched")
 
 
 if __name__ == "__main__":
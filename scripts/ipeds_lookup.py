@@ -0,0 +1,152 @@
+"""ipeds_lookup.py
+
+Compiled, memory-mapped view of data/ipeds_unitid_master.json ("Name ST" ->
+UnitID), so scripts don't json.loads ~9k entries into a dict just to look a
+few of them up.
+
+The artifact (.cache/ipeds_unitid_master.bin, git-ignored) holds the keys sorted
+by their UTF-8 bytes, an offset table into the key blob, and the UnitIDs as
+little-endian uint32s. Exact lookups binary-search the mapped offset table, so
+only the pages they touch are ever read. The artifact records the size and
+modification time of the JSON it was compiled from, so checking that it is
+current is a stat() call, and it is recompiled whenever either differs. It also
+records the JSON's SHA-256 (source_digest), for callers that fingerprint it.
+
+Usage:
+    python scripts/ipeds_lookup.py    # (re)compile the artifact
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+IPEDS_MASTER_PATH = BASE_DIR / "data" / "ipeds_unitid_master.json"
+ARTIFACT_PATH = BASE_DIR / ".cache" / "ipeds_unitid_master.bin"
+
+MAGIC = b"IPEDSv2\0"
+HEADER = struct.Struct("<8s32sqqI")  # magic, source SHA-256, source size, source mtime_ns, entry count
+
+
+def _uint32s(view):
+    """The little-endian uint32s in view: the view itself, cast, on little-endian
+    machines, and a byte-swapped copy elsewhere."""
+    if sys.byteorder == "little":
+        return view.cast("I")
+    values = array("I")
+    values.frombytes(view)
+    values.byteswap()
+    return values
+
+
+def compile_artifact(source=IPEDS_MASTER_PATH, artifact=ARTIFACT_PATH):
+    """Compiles the JSON master into the binary artifact (written atomically)."""
+    stat = os.stat(source)
+    raw = Path(source).read_bytes()
+    entries = sorted((key.encode(), unitid) for key, unitid in json.loads(raw).items())
+    offsets, position = [], 0
+    for key, _ in entries:
+        offsets.append(position)
+        position += len(key)
+    offsets.append(position)
+
+    artifact = Path(artifact)
+    artifact.parent.mkdir(exist_ok=True)
+    tmp = artifact.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, hashlib.sha256(raw).digest(), stat.st_size, stat.st_mtime_ns, len(entries)))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(struct.pack(f"<{len(entries)}I", *(unitid for _, unitid in entries)))
+        f.write(b"".join(key for key, _ in entries))
+    os.replace(tmp, artifact)
+
+
+class IpedsLookup(Mapping):
+    """Read-only {"Name ST": unitid} mapping backed by the mapped artifact.
+    Iteration yields keys in sorted (UTF-8 byte) order."""
+
+    def __init__(self, artifact=ARTIFACT_PATH):
+        with open(artifact, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            self.close()
+            raise ValueError(f"{artifact} is truncated")
+        magic, self.source_digest, self.source_size, self.source_mtime_ns, count = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{artifact} is not an IPEDS lookup artifact")
+        view = memoryview(self._mmap)
+        start = HEADER.size
+        self._count = count
+        self._offsets = _uint32s(view[start:start + 4 * (count + 1)])
+        start += 4 * (count + 1)
+        self._unitids = _uint32s(view[start:start + 4 * count])
+        self._names_start = start + 4 * count
+        view.release()
+
+    def close(self):
+        for name in ("_offsets", "_unitids"):
+            view = self.__dict__.pop(name, None)
+            if isinstance(view, memoryview):
+                view.release()
+        self._mmap.close()
+
+    def _key_bytes(self, i):
+        return self._mmap[self._names_start + self._offsets[i]:self._names_start + self._offsets[i + 1]]
+
+    def _find(self, key):
+        target = key.encode()
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._key_bytes(lo) == target:
+            return lo
+        return None
+
+    def __getitem__(self, key):
+        i = self._find(key) if isinstance(key, str) else None
+        if i is None:
+            raise KeyError(key)
+        return self._unitids[i]
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self._find(key) is not None
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._key_bytes(i).decode()
+
+    def __len__(self):
+        return self._count
+
+
+def open_lookup(source=IPEDS_MASTER_PATH, artifact=ARTIFACT_PATH):
+    """Opens the artifact, recompiling it first if it is missing, unreadable, or
+    was compiled from a JSON master of a different size or modification time."""
+    stat = os.stat(source)
+    try:
+        lookup = IpedsLookup(artifact)
+    except (OSError, ValueError):
+        lookup = None
+    if lookup is not None and (lookup.source_size, lookup.source_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+        return lookup
+    if lookup is not None:
+        lookup.close()
+    compile_artifact(source, artifact)
+    return IpedsLookup(artifact)
+
+
+if __name__ == "__main__":
+    compile_artifact()
+    lookup = IpedsLookup()
+    print(f"Compiled {ARTIFACT_PATH} ({len(lookup)} institutions, {ARTIFACT_PATH.stat().st_size} bytes)")
@@ -0,0 +1,145 @@
+"""name_matching.py
+
+Fast drop-in replacement for difflib.get_close_matches(word, names, n=1, cutoff)
+over a large, fixed list of names (e.g. the ~9k IPEDS institution names).
+
+TrigramIndex keeps a character-trigram inverted index over the names, plus
+each name's character counts. For each query it first scores the few names
+sharing the most trigrams with it, which almost always contains the winner.
+It then computes difflib's quick_ratio() upper bound for every name at once
+from the character counts, using the same arithmetic as difflib. Only names
+whose bound can still beat the best score so far get a full
+SequenceMatcher.ratio(), in descending bound order, stopping as soon as no
+bound can. The query is always difflib's seq2 and ties are broken by name, as
+in get_close_matches, so the result is identical.
+
+TrigramIndex.close_matches() is the batch entry point shared by
+generate_institution_mapping.py and check_deployment_sync.py: it matches each
+distinct query once, scores the winner the way those scripts always have
+(round(SequenceMatcher(None, query, match).ratio() * 100)), and spreads batches
+of PROCESS_POOL_THRESHOLD or more distinct queries over a process pool.
+"""
+
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+
+import numpy as np
+
+SHORTLIST_SIZE = 16
+PROCESS_POOL_THRESHOLD = 200
+CHUNK_SIZE = 50
+
+
+def score(query, match):
+    """0-100 similarity reported alongside a match. Note the argument order:
+    get_close_matches ranks with the query as seq2, this scores it as seq1."""
+    return round(SequenceMatcher(None, query, match).ratio() * 100)
+
+
+def trigrams(text):
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(names))
+        self._postings = defaultdict(list)
+        for i, name in enumerate(self.names):
+            for gram in trigrams(name):
+                self._postings[gram].append(i)
+        self._alphabet = {ch: j for j, ch in enumerate(sorted({ch for name in self.names for ch in name}))}
+        self._char_counts = np.zeros((len(self.names), len(self._alphabet)), dtype=np.int32)
+        for i, name in enumerate(self.names):
+            for ch, count in Counter(name).items():
+                self._char_counts[i, self._alphabet[ch]] = count
+        self._lengths = np.array([len(name) for name in self.names], dtype=np.int64)
+
+    def quick_ratios(self, word):
+        """SequenceMatcher(None, name, word).quick_ratio() for every name, as an array."""
+        wanted = np.zeros(len(self._alphabet), dtype=np.int32)
+        for ch, count in Counter(word).items():
+            j = self._alphabet.get(ch)
+            if j is not None:
+                wanted[j] = count
+        matches = np.minimum(self._char_counts, wanted).sum(axis=1)
+        total = self._lengths + len(word)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(total > 0, 2.0 * matches / total, 1.0)
+
+    def best_match(self, word, cutoff=0.6):
+        """Returns (name, ratio) for the same name difflib.get_close_matches(word,
+        names, n=1, cutoff=cutoff) would return, or (None, 0) if none qualifies.
+        ratio is SequenceMatcher(None, name, word).ratio()."""
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        bounds = self.quick_ratios(word)
+        best = None  # (ratio, name), compared the way get_close_matches ranks them
+        scored = set()
+
+        def consider(i):
+            nonlocal best
+            scored.add(i)
+            name = self.names[i]
+            matcher.set_seq1(name)
+            ratio = matcher.ratio()
+            if ratio >= cutoff and (best is None or (ratio, name) > best):
+                best = (ratio, name)
+
+        # ratio() <= quick_ratio() <= real_quick_ratio(), so a name whose bound is
+        # below the best ratio found so far can neither win nor tie.
+        shared = Counter(i for gram in trigrams(word) for i in self._postings.get(gram, ()))
+        for i, _ in shared.most_common(SHORTLIST_SIZE):
+            if bounds[i] >= cutoff:
+                consider(i)
+
+        threshold = best[0] if best is not None else cutoff
+        candidates = np.flatnonzero(bounds >= threshold)
+        for i in candidates[np.argsort(-bounds[candidates], kind="stable")].tolist():
+            if bounds[i] < (best[0] if best is not None else cutoff):
+                break
+            if i not in scored:
+                consider(i)
+
+        if best is None:
+            return None, 0
+        return best[1], best[0]
+
+    def close_matches(self, queries, cutoff=0.6, processes=None):
+        """Returns [(name, score)] in query order: the best_match name (or None)
+        and its score() against the query (0 when there is no match)."""
+        queries = list(queries)
+        distinct = list(dict.fromkeys(queries))
+        if len(distinct) < PROCESS_POOL_THRESHOLD or (os.cpu_count() or 1) < 2:
+            results = _match_chunk(distinct, cutoff, self)
+        else:
+            chunks = [distinct[i:i + CHUNK_SIZE] for i in range(0, len(distinct), CHUNK_SIZE)]
+            with ProcessPoolExecutor(
+                max_workers=processes, initializer=_init_worker, initargs=(self,)
+            ) as executor:
+                results = [
+                    match
+                    for chunk in executor.map(_match_chunk, chunks, [cutoff] * len(chunks))
+                    for match in chunk
+                ]
+        by_query = dict(zip(distinct, results))
+        return [by_query[query] for query in queries]
+
+
+_worker_index = None
+
+
+def _init_worker(index):
+    global _worker_index
+    _worker_index = index
+
+
+def _match_chunk(queries, cutoff, index=None):
+    index = index or _worker_index
+    matches = []
+    for query in queries:
+        name, _ = index.best_match(query, cutoff)
+        matches.append((name, score(query, name) if name is not None else 0))
+    return matches
@@ -0,0 +1,122 @@
+"""roster.py
+
+Shared loader for the CloudBank roster Google Sheet, used by
+build_nsf_report.py, check_deployment_sync.py and generate_institution_mapping.py.
+
+The sheet's CSV export is cached on disk under .cache/. Within ROSTER_TTL_SECONDS
+of the last fetch the cached copy is used as-is; after that the sheet is
+revalidated with If-None-Match / If-Modified-Since, and only re-downloaded if
+it actually changed. A nightly workflow that runs several of these scripts
+therefore downloads the sheet at most once. Within one process it is parsed once.
+
+Set ROSTER_TTL_SECONDS=0 to always revalidate.
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import requests
+
+BASE_DIR = Path(__file__).parent.parent
+SHEET_CSV_URL = (
+    "https://docs.google.com/spreadsheets/d/"
+    "1pYQTs-zFvbvBl9FdMIjCUKRv9_O5vGvfdRgNgyBy9-0/export?format=csv&gid=352213565"
+)
+ACCESS_ID_PATTERN = re.compile(r"^[A-Z]{2,6}\d{6}$")
+CACHE_DIR = BASE_DIR / ".cache"
+CACHE_CSV = CACHE_DIR / "roster.csv"
+CACHE_META = CACHE_DIR / "roster.meta.json"
+ROSTER_TTL_SECONDS = int(os.environ.get("ROSTER_TTL_SECONDS", 3600))
+
+
+STATE_PATTERN = re.compile(r"^[A-Z]{2}$")
+
+
+class RosterRow(NamedTuple):
+    institution: str
+    notes: str
+    access_id: Optional[str]  # notes, when they hold a current ACCESS allocation number
+    state: Optional[str] = None  # two-letter postal code, if the sheet has a State column filled in
+
+
+def _read_cache_meta():
+    if not (CACHE_META.exists() and CACHE_CSV.exists()):
+        return None
+    try:
+        return json.loads(CACHE_META.read_text())
+    except ValueError:
+        return None
+
+
+def fetch_sheet_csv(ttl=None):
+    """Returns the sheet's CSV text, from the on-disk cache when it is fresh or
+    the server confirms it hasn't changed."""
+    ttl = ROSTER_TTL_SECONDS if ttl is None else ttl
+    meta = _read_cache_meta()
+    if meta is not None and time.time() - meta["fetched_at"] < ttl:
+        return CACHE_CSV.read_text()
+
+    headers = {}
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    response = requests.get(SHEET_CSV_URL, headers=headers, timeout=60)
+    if response.status_code == 304 and meta is not None:
+        text = CACHE_CSV.read_text()
+    else:
+        response.raise_for_status()
+        text = response.content.decode("utf-8-sig")
+        CACHE_DIR.mkdir(exist_ok=True)
+        CACHE_CSV.write_text(text)
+        meta = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+    meta["fetched_at"] = time.time()
+    CACHE_META.write_text(json.dumps(meta) + "\n")
+    return text
+
+
+@lru_cache(maxsize=None)
+def load_roster():
+    """Parses the roster once per process into RosterRow tuples (rows without an
+    institution name are dropped)."""
+    rows = []
+    for record in csv.DictReader(io.StringIO(fetch_sheet_csv())):
+        institution = record.get("Institution") or ""
+        if not institution:
+            continue
+        notes = (record.get("Notes") or "").strip()
+        access_id = notes if ACCESS_ID_PATTERN.match(notes) else None
+        state = (record.get("State") or "").strip().upper()
+        rows.append(RosterRow(institution, notes, access_id, state if STATE_PATTERN.match(state) else None))
+    return tuple(rows)
+
+
+def qualifying_access_ids():
+    """{institution: access_id} for rows with a current ACCESS allocation."""
+    return {row.institution: row.access_id for row in load_roster() if row.access_id}
+
+
+def institution_states():
+    """{institution: two-letter state} for rows that give one."""
+    return {row.institution: row.state for row in load_roster() if row.state}
+
+
+def cloudbank_institutions():
+    """{institution: access_id_or_None}, excluding rows explicitly marked icor
+    (those are a separate project, not CloudBank/cloudbank-cluster scope)."""
+    return {
+        row.institution: row.access_id
+        for row in load_roster()
+        if row.notes.lower() != "icor"
+    }
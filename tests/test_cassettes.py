@@ -0,0 +1,123 @@
+"""Recording a users.main crawl against a local stand-in hub into a cassette
+(cassettes.record), and replaying it (cassettes.replay) with the network
+disabled."""
+
+import gzip
+import json
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import cassettes  # noqa: E402
+import users  # noqa: E402
+
+TOKEN = "secret-hub-token"
+NAMES = ["ada.lovelace@alpha.edu", "grace.hopper@alpha.edu", "alan.turing@alpha.edu", "katherine.johnson@alpha.edu"]
+SERVICE_ACCOUNT = "service-hub-alpha"
+
+
+class StandInHub:
+    """Serves NAMES and a service account from /hub/api/users as a plain list,
+    at most two users per page, to requests carrying TOKEN."""
+
+    def __init__(self):
+        models = [
+            {
+                "name": name,
+                "admin": False,
+                "roles": ["user"],
+                "last_activity": "2026-01-05T12:00:00Z",
+                "servers": {"": {"name": "", "url": f"/user/{name}/", "last_activity": "2026-01-05T12:00:00Z"}},
+            }
+            for name in NAMES + [SERVICE_ACCOUNT]
+        ]
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.headers.get("Authorization") != f"token {TOKEN}":
+                    status, body = 403, {"status": 403}
+                else:
+                    query = parse_qs(urlsplit(self.path).query)
+                    offset = int(query["offset"][0])
+                    status, body = 200, models[offset:offset + min(int(query["limit"][0]), 2)]
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.api_url = f"http://127.0.0.1:{self.server.server_address[1]}/hub/api"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def recorded(tmp_path, monkeypatch):
+    """Records the users target against a StandInHub. Returns the cassette
+    path; the stand-in is shut down before the test body runs."""
+    stand_in = StandInHub()
+    monkeypatch.setattr(users, "hub_api_url", lambda url, where: stand_in.api_url)
+    monkeypatch.setattr(users, "PAGE_SIZES_PATH", tmp_path / "hub_page_sizes.json")
+    monkeypatch.delenv("NSF_HASH_KEY", raising=False)
+    monkeypatch.chdir(tmp_path)
+    pilot = {"url": "alpha", "where": "cloudbank", "name": "Alpha College", "token": TOKEN}
+    (tmp_path / "pilots.json").write_text(json.dumps({"pilots": [pilot]}))
+
+    path = tmp_path / "users.json.gz"
+    try:
+        cassette = cassettes.record("users", path)
+    finally:
+        stand_in.server.shutdown()
+        stand_in.server.server_close()
+    assert cassette["summary"]["successful_pilots"] == 1
+    return path
+
+
+def test_cassette_holds_no_usernames_or_tokens(recorded):
+    with gzip.open(recorded, "rb") as f:
+        raw = f.read().decode()
+    for name in NAMES:
+        assert name not in raw
+    assert TOKEN not in raw
+    # The service account keeps its name, so replay still filters it out
+    assert SERVICE_ACCOUNT in raw
+
+    cassette = cassettes.load_cassette(recorded)
+    assert len(cassette["interactions"]) == 4  # three pages and the empty one after them
+    assert all("token" not in pilot for pilot in cassette["pilots"])
+    first_page = json.loads(cassette["interactions"][0]["body"])
+    # Names in server URLs are replaced by the same pseudonyms
+    assert first_page[0]["servers"][""]["url"] == f"/user/{first_page[0]['name']}/"
+
+
+def test_replay_without_the_network(recorded, monkeypatch):
+    def no_network(*args):
+        raise OSError("network disabled in this test")
+
+    monkeypatch.setattr(socket.socket, "connect", no_network)
+    cassette = cassettes.load_cassette(recorded)
+    result = cassettes.replay(cassette, speed=0)
+    assert result["misses"] == []
+    assert result["replayed"] == len(cassette["interactions"])
+    assert result["summary"] == cassette["summary"]
+
+
+def test_replay_reports_requests_missing_from_the_cassette(recorded, monkeypatch):
+    monkeypatch.setattr(socket.socket, "connect", lambda *args: pytest.fail("replay reached the network"))
+    cassette = cassettes.load_cassette(recorded)
+    cassette["interactions"] = cassette["interactions"][:1]
+    result = cassettes.replay(cassette, speed=0)
+    assert result["misses"]
+    assert result["summary"]["failed_pilots"] == 1
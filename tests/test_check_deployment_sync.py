@@ -0,0 +1,123 @@
+"""The cached cluster.yaml fetch in scripts/check_deployment_sync.py, with
+GH_CLI pointed at a fake `gh` executable serving the contents listing and
+git/blobs responses from a JSON file."""
+
+import base64
+import importlib
+import json
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR / "scripts"))
+
+import check_deployment_sync  # noqa: E402
+
+FAKE_GH = """\
+import json, sys
+from pathlib import Path
+
+here = Path(__file__).parent
+endpoint = sys.argv[2]
+with open(here / "calls.log", "a") as log:
+    log.write(endpoint + "\\n")
+responses = json.loads((here / "responses.json").read_text())
+if endpoint not in responses:
+    sys.exit(f"gh: Not Found (HTTP 404): {endpoint}")
+print(json.dumps(responses[endpoint]))
+"""
+
+LISTING = f"repos/{check_deployment_sync.INFRA_REPO}/contents/config/clusters/cloudbank"
+
+
+def cluster_yaml(hubs):
+    return yaml.safe_dump({"hubs": [{"name": slug, "display_name": name} for slug, name in hubs.items()]})
+
+
+class FakeGh:
+    """A `gh` executable answering `gh api <endpoint>` from responses.json,
+    and logging every endpoint it was asked for."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = directory / "gh"
+        self.path.write_text(f"#!{sys.executable}\n" + FAKE_GH)
+        self.path.chmod(0o755)
+        self.serve("sha-1", {})
+
+    def serve(self, sha, hubs):
+        """Lists cluster.yaml with blob sha, whose content declares hubs."""
+        content = base64.b64encode(cluster_yaml(hubs).encode()).decode()
+        responses = {
+            LISTING: [{"name": "support.values.yaml", "sha": "other"}, {"name": "cluster.yaml", "sha": sha}],
+            f"repos/{check_deployment_sync.INFRA_REPO}/git/blobs/{sha}": {"content": content, "encoding": "base64"},
+        }
+        (self.directory / "responses.json").write_text(json.dumps(responses))
+
+    def calls(self):
+        log = self.directory / "calls.log"
+        calls = log.read_text().splitlines() if log.exists() else []
+        log.unlink(missing_ok=True)
+        return calls
+
+
+@pytest.fixture
+def sync_check(tmp_path, monkeypatch):
+    """check_deployment_sync with the fake gh and a fresh cache."""
+    gh = FakeGh(tmp_path)
+    monkeypatch.setattr(check_deployment_sync, "GH_CLI", str(gh.path))
+    monkeypatch.setattr(check_deployment_sync, "INFRA_CACHE_PATH", tmp_path / ".cache" / "infra_cluster.json")
+    return check_deployment_sync, gh
+
+
+def test_unchanged_blob_sha_is_a_cache_hit(sync_check):
+    module, gh = sync_check
+    gh.serve("sha-1", {"alpha": "Alpha College", "staging": "Staging"})
+    assert module.fetch_infra_hubs() == {"alpha": "Alpha College"}
+    assert gh.calls() == [LISTING, f"repos/{module.INFRA_REPO}/git/blobs/sha-1"]
+
+    assert module.fetch_infra_hubs() == {"alpha": "Alpha College"}
+    assert gh.calls() == [LISTING]
+
+
+def test_changed_blob_sha_is_a_cache_miss(sync_check):
+    module, gh = sync_check
+    gh.serve("sha-1", {"alpha": "Alpha College"})
+    module.fetch_infra_hubs()
+    gh.calls()
+
+    gh.serve("sha-2", {"alpha": "Alpha College", "beta": "Beta University"})
+    assert module.fetch_infra_hubs() == {"alpha": "Alpha College", "beta": "Beta University"}
+    assert gh.calls() == [LISTING, f"repos/{module.INFRA_REPO}/git/blobs/sha-2"]
+    assert json.loads(module.INFRA_CACHE_PATH.read_text())["sha"] == "sha-2"
+
+
+def test_falls_back_to_the_pure_python_loader(sync_check, monkeypatch):
+    _, gh = sync_check
+    monkeypatch.delattr(yaml, "CSafeLoader", raising=False)
+    try:
+        module = importlib.reload(check_deployment_sync)
+        assert module.SafeLoader is yaml.SafeLoader
+        monkeypatch.setattr(module, "GH_CLI", str(gh.path))
+        monkeypatch.setattr(module, "INFRA_CACHE_PATH", gh.directory / ".cache" / "infra_cluster.json")
+        gh.serve("sha-1", {"alpha": "Alpha College"})
+        assert module.fetch_infra_hubs() == {"alpha": "Alpha College"}
+    finally:
+        monkeypatch.undo()
+        importlib.reload(check_deployment_sync)
+
+
+def test_slow_hubs_are_reported_but_not_counted():
+    issues = {key: [] for key in ("deployed_but_no_token", "token_but_not_deployed", "deployed_no_access_id",
+                                  "needs_review", "unreachable", "unauthorized", "slow")}
+    issues["slow"].append("Alpha College (alpha) — answered in 2.4 s")
+    assert check_deployment_sync.issue_count(issues) == 0
+    report = check_deployment_sync.format_report(issues)
+    assert report.startswith("Deployment sync check: everything in sync")
+    assert "Alpha College (alpha)" in report
+
+    issues["unauthorized"].append("Beta University (beta) — HTTP 403")
+    assert check_deployment_sync.issue_count(issues) == 1
@@ -0,0 +1,45 @@
+"""Change-encoded counts and activity queries in history.py."""
+
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import history  # noqa: E402
+
+COLUMNS = ["college", "where", "all-users", "all-users-ever-active", "active-7d", "active-30d", "active-90d",
+           "fall_2025", "spring_2026"]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = history.connect(str(tmp_path / "history.sqlite"))
+    yield conn
+    conn.close()
+
+
+def row(spring, rolling, hub="Alpha College"):
+    return [hub, "cloudbank", 120, 100, *rolling, 80, spring]
+
+
+def test_rolling_counts_alone_do_not_move_last_active(conn):
+    history.append_run(conn, date(2026, 3, 1), COLUMNS, [row(40, (12, 30, 55))])
+    history.append_run(conn, date(2026, 3, 2), COLUMNS, [row(41, (9, 31, 56))])
+    # Only the rolling windows slide from here on, down to nobody active
+    for day, rolling in ((3, (4, 29, 56)), (4, (0, 20, 50)), (5, (0, 0, 41))):
+        assert history.append_run(conn, date(2026, 3, day), COLUMNS, [row(41, rolling)]) == 0
+
+    assert history.last_active(conn, "Alpha College", "cloudbank") == date(2026, 3, 2)
+    assert history.last_seen(conn, "Alpha College", "cloudbank") == date(2026, 3, 5)
+    terms = {term for (term,) in conn.execute("SELECT DISTINCT term FROM counts")}
+    assert terms == {"all-users", "all-users-ever-active", "fall_2025", "spring_2026"}
+
+
+def test_absent_hub_reads_as_missing(conn):
+    history.append_run(conn, date(2026, 3, 1), COLUMNS, [row(40, (1, 2, 3)), row(7, (1, 2, 3), hub="Beta")])
+    history.append_run(conn, date(2026, 3, 2), COLUMNS, [row(40, (1, 2, 3))])
+    assert history.hub_trend(conn, "Beta", "cloudbank", "spring_2026") == [("2026-03-01", 7), ("2026-03-02", None)]
@@ -0,0 +1,144 @@
+"""Probes and /users crawls against a stand-in hub that redirects its API,
+as real hubs redirect the http:// API URLs to https, with both the
+blocking (hub_probe, users) and the async (async_pipeline) clients."""
+
+import asyncio
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import hub_probe  # noqa: E402
+import users  # noqa: E402
+
+GOOD_TOKEN = "good-token"
+
+
+class RedirectingHub:
+    """Answers every request under /hub/api with a 301 to the same path under
+    /moved/hub/api, where the API lives. With html_root, the API root is an
+    HTML page instead of JupyterHub's JSON."""
+
+    def __init__(self, count=30, html_root=False):
+        names = [f"user{i:03d}" for i in range(count)]
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body=b"", content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if not self.path.startswith("/moved/"):
+                    self.send_response(301)
+                    self.send_header("Location", "/moved" + self.path)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                path = self.path[len("/moved/hub/api"):]
+                if path == "/":
+                    if html_root:
+                        self.reply(200, b"<html>Service Unavailable</html>", "text/html")
+                    else:
+                        self.reply(200, json.dumps({"version": "5.2.1"}).encode())
+                elif self.headers.get("Authorization") != f"token {GOOD_TOKEN}":
+                    self.reply(403, b'{"status": 403}')
+                elif path == "/user":
+                    self.reply(200, json.dumps({"name": "service"}).encode())
+                elif path.startswith("/users"):
+                    items = [
+                        {"name": name, "admin": False, "roles": ["user"], "last_activity": "2026-01-05T12:00:00Z"}
+                        for name in names
+                    ]
+                    offset = int(path.split("offset=")[1])
+                    self.reply(200, json.dumps(items[offset:]).encode())
+                else:
+                    self.reply(404)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.api_url = f"http://127.0.0.1:{self.server.server_address[1]}/hub/api"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    started = []
+
+    def start(**kwargs):
+        stand_in = RedirectingHub(**kwargs)
+        started.append(stand_in)
+        monkeypatch.setattr(hub_probe, "hub_api_url", lambda url, where: stand_in.api_url)
+        monkeypatch.setattr(users, "hub_api_url", lambda url, where: stand_in.api_url)
+        return stand_in
+
+    monkeypatch.setattr(hub_probe, "PROBE_RETRY_DELAY", 0)
+    yield start
+    for stand_in in started:
+        stand_in.server.shutdown()
+
+
+def pilot(token):
+    return {"url": "stand-in", "where": "cloudbank", "name": "Stand-in", "token": token}
+
+
+@pytest.fixture
+def async_pipeline():
+    pytest.importorskip("httpx")
+    pytest.importorskip("firebase_admin")  # async_pipeline imports otter_standalone_use
+    import async_pipeline
+
+    return async_pipeline
+
+
+def run_async(async_pipeline, make_coroutine):
+    """Runs make_coroutine(client, budget) on a client set up as async_pipeline.collect's."""
+    async def main():
+        async with async_pipeline.httpx.AsyncClient(**async_pipeline.client_options(4)) as client:
+            return await make_coroutine(client, asyncio.Semaphore(4))
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("token, verdict", [(GOOD_TOKEN, "ok"), ("expired", "unauthorized")])
+@pytest.mark.parametrize("html_root", [False, True])
+def test_blocking_probe_follows_redirects(hub, token, verdict, html_root):
+    hub(html_root=html_root)
+    result = hub_probe.probe_pilot(pilot(token))
+    assert result.api_status == 200
+    assert result.verdict == verdict
+
+
+@pytest.mark.parametrize("token, verdict", [(GOOD_TOKEN, "ok"), ("expired", "unauthorized")])
+@pytest.mark.parametrize("html_root", [False, True])
+def test_async_probe_follows_redirects(hub, async_pipeline, token, verdict, html_root):
+    hub(html_root=html_root)
+    result = run_async(async_pipeline, lambda client, budget: async_pipeline.probe_pilot(client, budget, pilot(token)))
+    assert result.api_status == 200
+    assert result.verdict == verdict
+
+
+def test_async_crawl_follows_redirects(hub, async_pipeline):
+    hub(count=30)
+    dates = users.generate_dates(2025, 2025)
+    as_of = datetime(2026, 1, 10)
+    blocking, _, _ = users.process_pilot(pilot(GOOD_TOKEN), dates, as_of=as_of)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        stats, transfer, _ = run_async(async_pipeline, lambda client, budget: async_pipeline.crawl_pilot(
+            client, budget, pilot(GOOD_TOKEN), dates, None, as_of, pool
+        ))
+    assert transfer["users"] == 30
+    assert stats == blocking
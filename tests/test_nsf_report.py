@@ -0,0 +1,154 @@
+"""Delta submission and spooling in scripts/build_nsf_report.py, against a
+local stand-in for the XDMoD resource-manager-logs endpoint."""
+
+import json
+import sys
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR / "scripts"))
+
+import build_nsf_report  # noqa: E402
+
+
+def record(user, last_activity="2026-01-05", institutional_id=110000):
+    return {
+        "access_id": "CIS000001",
+        "institutional_id": institutional_id,
+        "institution_name": "Test College",
+        "hashed_user_id": f"hash-{user}",
+        "last_activity_date": last_activity,
+    }
+
+
+class StandInXDMoD:
+    """Accepts multipart uploads like the real endpoint and keeps the records
+    of each; answers with status (200 unless changed)."""
+
+    def __init__(self):
+        self.uploads = []
+        self.status = 200
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                boundary = self.headers["Content-Type"].split("boundary=")[1].encode()
+                part = body.split(b"--" + boundary)[1]
+                payload = part.split(b"\r\n\r\n", 1)[1].rsplit(b"\r\n", 1)[0]
+                if stand_in.status == 200:
+                    stand_in.uploads.append(json.loads(payload))
+                self.send_response(stand_in.status)
+                self.end_headers()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/resource-manager-logs"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def sent(self):
+        return [r for upload in self.uploads for r in upload]
+
+
+@pytest.fixture
+def xdmod(tmp_path, monkeypatch):
+    stand_in = StandInXDMoD()
+    monkeypatch.setattr(build_nsf_report, "XDMOD_ENDPOINT", stand_in.url)
+    monkeypatch.setattr(build_nsf_report, "BASE_DIR", tmp_path)
+    monkeypatch.setattr(build_nsf_report, "LEDGER_PATH", tmp_path / "ledger.json")
+    monkeypatch.setattr(build_nsf_report, "SPOOL_DIR", tmp_path / "chunks")
+    monkeypatch.setattr(build_nsf_report.time, "sleep", lambda seconds: None)
+    monkeypatch.setenv("NSF_HASH_KEY", "test-key")
+    monkeypatch.setenv("XDMOD_TOKEN", "test-token")
+    monkeypatch.delenv("GITHUB_OUTPUT", raising=False)
+    monkeypatch.delenv("GITHUB_STEP_SUMMARY", raising=False)
+    yield stand_in
+    stand_in.server.shutdown()
+
+
+def run(monkeypatch, records, *args):
+    """build_nsf_report.main with build_report yielding records."""
+    def build_report(hmac_key, problems, warnings, timings):
+        yield from records
+
+    monkeypatch.setattr(build_nsf_report, "build_report", build_report)
+    monkeypatch.setattr(sys, "argv", ["build_nsf_report.py", *args])
+    build_nsf_report.main()
+
+
+def test_spool_chunks_streams_records_and_digests(tmp_path):
+    produced = []
+
+    def records():
+        for user in range(50):
+            produced.append(user)
+            yield record(user)
+
+    chunks = build_nsf_report.spool_chunks(records(), tmp_path, max_bytes=1000)
+    assert len(chunks) > 1
+    assert sum(chunk["count"] for chunk in chunks) == len(produced) == 50
+    digests = {}
+    for chunk in chunks:
+        assert "digests" not in chunk
+        digests.update(build_nsf_report.read_digests(chunk["digests_path"]))
+    assert digests == {f"hash-{u}": build_nsf_report.record_digest(record(u)) for u in range(50)}
+
+
+def test_failed_full_resync_keeps_the_ledger(xdmod, monkeypatch):
+    run(monkeypatch, [record("a"), record("b")])
+    ledger = json.loads(build_nsf_report.LEDGER_PATH.read_text())
+
+    xdmod.status = 500
+    with pytest.raises(SystemExit):
+        run(monkeypatch, [record("c")], "--full")
+    assert json.loads(build_nsf_report.LEDGER_PATH.read_text()) == ledger
+
+
+def test_delta_sends_only_new_or_changed_records(xdmod, monkeypatch):
+    records = [record("a"), record("b"), record("c")]
+    run(monkeypatch, records)
+    assert xdmod.sent() == records
+
+    xdmod.uploads.clear()
+    run(monkeypatch, records)
+    assert xdmod.sent() == []
+
+    changed = [record("a"), record("b", last_activity="2026-02-01"), record("c")]
+    run(monkeypatch, changed)
+    assert xdmod.sent() == [changed[1]]
+    submitted = json.loads(build_nsf_report.LEDGER_PATH.read_text())["submitted"]
+    assert submitted == {r["hashed_user_id"]: build_nsf_report.record_digest(r) for r in changed}
+
+
+def test_full_resends_everything_and_rebuilds_the_ledger(xdmod, monkeypatch):
+    run(monkeypatch, [record("a"), record("b")])
+    xdmod.uploads.clear()
+
+    # "a" has left every hub: a full resync stops tracking it
+    run(monkeypatch, [record("b"), record("c")], "--full")
+    assert xdmod.sent() == [record("b"), record("c")]
+    ledger = json.loads(build_nsf_report.LEDGER_PATH.read_text())
+    assert set(ledger["submitted"]) == {"hash-b", "hash-c"}
+
+
+@pytest.mark.parametrize("days_since_full, full_every, resent", [(3, 7, False), (7, 7, True), (3, 2, True)])
+def test_full_every_forces_a_periodic_resync(xdmod, monkeypatch, days_since_full, full_every, resent):
+    records = [record("a"), record("b")]
+    run(monkeypatch, records)
+    ledger = json.loads(build_nsf_report.LEDGER_PATH.read_text())
+    last_full = date.fromisoformat(ledger["last_full_submission"]) - timedelta(days=days_since_full)
+    ledger["last_full_submission"] = last_full.isoformat()
+    build_nsf_report.LEDGER_PATH.write_text(json.dumps(ledger))
+    xdmod.uploads.clear()
+
+    run(monkeypatch, records, "--full-every", str(full_every))
+    assert xdmod.sent() == (records if resent else [])
+    ledger = json.loads(build_nsf_report.LEDGER_PATH.read_text())
+    assert (ledger["last_full_submission"] == date.today().isoformat()) == resent
@@ -0,0 +1,142 @@
+"""Paging through /users (users.fetch_users / users.users_pager) against a
+local stand-in hub, for each way hubs cap and report their pages."""
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+import users  # noqa: E402
+
+
+class StandInHub:
+    """Serves count users from /hub/api/users, at most cap (settable) per page.
+
+    With envelope, pages come in JupyterHub's pagination envelope (reporting
+    total, or reported_total if set); otherwise as a plain list. With
+    ignore_offset, every request is answered from the first user, as pre-2.0
+    hubs do."""
+
+    def __init__(self, count, cap, envelope=False, ignore_offset=False, reported_total=None):
+        self.names = [f"user{i:05d}" for i in range(count)]
+        self.cap = cap
+        self.requests = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                query = parse_qs(urlsplit(self.path).query)
+                limit = min(int(query["limit"][0]), stand_in.cap)
+                offset = 0 if ignore_offset else int(query["offset"][0])
+                stand_in.requests.append((int(query["limit"][0]), int(query["offset"][0])))
+                items = [
+                    {"name": name, "admin": False, "roles": ["user"], "last_activity": "2026-01-05T12:00:00Z"}
+                    for name in stand_in.names[offset:offset + limit]
+                ]
+                if envelope:
+                    end = offset + len(items)
+                    body = {
+                        "items": items,
+                        "_pagination": {
+                            "offset": offset,
+                            "limit": limit,
+                            "total": len(stand_in.names) if reported_total is None else reported_total,
+                            "next": {"offset": end, "limit": limit, "url": None} if end < len(stand_in.names) else None,
+                        },
+                    }
+                else:
+                    body = items
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.api_url = f"http://127.0.0.1:{self.server.server_address[1]}/hub/api"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    """Starts a StandInHub and points users.hub_api_url at it."""
+    started = []
+
+    def start(*args, **kwargs):
+        stand_in = StandInHub(*args, **kwargs)
+        started.append(stand_in)
+        monkeypatch.setattr(users, "hub_api_url", lambda url, where: stand_in.api_url)
+        return stand_in
+
+    yield start
+    for stand_in in started:
+        stand_in.server.shutdown()
+
+
+def fetch(page_size=None):
+    return users.fetch_users("stand-in", "cloudbank", "token", page_size=page_size)
+
+
+@pytest.mark.parametrize("cap", [200, 1000])
+def test_envelope_reports_the_cap_and_total(hub, cap):
+    stand_in = hub(2345, cap, envelope=True)
+    fetched, transfer = fetch()
+    assert [user["name"] for user in fetched] == stand_in.names
+    assert transfer["paginated"] and transfer["page_size"] == cap
+    assert transfer["requests"] == -(-2345 // cap)
+
+
+def test_plain_list_learns_an_unknown_cap(hub):
+    stand_in = hub(450, 200)
+    fetched, transfer = fetch()
+    assert [user["name"] for user in fetched] == stand_in.names
+    assert not transfer["paginated"] and transfer["page_size"] == 200
+    # A short first page (200 of 1000 asked for) is only known to be the cap once more users follow
+    assert stand_in.requests == [(1000, 0), (1000, 200), (200, 400), (200, 450)]
+
+
+def test_plain_list_with_a_known_cap_confirms_the_short_page(hub):
+    stand_in = hub(450, 200)
+    fetched, transfer = fetch(page_size=200)
+    assert [user["name"] for user in fetched] == stand_in.names
+    # The short page might be a lowered cap, so the next offset is asked for before stopping
+    assert stand_in.requests == [(200, 0), (200, 200), (200, 400), (200, 450)]
+    assert transfer["page_size"] == 200
+
+
+def test_plain_list_hub_that_lowered_its_cap_between_runs(hub):
+    stand_in = hub(450, 200)
+    _, transfer = fetch()
+    assert transfer["page_size"] == 200
+
+    stand_in.cap = 100
+    stand_in.requests.clear()
+    fetched, transfer = fetch(page_size=transfer["page_size"])  # the cap cached by the first run
+    assert [user["name"] for user in fetched] == stand_in.names
+    assert transfer["page_size"] == 100
+    assert stand_in.requests[:3] == [(200, 0), (200, 100), (100, 200)]
+
+
+def test_hub_that_ignores_the_offset(hub):
+    stand_in = hub(300, 1000, ignore_offset=True)
+    fetched, transfer = fetch()
+    assert [user["name"] for user in fetched] == stand_in.names
+    # The repeated first page is recognized and not counted twice
+    assert transfer["users"] == 300 and transfer["requests"] == 2
+
+
+def test_total_mismatch_raises(hub):
+    hub(450, 200, envelope=True, reported_total=455)
+    with pytest.raises(Exception, match="got 450 of 455 users"):
+        fetch()
@@ -7,9 +7,11 @@ Fetches user data via REST API, computes statistics for each academic term, and
 Usage:
     python users.py           # Process all pilots
     python users.py <hub>     # Process a single pilot by hub name
+    USERS_DECODE_PROCESSES=4 python users.py    # decode and bucket pages on 4 worker processes
 
 Outputs:
-    - users.csv: User statistics per pilot and term
+    - users.arrow: User statistics per pilot and term (typed Arrow IPC, totals in metadata)
+    - users.csv: The same rows plus summary rows, as a human-readable view
 
 Requires:
     - pilots.json: Decrypted pilot tokens and metadata
@@ -17,11 +19,48 @@ Requires:
 
 import csv
 import json
+import multiprocessing
+import os
 import sys
-from datetime import datetime
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TypedDict, Union
 
+import pyarrow as pa
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+try:
+    import msgspec
+except ImportError:  # optional: without it pages are decoded with the json module
+    msgspec = None
+
+import columnar
+import membership
+from hub_probe import DEAD_VERDICTS, hub_api_url, pilot_key, probe_pilots
+
+PAGE_SIZE_CEILING = 1000  # hubs cap this at their api_page_max_limit (200 by default)
+PAGE_SIZES_PATH = Path(__file__).parent / ".cache" / "hub_page_sizes.json"
+PAGINATION_MEDIA_TYPE = "application/jupyterhub-pagination+json"
+# The only user model fields process_pilot reads
+USER_FIELDS = ("name", "admin", "roles", "last_activity")
+ROLLING_WINDOWS = (7, 30, 90)  # days; one "active-<n>d" column each
+# Typed schema of a /users page, so msgspec decodes only USER_FIELDS of each
+# user model and skips everything else without building it
+LeanUser = TypedDict("LeanUser", {
+    "name": str, "admin": bool, "roles": List[str], "last_activity": Optional[str],
+}, total=False)
+UsersEnvelope = TypedDict("UsersEnvelope", {"items": List[LeanUser], "_pagination": Dict[str, Any]})
+_page_decoder = msgspec.json.Decoder(Union[List[LeanUser], UsersEnvelope]) if msgspec else None
+# Worker processes that decode and bucket /users pages off the crawl threads'
+# GIL (see process_pilot); 0 keeps everything on the threads
+DECODE_PROCESSES = int(os.environ.get("USERS_DECODE_PROCESSES", 0))
+# Forking a process with other threads running (crawl threads, main.py's Otter
+# thread and its gRPC channels) can deadlock the child, and gRPC doesn't
+# support fork. Workers are started by a forkserver (a fresh, single-threaded
+# process) instead, or spawned where there is none.
+DECODE_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
 
 
 def filter_users(func, users):
@@ -57,6 +96,55 @@ def convert(datetime_str):
     return date_time_obj
 
 
+def activity_index(users):
+    """
+    Parses every user's last activity once, for any number of window counts.
+
+    Args:
+        users (list): List of user dicts.
+
+    Returns:
+        list: Sorted last_activity datetimes of the users that have one.
+    """
+    return sorted(convert(user["last_activity"]) for user in users if user["last_activity"])
+
+
+def count_active_between(index, begin_d, end_d):
+    """
+    Counts users with begin_d < last activity < end_d, by binary search.
+
+    Args:
+        index (list): Sorted datetimes from activity_index.
+        begin_d (datetime): Start date (exclusive).
+        end_d (datetime): End date (exclusive).
+
+    Returns:
+        int: Number of active users in the date range.
+    """
+    return max(0, bisect_left(index, end_d) - bisect_right(index, begin_d))
+
+
+def count_active_since(index, since):
+    """
+    Counts users with last activity after since, by binary search.
+
+    Args:
+        index (list): Sorted datetimes from activity_index.
+        since (datetime): Window start (exclusive).
+
+    Returns:
+        int: Number of users active since then.
+    """
+    return len(index) - bisect_right(index, since)
+
+
+def rolling_columns():
+    """
+    Returns the rolling-window column names, e.g. ["active-7d", "active-30d", "active-90d"].
+    """
+    return [f"active-{days}d" for days in ROLLING_WINDOWS]
+
+
 def users_active_since_date(begin_d, end_d, users):
     """
     Counts users with last activity between begin_d and end_d.
@@ -69,13 +157,189 @@ def users_active_since_date(begin_d, end_d, users):
     Returns:
         int: Number of active users in the date range.
     """
-    users = list(filter(lambda user: user["last_activity"], users))
+    return count_active_between(activity_index(users), begin_d, end_d)
+
+
+def users_request_headers(token):
+    return {
+        'Authorization': f'token {token}',
+        'Accept': PAGINATION_MEDIA_TYPE,
+    }
+
+
+def check_users_response(url, status_code, text):
+    """
+    Raises for a /users response that isn't a 200.
+
+    Args:
+        url (str): Hub URL prefix.
+        status_code (int): HTTP status.
+        text (str): Response body, for the error message.
+    """
+    if status_code == 403:
+        raise Exception(f"403 error getting users from {url}")
+    if status_code != 200:
+        raise Exception(f"Error getting users from {url}: {status_code} {text}")
+
+
+def users_pager(url, page_size):
+    """
+    Drives the paging through a hub's /users (see fetch_users) without doing
+    any I/O, so blocking and async crawls share it.
+
+    Yields the path (from the API base URL) of each request to make, and must
+    be sent (body size in bytes, read_page result) for it. A read_page
+    result is (the envelope's _pagination dict or None, number of users on
+    the page, first username or None, compact JSON size of the kept users,
+    payload).
+
+    Args:
+        url (str): Hub URL prefix, for error messages.
+        page_size (int): Known page cap of a hub that doesn't paginate.
+
+    Returns:
+        tuple: (payloads of the pages that held users, transfer dict), as
+        the generator's return value.
+    """
+    payloads = []
+    transfer = {"users": 0, "requests": 0, "bytes": 0, "kept_bytes": 0, "page_size": page_size, "paginated": False}
+    limit = page_size or PAGE_SIZE_CEILING
+    offset = 0
+    total = None
+    short_page = None
+    first_name = None
+    while True:
+        size, (pagination, count, first, kept_bytes, payload) = yield f'/users?limit={limit}&offset={offset}'
+        if pagination is not None:
+            transfer["paginated"] = True
+            transfer["page_size"] = pagination["limit"]
+            total = pagination["total"]
+            next_offset = pagination["next"]["offset"] if pagination["next"] else None
+        else:
+            if count and first_name is not None and first == first_name:
+                # Offset ignored (pre-2.0 hubs return everyone every time): the first page was everything
+                count = kept_bytes = 0
+            if short_page is not None and count:
+                # The previous short page was the hub's cap (or its lowered cap), not the end
+                transfer["page_size"] = limit = short_page
+            short_page = None
+            if not count or count > limit:
+                # Empty, or more than asked for (paging ignored)
+                next_offset = None
+            else:
+                if count < limit:
+                    short_page = count
+                next_offset = offset + count
+        if count:
+            first_name = first_name or first
+            payloads.append(payload)
+        transfer["users"] += count
+        transfer["requests"] += 1
+        transfer["bytes"] += size
+        transfer["kept_bytes"] += kept_bytes
+        if next_offset is None:
+            break
+        offset = next_offset
+    if total is not None and transfer["users"] != total:
+        raise Exception(f"Incomplete user list from {url}: got {transfer['users']} of {total} users")
+    return payloads, transfer
+
+
+def _crawl(url, where, token, page_size, read_page):
+    """
+    Pages through a hub's /users with blocking requests (see users_pager),
+    handing each response body to read_page.
+
+    Returns:
+        tuple: (payloads of the pages that held users, transfer dict).
+    """
+    api_url = hub_api_url(url, where)
+    pager = users_pager(url, page_size)
+    path = next(pager)
+    while True:
+        r = requests.get(api_url + path, headers=users_request_headers(token))
+        check_users_response(url, r.status_code, r.text)
+        try:
+            path = pager.send((len(r.content), read_page(r.content)))
+        except StopIteration as done:
+            return done.value
+
+
+def _decode_page(content, lean=True):
+    """
+    Decodes one /users response body (an envelope or a plain list), cut down
+    to USER_FIELDS in lean mode.
+
+    In lean mode with msgspec installed, the page is decoded straight into
+    LeanUser dicts, and the other fields are never materialized. Pages that
+    don't fit the schema (unexpected field types) fall back to the json
+    module, which gives the same result.
+
+    Returns:
+        tuple: (_pagination dict or None, user dicts).
+    """
+    if lean and _page_decoder is not None:
+        try:
+            data = _page_decoder.decode(content)
+        except msgspec.ValidationError:
+            pass
+        else:
+            pagination = None
+            if isinstance(data, dict):
+                pagination, data = data["_pagination"], data["items"]
+            for user in data:
+                if len(user) < len(USER_FIELDS):
+                    # Older hubs leave fields out; the json path reads them as None
+                    for field in USER_FIELDS:
+                        user.setdefault(field, None)
+            return pagination, data
+    data = json.loads(content)
+    pagination = None
+    if isinstance(data, dict):
+        pagination, data = data["_pagination"], data["items"]
+    if lean:
+        data = [{field: user.get(field) for field in USER_FIELDS} for user in data]
+    return pagination, data
+
+
+def _read_users(content, lean):
+    pagination, page = _decode_page(content, lean)
+    first = page[0]["name"] if page else None
+    return pagination, len(page), first, len(json.dumps(page, separators=(",", ":"))), page
+
+
+def fetch_users(url, where, token, lean=True, page_size=None):
+    """
+    Fetches user data from the JupyterHub API, with transfer statistics.
+
+    Asks for JupyterHub's paginated response (2.0+) with limit=PAGE_SIZE_CEILING.
+    The hub caps that at its own max page size and reports the cap, the next
+    offset and the total. So the crawl uses the largest page each hub allows,
+    stops on the last page, and is checked against the total. Hubs that answer
+    with a plain list give no such information. For those, page_size is the
+    cap learned on an earlier run, used as the request limit. Paging continues
+    until an empty page either way, since a short page can also mean the hub
+    has lowered its cap: a short page followed by more users reveals the
+    (new) cap.
+
+    Stopped servers are never requested (the API leaves them out unless
+    include_stopped_servers is passed). The API has no field selection, so in
+    lean mode every user model is cut down to USER_FIELDS as soon as it is decoded.
 
-    def process(user):
-        la = convert(user["last_activity"])
-        return la > begin_d and la < end_d
+    Args:
+        url (str): Hub URL prefix.
+        where (str): Deployment type.
+        token (str): API token.
+        lean (bool): Keep only USER_FIELDS of each user.
+        page_size (int): Known page cap of a hub that doesn't paginate (see above).
 
-    return len(list(filter(lambda user: process(user), users)))
+    Returns:
+        tuple: (list of user dicts, transfer dict with "users", "requests",
+        "bytes" received, "kept_bytes" (the retained user dicts as compact
+        JSON), "page_size" (the hub's page cap, if known) and "paginated").
+    """
+    pages, transfer = _crawl(url, where, token, page_size, lambda content: _read_users(content, lean))
+    return [user for page in pages for user in page], transfer
 
 
 def get_users(url, where, token):
@@ -88,59 +352,242 @@ def get_users(url, where, token):
         token (str): API token.
 
     Returns:
-        list: List of user dicts.
-    """
-    all_data = []
-    api_url = f'http://{url}.cloudbank.2i2c.cloud/hub/api'
-    if url == "mills":
-        api_url = f'http://datahub.{url}.edu/hub/api'
-    if where == "icor":
-        api_url = f'http://{url}.jupyter.cal-icor.org/hub/api'
-    offset = 0
-    while True:
-        r = requests.get(
-            api_url + f'/users?limit=200&offset={offset}',
-            headers={
-                'Authorization': f'token {token}'
-            }
-        )
-        if r.status_code == 403:
-            raise Exception(f"403 error getting users from {url}")
-        if r.status_code != 200:
-            raise Exception(f"Error getting users from {url}: {r.status_code} {r.text}")
-        r.raise_for_status()
-        data = r.json()
-        all_data.extend(data)
-        # Stop if we got fewer than 200 users (indicating end of results)
-        if len(data) < 200:
-            break
-        offset += 200
-    return all_data
+        list: List of user dicts (lean, see fetch_users).
+    """
+    return fetch_users(url, where, token)[0]
 
 
-def process_pilot(pilot, dates):
+def counted_users(users):
     """
-    Processes a single pilot, collecting user statistics for each term.
+    Drops admins and service/deployment accounts, which are not counted.
 
     Args:
-        pilot (dict): Pilot metadata.
+        users (list): User dicts.
+
+    Returns:
+        list: The users that count towards the statistics.
+    """
+    return list(filter(lambda user: "admin" not in user["roles"] and user['admin'] is False and "service-hub" not in user['name'] and "deployment-service" not in user['name'], users))
+
+
+def bucket_users(users, dates, as_of):
+    """
+    Counts counted users in total, ever active, per rolling window and per term.
+
+    Every count is a sum over users, so the buckets of separate pages add up
+    to the buckets of the whole hub (see merge_buckets).
+
+    Args:
+        users (list): User dicts, already passed through counted_users.
         dates (list): List of (term, begin, end) tuples.
+        as_of (datetime): End of the rolling windows.
 
     Returns:
-        dict: Statistics for the pilot.
+        tuple: ({column: count} in users.csv order from number_all_users on,
+        {term: usernames active in the term}).
     """
-    users = get_users(pilot["url"], pilot["where"], pilot["token"])
-    users = list(filter(lambda user: "admin" not in user["roles"] and user['admin'] is False and "service-hub" not in user['name'] and "deployment-service" not in user['name'], users))
-    p = {
-        "name": pilot["name"],
-        "where": pilot["where"],
+    counts = {
         "number_all_users": len(users),
         "number_all_users_ever_active": filter_users(lambda user: user["last_activity"], users),
     }
+    # Parse last_activity once; every window below is a binary search over it
+    dated = sorted((convert(user["last_activity"]), user["name"]) for user in users if user["last_activity"])
+    index = [when for when, _ in dated]
+    for column, days in zip(rolling_columns(), ROLLING_WINDOWS):
+        counts[column] = count_active_since(index, as_of - timedelta(days=days))
+    term_members = {}
     for term, begin, end in dates:
-        p[term] = users_active_since_date(begin, end, users)
+        counts[term] = count_active_between(index, begin, end)
+        if counts[term]:
+            term_members[term] = [name for _, name in dated[bisect_right(index, begin):bisect_left(index, end)]]
+    return counts, term_members
+
+
+def merge_buckets(buckets):
+    """
+    Adds up bucket_users results.
+
+    Args:
+        buckets (list): (counts, term_members) tuples; at least one.
+
+    Returns:
+        tuple: (summed counts, concatenated term_members).
+    """
+    counts = dict.fromkeys(buckets[0][0], 0)
+    term_members = {}
+    for page_counts, page_members in buckets:
+        for column, count in page_counts.items():
+            counts[column] += count
+        for term, names in page_members.items():
+            term_members.setdefault(term, []).extend(names)
+    return counts, term_members
+
+
+def summarize_users(pilot, users, dates, as_of=None):
+    """
+    Computes a pilot's statistics from its fetched users: totals, the rolling
+    windows ending at as_of, and each term.
+
+    Args:
+        pilot (dict): Pilot metadata.
+        users (list): User dicts from fetch_users.
+        dates (list): List of (term, begin, end) tuples.
+        as_of (datetime): End of the rolling windows, naive UTC like the
+            parsed last_activity values (default: now).
+
+    Returns:
+        tuple: (statistics dict for the pilot,
+        {term: usernames active in the term} for membership.record_run).
+    """
+    as_of = as_of or datetime.now(timezone.utc).replace(tzinfo=None)
+    counts, term_members = bucket_users(counted_users(users), dates, as_of)
+    p = {"name": pilot["name"], "where": pilot["where"]}
+    p.update(counts)
+    return p, term_members
+
+
+def bucket_page(content, dates, as_of):
+    """
+    Decodes, filters and buckets one /users response body. Runs in a worker
+    process (see process_pilot), so only the page's metadata, counts and
+    per-term usernames are sent back, never the user models.
+
+    Returns:
+        tuple: A _crawl read_page result whose payload is a bucket_users result.
+    """
+    pagination, page = _decode_page(content)
+    first = page[0]["name"] if page else None
+    kept_bytes = len(json.dumps(page, separators=(",", ":")))
+    return pagination, len(page), first, kept_bytes, bucket_users(counted_users(page), dates, as_of)
+
+
+def process_pilot(pilot, dates, page_size=None, as_of=None, pool=None):
+    """
+    Processes a single pilot: fetches its users and summarizes them (see
+    summarize_users).
+
+    With a pool, the calling thread only does the HTTP requests. Each response
+    body is decoded, filtered and bucketed in the pool (see bucket_page), and
+    the per-page buckets are added up here. That keeps the CPU work of large
+    hubs off the GIL that the other crawl threads share. The statistics are
+    the same either way.
+
+    A hub's next request depends on its current page (the envelope's next
+    offset, or a plain list's length and first user), so the thread waits for
+    each page to be decoded before asking for the next one. Requests and
+    decoding still overlap across hubs: while one hub's page is in the pool,
+    the other crawl threads' requests are in flight.
+
+    Args:
+        pilot (dict): Pilot metadata.
+        dates (list): List of (term, begin, end) tuples.
+        page_size (int): Known page cap for the hub (see fetch_users).
+        as_of (datetime): End of the rolling windows (see summarize_users).
+        pool (concurrent.futures.ProcessPoolExecutor): Worker processes for
+            the decoding and bucketing (see decode_pool), or None to do it in
+            this thread.
+
+    Returns:
+        tuple: (statistics dict for the pilot, fetch_users transfer dict,
+        {term: usernames active in the term} for membership.record_run).
+    """
+    if pool is None:
+        users, transfer = fetch_users(pilot["url"], pilot["where"], pilot["token"], page_size=page_size)
+        p, term_members = summarize_users(pilot, users, dates, as_of)
+        return p, transfer, term_members
 
-    return p
+    as_of = as_of or datetime.now(timezone.utc).replace(tzinfo=None)
+    buckets, transfer = _crawl(
+        pilot["url"], pilot["where"], pilot["token"], page_size,
+        lambda content: pool.submit(bucket_page, content, dates, as_of).result(),
+    )
+    p, term_members = summarize_buckets(pilot, buckets, dates, as_of)
+    return p, transfer, term_members
+
+
+def decode_pool(processes):
+    """
+    Returns a pool of worker processes for process_pilot, started with
+    DECODE_START_METHOD, or None for 0 processes.
+    """
+    if not processes:
+        return None
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(DECODE_START_METHOD))
+
+
+def summarize_buckets(pilot, buckets, dates, as_of):
+    """
+    summarize_users for a hub whose pages were bucketed separately (see bucket_page).
+
+    Returns:
+        tuple: (statistics dict for the pilot, {term: usernames active in the term}).
+    """
+    counts, term_members = merge_buckets(buckets or [bucket_users([], dates, as_of)])
+    p = {"name": pilot["name"], "where": pilot["where"]}
+    p.update(counts)
+    return p, term_members
+
+
+def load_page_sizes():
+    """
+    Returns the cached {pilot_key: page cap} learned from hubs that answer
+    /users with a plain list. The file keys them "<where>/<url>"; entries
+    without a cluster (written before hubs were keyed by cluster) are dropped
+    and relearned.
+    """
+    if not PAGE_SIZES_PATH.exists():
+        return {}
+    try:
+        cached = json.loads(PAGE_SIZES_PATH.read_text())
+    except ValueError:
+        return {}
+    page_sizes = {}
+    for key, page_size in cached.items():
+        where, _, url = key.rpartition("/")
+        if where:
+            page_sizes[url, where] = page_size
+    return page_sizes
+
+
+def save_page_sizes(page_sizes, transfers):
+    """
+    Records the page caps learned this run for hubs that don't paginate.
+
+    Args:
+        page_sizes (dict): Cache as returned by load_page_sizes.
+        transfers (dict): {pilot_key: fetch_users transfer dict}.
+    """
+    updated = dict(page_sizes)
+    for key, transfer in transfers.items():
+        if transfer["paginated"]:
+            updated.pop(key, None)  # the hub reports its own cap every time
+        elif transfer["page_size"] is not None:
+            updated[key] = transfer["page_size"]
+    if updated != page_sizes:
+        PAGE_SIZES_PATH.parent.mkdir(exist_ok=True)
+        cached = {f"{where}/{url}": page_size for (url, where), page_size in updated.items()}
+        PAGE_SIZES_PATH.write_text(json.dumps(cached, indent=2, sort_keys=True) + "\n")
+
+
+def format_transfers(transfers):
+    """
+    Formats fetch_users transfer statistics, one line per hub.
+
+    Args:
+        transfers (dict): {pilot_key: transfer dict}.
+
+    Returns:
+        str: Lines like "ccsf (cloudbank): 1234 users in 7 requests, 912 B/user received, 141 B/user kept".
+    """
+    lines = []
+    for (url, where), t in sorted(transfers.items()):
+        users = max(t["users"], 1)
+        page = f" of up to {t['page_size']}" if t["page_size"] else ""
+        lines.append(
+            f"{url} ({where}): {t['users']} users in {t['requests']} requests{page}, "
+            f"{t['bytes'] / users:.0f} B/user received, {t['kept_bytes'] / users:.0f} B/user kept"
+        )
+    return "\n".join(lines)
 
 
 def generate_dates(start_year, end_year):
@@ -186,11 +633,45 @@ def config_stats(dates):
     s = {}
     s["all-users"] = [0, 0]
     s["all-users-ever-active"] = [0, 0]
+    for column in rolling_columns():
+        s[column] = [0, 0]
     for term, begin, end in dates:
         s[term] = [0, 0]
     return s
 
 
+def csv_header(dates):
+    """
+    Returns the users.csv column names.
+
+    Args:
+        dates (list): List of (term, begin, end) tuples.
+
+    Returns:
+        list: Column names.
+    """
+    header = list(["college", "where", "all-users", "all-users-ever-active"])
+    header.extend(rolling_columns())
+    header.extend(list(map(lambda row: row[0], dates)))
+    return header
+
+
+def arrow_schema(dates):
+    """
+    Returns the users.arrow schema: the users.csv columns, typed.
+
+    Args:
+        dates (list): List of (term, begin, end) tuples.
+
+    Returns:
+        pyarrow.Schema: Schema with string name columns and int32 counts.
+    """
+    header = csv_header(dates)
+    fields = [pa.field(name, pa.string()) for name in header[:2]]
+    fields.extend(pa.field(name, pa.int32()) for name in header[2:])
+    return pa.schema(fields)
+
+
 def config_csvwriter(dates, data_file):
     """
     Configures CSV writer and writes header row.
@@ -203,13 +684,37 @@ def config_csvwriter(dates, data_file):
         csv.writer: CSV writer object.
     """
     csv_writer = csv.writer(data_file)
-
-    header = list(["college", "where", "all-users", "all-users-ever-active"])
-    header.extend(list(map(lambda row: row[0], dates)))
-    csv_writer.writerow(header)
+    csv_writer.writerow(csv_header(dates))
     return csv_writer
 
 
+def accumulate_stats(stats, results, dates):
+    """
+    Adds each pilot's counts to the totals, and counts the pilots with more
+    than 5 users, per column.
+
+    Args:
+        stats (dict): Aggregated statistics from config_stats, updated in place.
+        results (list): Statistics dicts from process_pilot.
+        dates (list): List of (term, begin, end) tuples.
+    """
+    for p in results:
+        if "number_all_users" in p:
+            stats["all-users"][0] += p["number_all_users"]
+            if p["number_all_users"] > 5:
+                stats["all-users"][1] += 1
+        if "number_all_users_ever_active" in p:
+            stats["all-users-ever-active"][0] += p["number_all_users_ever_active"]
+            if p["number_all_users_ever_active"] > 5:
+                stats["all-users-ever-active"][1] += 1
+
+        for term in rolling_columns() + [term for term, begin, end in dates]:
+            if term in p:
+                stats[term][0] += p[term]
+                if p[term] > 5:
+                    stats[term][1] += 1
+
+
 def write_csvwriter_stats(csv_writer, stats):
     """
     Writes summary statistics rows to the CSV file.
@@ -243,73 +748,170 @@ def get_current_academic_year():
         return year - 1
 
 
-def main(process_all, one):
+def load_pilots(process_all, one):
     """
-    Main entry point. Processes pilots and writes statistics to CSV.
+    Reads pilots.json.
 
     Args:
-        process_all (bool): If True, process all pilots. If False, process one.
-        one (str): Hub name to process if not all.
+        process_all (bool): If True, all pilots. If False, only one.
+        one (str): Hub URL prefix of the pilot to keep if not all.
+
+    Returns:
+        list: Pilot metadata dicts.
     """
-    data_file = open('users.csv', 'w')
-    dates = generate_dates(2022, get_current_academic_year())
-    stats = config_stats(dates)
-    csv_writer = config_csvwriter(dates, data_file)
-    f = open('pilots.json')
-    data = json.load(f)
+    with open('pilots.json') as f:
+        data = json.load(f)
+    return [pilot for pilot in data["pilots"] if process_all or pilot["url"] == one]
 
-    # Filter pilots to process
-    pilots_to_process = [pilot for pilot in data["pilots"]
-                         if process_all or pilot["url"] == one]
 
-    # Process pilots in parallel using ThreadPoolExecutor
-    results = []
-    failures = []
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        # Submit all pilot processing tasks
-        future_to_pilot = {
-            executor.submit(process_pilot, pilot, dates): pilot
-            for pilot in pilots_to_process
-        }
-
-        # Collect results as they complete
-        for future in as_completed(future_to_pilot):
-            pilot = future_to_pilot[future]
-            try:
-                result = future.result()
-                results.append(result)
-            except Exception as exc:
-                failures.append(f"{pilot['name']}: {exc}")
-    # Aggregate statistics and write to CSV
-    for p in results:
-        csv_writer.writerow(p.values())
+def skip_dead_pilots(pilots, health, failures):
+    """
+    Drops pilots the probe found unreachable or unauthorized, recording each as a failure.
 
-        # Update aggregate statistics
-        if "number_all_users" in p:
-            stats["all-users"][0] += p["number_all_users"]
-            if p["number_all_users"] > 5:
-                stats["all-users"][1] += 1
-        if "number_all_users_ever_active" in p:
-            stats["all-users-ever-active"][0] += p["number_all_users_ever_active"]
-            if p["number_all_users_ever_active"] > 5:
-                stats["all-users-ever-active"][1] += 1
+    Args:
+        pilots (list): Pilot metadata dicts.
+        health (dict): {pilot_key: ProbeResult}; pilots missing from it are kept.
+        failures (list): Failure messages, appended to.
+
+    Returns:
+        list: The pilots to crawl.
+    """
+    live_pilots = []
+    for pilot in pilots:
+        result = health.get(pilot_key(pilot))
+        if result is not None and result.verdict in DEAD_VERDICTS:
+            failures.append(f"{pilot['name']}: skipped, probe found it {result.verdict} ({result.describe()})")
+        else:
+            live_pilots.append(pilot)
+    return live_pilots
 
-        for term, begin, end in dates:
-            if term in p:
-                stats[term][0] += p[term]
-                if p[term] > 5:
-                    stats[term][1] += 1
-    write_csvwriter_stats(csv_writer, stats)
-    data_file.close()
+
+def write_results(dates, pilots, live_pilots, results, failures, transfers, members, page_sizes):
+    """
+    Saves a crawl: learned page caps, term membership, users.csv and users.arrow.
+
+    Args:
+        dates (list): List of (term, begin, end) tuples.
+        pilots (list): Every pilot that was to be processed.
+        live_pilots (list): The pilots that were crawled (not skipped by the probe).
+        results (list): Statistics dicts of the hubs that succeeded, in completion order.
+        failures (list): Failure messages.
+        transfers (dict): {pilot_key: fetch_users transfer dict}.
+        members (dict): {pilot_key: {term: usernames active in the term}}.
+        page_sizes (dict): Page caps the crawl started from (see load_page_sizes).
+
+    Returns:
+        dict: The users.main summary.
+    """
+    save_page_sizes(page_sizes, transfers)
+
+    # Accumulate who was active in each term, for retention queries (see membership.py)
+    hmac_key = membership.hash_key()
+    if hmac_key is None:
+        print(f"Term membership not recorded: {membership.HASH_KEY_ENV} is not set")
+    else:
+        conn = membership.connect()
+        try:
+            for pilot in live_pilots:
+                if pilot_key(pilot) in members:
+                    membership.record_run(
+                        conn, hmac_key, date.today(), pilot["name"], pilot["where"], members[pilot_key(pilot)]
+                    )
+        finally:
+            conn.close()
+
+    # Aggregate statistics and write to CSV
+    stats = config_stats(dates)
+    with open('users.csv', 'w') as data_file:
+        csv_writer = config_csvwriter(dates, data_file)
+        for p in results:
+            csv_writer.writerow(p.values())
+        accumulate_stats(stats, results, dates)
+        write_csvwriter_stats(csv_writer, stats)
+
+    columnar.write_table(
+        "users.arrow",
+        arrow_schema(dates),
+        [list(p.values()) for p in results],
+        {
+            "Total": {column: counts[0] for column, counts in stats.items()},
+            "Total Schools > 5 Users": {column: counts[1] for column, counts in stats.items()},
+        },
+    )
 
     return {
-        "total_pilots": len(pilots_to_process),
+        "total_pilots": len(pilots),
         "successful_pilots": len(results),
         "failed_pilots": len(failures),
+        "skipped_pilots": len(pilots) - len(live_pilots),
         "failures": failures,
+        # {pilot_key: fetch_users transfer dict}, for the bytes-per-user report
+        "transfers": transfers,
+        # Per-pilot rows as written to users.csv (without the summary rows), so
+        # callers can build the dashboard without reading the CSV back
+        "columns": csv_header(dates),
+        "rows": [list(p.values()) for p in results],
     }
 
 
+def main(process_all, one, probe=True, processes=None, pool=None):
+    """
+    Main entry point. Processes pilots and writes statistics to CSV.
+
+    Args:
+        process_all (bool): If True, process all pilots. If False, process one.
+        one (str): Hub name to process if not all.
+        probe (bool): Probe every hub first (see hub_probe.py) and skip the ones
+            that are unreachable or reject their token.
+        processes (int): Worker processes for decoding and bucketing pages
+            (see process_pilot); default DECODE_PROCESSES, 0 for none.
+        pool (concurrent.futures.ProcessPoolExecutor): Decode pool to use
+            instead (see decode_pool), for callers that start threads of their
+            own first; left running.
+    """
+    dates = generate_dates(2022, get_current_academic_year())
+    pilots_to_process = load_pilots(process_all, one)
+
+    results = []
+    failures = []
+    transfers = {}
+    members = {}
+
+    # The decode pool exists before the probe's and crawl's threads start
+    own_pool = pool is None
+    if own_pool:
+        pool = decode_pool(DECODE_PROCESSES if processes is None else processes)
+    try:
+        # Probe first, so dead hubs and expired tokens fail in seconds instead of
+        # tying up a crawl worker
+        health = probe_pilots(pilots_to_process) if probe else {}
+        live_pilots = skip_dead_pilots(pilots_to_process, health, failures)
+
+        # Process pilots in parallel using ThreadPoolExecutor
+        page_sizes = load_page_sizes()
+        as_of = datetime.now(timezone.utc).replace(tzinfo=None)  # one window end for every hub
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            # Submit all pilot processing tasks
+            future_to_pilot = {
+                executor.submit(process_pilot, pilot, dates, page_sizes.get(pilot_key(pilot)), as_of, pool): pilot
+                for pilot in live_pilots
+            }
+
+            # Collect results as they complete
+            for future in as_completed(future_to_pilot):
+                pilot = future_to_pilot[future]
+                try:
+                    result, transfers[pilot_key(pilot)], members[pilot_key(pilot)] = future.result()
+                    results.append(result)
+                except Exception as exc:
+                    failures.append(f"{pilot['name']}: {exc}")
+    finally:
+        if own_pool and pool is not None:
+            pool.shutdown()
+
+    return write_results(dates, pilots_to_process, live_pilots, results, failures, transfers, members, page_sizes)
+
+
 if __name__ == "__main__":
     process_all = True
     one = None
@@ -318,6 +920,7 @@ if __name__ == "__main__":
         one = sys.argv[1]
     try:
         summary = main(process_all, one)
+        print(format_transfers(summary["transfers"]))
         status = "Finished with failure" if summary["failed_pilots"] else "Finished successfully"
         print(
             f"{status}: users successful={summary['successful_pilots']} "